@@ -34,15 +34,58 @@ document.addEventListener('DOMContentLoaded', () => {
 
         scrollToBottom();
 
-        fetch('/chat', {
+        fetch('/chat_stream', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ message })
         })
-        .then(response => response.json())
-        .then(data => {
-            typingIndicator.remove();
-            appendMessage(data.response, 'ai');
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`Chat stream failed with status ${response.status}`);
+            }
+
+            // Read Server-Sent Events and append tokens as they arrive
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let messageElement = null;
+            let responseText = '';
+
+            function handleEvent(rawEvent) {
+                const dataLines = rawEvent.split('\n')
+                    .filter(line => line.startsWith('data:'))
+                    .map(line => line.slice(5).trim());
+                if (dataLines.length === 0) return;
+
+                const data = JSON.parse(dataLines.join('\n'));
+                if (data.token) {
+                    if (!messageElement) {
+                        typingIndicator.remove();
+                        messageElement = document.createElement('div');
+                        messageElement.className = 'ai-message';
+                        chatMessages.appendChild(messageElement);
+                    }
+                    responseText += data.token;
+                    messageElement.textContent = responseText;
+                    scrollToBottom();
+                }
+            }
+
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) {
+                        typingIndicator.remove();
+                        return;
+                    }
+                    buffer += decoder.decode(value, { stream: true });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(handleEvent);
+                    return read();
+                });
+            }
+
+            return read();
         })
         .catch(error => {
             console.error('Error:', error);
@@ -698,11 +741,10 @@ if (fileUploadForm) {
             // Remove upload indicator
             uploadIndicator.remove();
             
-            if (data.status === 'success') {
-                // Show success message
-                showToast(`File ${data.filename} uploaded successfully`);
+            if (data.status === 'queued') {
+                showToast(`File ${data.filename} queued for processing`);
                 
-                // Add file message to chat
+                // Add file message to chat and keep it updated while the job runs
                 const fileMessage = document.createElement('div');
                 fileMessage.className = 'ai-message';
                 fileMessage.innerHTML = `
@@ -710,13 +752,14 @@ if (fileUploadForm) {
                         <div class="file-icon">📄</div>
                         <div class="file-details">
                             <div class="file-name">${data.filename}</div>
-                            <div class="file-meta">Added to memory</div>
+                            <div class="file-meta">Queued</div>
                         </div>
                     </div>
-                    <p>I've processed the file "${data.filename}" and added it to my memory. You can now ask me questions about its contents.</p>
+                    <p>I've queued the file "${data.filename}" for processing. I'll let you know when it's in my memory.</p>
                 `;
                 chatMessages.appendChild(fileMessage);
                 scrollToBottom();
+                pollIngestionJob(data.job_id, fileMessage);
                 
                 // Reset form and close modal
                 fileUploadForm.reset();
@@ -736,6 +779,35 @@ if (fileUploadForm) {
     });
 }
 
+// Poll an ingestion job until it finishes, updating its chat message
+function pollIngestionJob(jobId, fileMessage) {
+    const meta = fileMessage.querySelector('.file-meta');
+    const text = fileMessage.querySelector('p');
+    const filename = fileMessage.querySelector('.file-name').textContent;
+
+    fetch(`/file/jobs/${jobId}`)
+        .then(response => response.json())
+        .then(job => {
+            if (job.status === 'done') {
+                meta.textContent = 'Added to memory';
+                text.textContent = `I've processed the file "${filename}" and added it to my memory. You can now ask me questions about its contents.`;
+                showToast(`File ${filename} added to memory`);
+            } else if (job.status === 'failed') {
+                meta.textContent = 'Processing failed';
+                text.textContent = `I couldn't process "${filename}": ${job.error || 'unknown error'}`;
+                showToast(`Error processing ${filename}`, 'error');
+            } else {
+                const percent = Math.round((job.progress || 0) * 100);
+                meta.textContent = job.status === 'running' ? `${job.stage} (${percent}%)` : 'Queued';
+                setTimeout(() => pollIngestionJob(jobId, fileMessage), 2000);
+            }
+        })
+        .catch(error => {
+            console.error('Error polling ingestion job:', error);
+            setTimeout(() => pollIngestionJob(jobId, fileMessage), 5000);
+        });
+}
+
 // Toast notification system
 function showToast(message, type = 'success') {
     // Create toast container if it doesn't exist
@@ -893,18 +965,26 @@ function loadProjects() {
         .catch(error => console.error('Error loading projects:', error));
 }
 
-// Load chats from server
-function loadChats() {
-    fetch('/get_chats')
+// Load chats from server, one page at a time (metadata only)
+const CHAT_PAGE_SIZE = 50;
+
+function loadChats(offset = 0) {
+    fetch(`/get_chats?limit=${CHAT_PAGE_SIZE}&offset=${offset}&sort=last_updated`)
         .then(response => response.json())
-        .then(chats => {
+        .then(data => {
+            const chats = data.chats;
             const recentChatList = document.getElementById('recent-chat-list');
             const olderChatList = document.getElementById('older-chat-list');
             
-            recentChatList.innerHTML = ''; // Clear existing chats
-            olderChatList.innerHTML = ''; // Clear existing chats
+            if (offset === 0) {
+                recentChatList.innerHTML = ''; // Clear existing chats
+                olderChatList.innerHTML = ''; // Clear existing chats
+            } else {
+                // Remove the previous "Load more" item
+                olderChatList.querySelector('.load-more-item')?.remove();
+            }
             
-            if (chats.length === 0) {
+            if (data.total === 0) {
                 // If no chats, show a message
                 const emptyRecent = document.createElement('li');
                 emptyRecent.className = 'sidebar-item empty-item';
@@ -916,7 +996,7 @@ function loadChats() {
                 emptyOlder.textContent = 'No older chats';
                 olderChatList.appendChild(emptyOlder);
             } else {
-                // Sort chats by date
+                // Chats arrive sorted by last update, most recent first
                 const currentDate = new Date();
                 const oneWeekAgo = new Date(currentDate.getTime() - 7 * 24 * 60 * 60 * 1000);
                 
@@ -934,6 +1014,16 @@ function loadChats() {
                         olderChatList.appendChild(chatItem);
                     }
                 });
+                
+                // Offer the next page if there are more chats
+                const loaded = offset + chats.length;
+                if (loaded < data.total) {
+                    const moreItem = document.createElement('li');
+                    moreItem.className = 'sidebar-item load-more-item';
+                    moreItem.textContent = `Load more (${data.total - loaded} remaining)`;
+                    moreItem.addEventListener('click', () => loadChats(loaded));
+                    olderChatList.appendChild(moreItem);
+                }
             }
         })
         .catch(error => console.error('Error loading chats:', error));
@@ -3,29 +3,24 @@
 
 import os
 import re
-import uuid
 import time
 import torch
 from PIL import Image
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-from docx import Document
-from striprtf.striprtf import rtf_to_text
-import clip
-import easyocr
-from whiteboard_processor import analyze_whiteboard
+from qdrant_client import models
+from vector_store import get_qdrant, ensure_collection, IMAGE_VECTOR_SIZE
+from store_incoming import embed_and_store_text as store_text, image_vectors, delete_stale_points, subfolders
+import ingest_manifest
+from whiteboard_processor import analyze_whiteboards
 
 # === Paths
 incoming_dir = "F:/AI_documents/incoming"
-processed_dir = "F:/AI_documents/processed"
 log_path = os.path.join(incoming_dir, "_processing_log.txt")
 result_path = os.path.join(incoming_dir, "_analysis_results.txt")
 
-# === Init
-qdrant = QdrantClient(host="localhost", port=6333)
-model = SentenceTransformer("BAAI/bge-large-en-v1.5")
-clip_model, clip_preprocess = clip.load("ViT-B/32")
-reader = easyocr.Reader(['en'], gpu=torch.cuda.is_available())
+# === Init (the shared client, with the QDRANT_* settings)
+qdrant = get_qdrant()
+# Embedding, CLIP and OCR models are shared via embedding_provider and
+# only loaded when a file actually needs them
 
 if torch.cuda.is_available():
     print(f"🚀 GPU: {torch.cuda.get_device_name(0)}")
@@ -42,109 +37,91 @@ def write_log_entry(filename, tag, summary):
     with open(result_path, "a", encoding="utf-8") as out_file:
         out_file.write(f"\n=== Analysis Result: {filename} ({tag}) ===\n[{timestamp}]\n{summary}\n\n")
 
-# === Text file loader and embedder
-
-def load_text(filepath):
-    ext = os.path.splitext(filepath)[1].lower()
-    try:
-        if ext in [".txt", ".md"]:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return f.read()
-        elif ext == ".docx":
-            doc = Document(filepath)
-            return "\n".join([p.text for p in doc.paragraphs])
-        elif ext == ".rtf":
-            with open(filepath, "r", encoding="utf-8") as f:
-                return rtf_to_text(f.read())
-    except Exception as e:
-        print(f"⚠️ Could not load {filepath}: {e}")
-    return None
-
-def chunk_text(text, max_length=512):
-    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
-    chunks, current = [], ""
-    for p in paragraphs:
-        if len(current) + len(p) < max_length:
-            current += " " + p
-        else:
-            chunks.append(current.strip())
-            current = p
-    if current:
-        chunks.append(current.strip())
-    return chunks
+# === Text files
+# Stored through the same pipeline as uploads: same chunk-key point IDs,
+# stale-chunk cleanup and manifest record, so a file is never stored twice.
+# Like uploads, stored files are moved out of incoming to processed/text_docs.
 
 def embed_and_store_text(file_path, tag):
-    text = load_text(file_path)
-    if not text:
+    os.makedirs(subfolders["text"], exist_ok=True)
+    result = store_text(file_path, tag, subfolders["text"])
+    if not result:
         print(f"⚠️ Skipping {file_path}")
         return
 
-    chunks = chunk_text(text)
-    embeddings = model.encode(chunks).tolist()
-    payloads = [{"chunk": c, "tag": tag, "filename": os.path.basename(file_path)} for c in chunks]
-
-    if not qdrant.collection_exists("local_memory"):
-        qdrant.create_collection("local_memory", models.VectorParams(size=1024, distance=models.Distance.COSINE))
-
-    qdrant.upsert("local_memory", [
-        models.PointStruct(id=uuid.uuid4().int >> 64, vector=vec, payload=payloads[i])
-        for i, vec in enumerate(embeddings)
-    ])
-
-    one_line_summary = f"Stored {len(chunks)} text chunks."
-    write_log_entry(os.path.basename(file_path), tag, one_line_summary)
-    print(f"✅ Stored {len(chunks)} text chunks from: {os.path.basename(file_path)}")
+    chunks = result["reused"] + result["added"]
+    write_log_entry(os.path.basename(file_path), tag, f"Stored {chunks} text chunks.")
 
 # === Whiteboard/diagram processor
 
-def process_whiteboard_image(file_path, tag):
-    print(f"\n🔄 Processing whiteboard image: {os.path.basename(file_path)}")
-    result = analyze_whiteboard(file_path, tag)
-    summary = result["summary"]
-
-    text_vector = model.encode("passage: " + summary).tolist()
+def process_whiteboard_images(items):
+    """Analyze (file_path, tag) images in one batched pass and store their summaries"""
+    print(f"\n🔄 Processing {len(items)} whiteboard image(s)")
+    results, _ = analyze_whiteboards([file_path for file_path, _ in items])
 
-    if not qdrant.collection_exists("image_summary_memory"):
-        qdrant.create_collection("image_summary_memory", models.VectorParams(size=1024, distance=models.Distance.COSINE))
+    ensure_collection("image_summary_memory", image_size=IMAGE_VECTOR_SIZE)
 
-    qdrant.upsert("image_summary_memory", [
-        models.PointStruct(
-            id=int(hash(file_path + "_summary") % (10**10)),
-            vector=text_vector,
+    points, stored = [], []
+    for (file_path, tag), result in zip(items, results):
+        if result is None:
+            continue
+        filename = os.path.basename(file_path)
+        content_hash = ingest_manifest.file_hash(file_path)
+        points.append(models.PointStruct(
+            id=ingest_manifest.point_id(content_hash),
+            vector=image_vectors(file_path, result["text_vector"], result["image_vector"]),
             payload={
-                "filename": os.path.basename(file_path),
+                "filename": filename,
                 "tag": tag,
                 "type": "whiteboard",
-                "summary": summary
+                "summary": result["summary"],
+                "file_hash": content_hash
             }
-        )
-    ])
+        ))
+        stored.append((filename, content_hash, tag, result["summary"]))
 
-    write_log_entry(os.path.basename(file_path), tag, summary)
-    print(f"✅ Stored whiteboard summary for: {os.path.basename(file_path)}")
+    if points:
+        qdrant.upsert("image_summary_memory", points)
 
-# === Entry loop
+    # New points are in place, so older versions of each image can go
+    for filename, content_hash, tag, summary in stored:
+        delete_stale_points("image_summary_memory", filename, content_hash)
+        ingest_manifest.record("image_summary_memory", filename, content_hash, 1, tag, summary=summary)
+        write_log_entry(filename, tag, summary)
+        print(f"✅ Stored whiteboard summary for: {filename}")
 
-for filename in os.listdir(incoming_dir):
-    full_path = os.path.join(incoming_dir, filename)
-    if not os.path.isfile(full_path):
-        continue
-
-    ext = os.path.splitext(filename)[1].lower()
-    if ext in [".txt", ".docx", ".md", ".rtf"]:
-        print(f"\n📄 Found text file: {filename}")
-        tag = input("📌 Tag this as P, B, or PB? ").strip().upper()
-        if tag not in {"P", "B", "PB"}:
-            print("⚠️ Invalid tag. Skipping file.")
-            continue
-        embed_and_store_text(full_path, tag)
+def process_whiteboard_image(file_path, tag):
+    process_whiteboard_images([(file_path, tag)])
+
+# === Entry loop
+# (guarded: OCR worker processes import this module on Windows)
 
-    elif ext in [".jpg", ".jpeg", ".png", ".bmp", ".gif"]:
-        print(f"\n🖼️ Found image file: {filename}")
-        tag = input("📌 Tag this image as P, B, or PB? ").strip().upper()
-        if tag not in {"P", "B", "PB"}:
-            print("⚠️ Invalid tag. Skipping image.")
+if __name__ == "__main__":
+    whiteboards = []
+    for filename in os.listdir(incoming_dir):
+        full_path = os.path.join(incoming_dir, filename)
+        if not os.path.isfile(full_path):
             continue
-        process_whiteboard_image(full_path, tag)
 
-print("\n✅ Done processing incoming folder.")
\ No newline at end of file
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in [".txt", ".docx", ".md", ".rtf"]:
+            print(f"\n📄 Found text file: {filename}")
+            tag = input("📌 Tag this as P, B, or PB? ").strip().upper()
+            if tag not in {"P", "B", "PB"}:
+                print("⚠️ Invalid tag. Skipping file.")
+                continue
+            embed_and_store_text(full_path, tag)
+
+        elif ext in [".jpg", ".jpeg", ".png", ".bmp", ".gif"]:
+            print(f"\n🖼️ Found image file: {filename}")
+            tag = input("📌 Tag this image as P, B, or PB? ").strip().upper()
+            if tag not in {"P", "B", "PB"}:
+                print("⚠️ Invalid tag. Skipping image.")
+                continue
+            # Images are analyzed together once every file has been tagged
+            whiteboards.append((full_path, tag))
+
+    if whiteboards:
+        process_whiteboard_images(whiteboards)
+
+    print("\n✅ Done processing incoming folder.")
@@ -0,0 +1,166 @@
+"""
+Answer Cache for RAG Assistant
+Remembers generated answers so repeated and near-duplicate questions skip the
+LLM. An entry matches when the question embedding is within
+ANSWER_CACHE_THRESHOLD cosine similarity of a cached question asked with the
+same project, profile and tag filter. Each entry keeps a fingerprint of the
+memory context its answer was generated from and the ingestion generation (the
+manifest's modification time) at that moment:
+  - same generation: nothing was ingested since, the answer is returned at once
+  - newer generation: context is retrieved again and the answer is reused only
+    if the fingerprint still matches; otherwise the entry is dropped
+Entries expire after ANSWER_CACHE_TTL seconds and the least recently used ones
+are evicted beyond ANSWER_CACHE_MAX_ITEMS.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+import ingest_manifest
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", 3600))
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", 500))
+# Follow-up questions depend on the conversation, so by default only the first
+# question of a chat is answered from (and stored in) the cache
+ANSWER_CACHE_FOLLOWUPS = os.getenv("ANSWER_CACHE_FOLLOWUPS", "False").lower() == "true"
+
+
+def context_fingerprint(memory_context):
+    return hashlib.sha1(memory_context.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """In-memory semantic cache of answers, bucketed by (project, profile, tag)"""
+
+    def __init__(self, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL,
+                 max_items=ANSWER_CACHE_MAX_ITEMS):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_items = max_items
+        self.entries = OrderedDict()   # id -> entry, least recently used first
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.counters = {"lookups": 0, "hits": 0, "revalidated": 0, "misses": 0, "stores": 0,
+                         "stale": 0, "expired": 0, "evicted": 0, "saved_seconds": 0.0, "hit_ms": 0.0}
+
+    @staticmethod
+    def usable(chat_history):
+        return ANSWER_CACHE_ENABLED and (ANSWER_CACHE_FOLLOWUPS or not chat_history)
+
+    def _expire(self, now):
+        expired = [key for key, entry in self.entries.items() if now - entry["created"] > self.ttl]
+        for key in expired:
+            del self.entries[key]
+        self.counters["expired"] += len(expired)
+
+    def lookup(self, query_vector, scope):
+        """Closest cached question in the scope above the threshold.
+        Returns (entry, fresh) or (None, False); fresh means nothing was ingested
+        since the answer was generated."""
+        start = time.perf_counter()
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        with self.lock:
+            self.counters["lookups"] += 1
+            self._expire(time.time())
+            candidates = [(key, entry) for key, entry in self.entries.items() if entry["scope"] == scope]
+            best = None
+            if candidates:
+                similarities = np.stack([entry["vector"] for _, entry in candidates]) @ vector
+                index = int(np.argmax(similarities))
+                if similarities[index] >= self.threshold:
+                    best = candidates[index]
+            if best is None:
+                self.counters["misses"] += 1
+                return None, False
+
+            key, entry = best
+            self.entries.move_to_end(key)
+            fresh = entry["generation"] == ingest_manifest.generation()
+            if fresh:
+                self._count_hit(entry, start)
+            return entry, fresh
+
+    def revalidate(self, entry, memory_context):
+        """After an ingestion: reuse the entry if its context is unchanged, else drop it"""
+        start = time.perf_counter()
+        with self.lock:
+            if entry["fingerprint"] == context_fingerprint(memory_context):
+                entry["generation"] = ingest_manifest.generation()
+                self.counters["revalidated"] += 1
+                self._count_hit(entry, start)
+                return True
+            self.entries.pop(entry["id"], None)
+            self.counters["stale"] += 1
+            self.counters["misses"] += 1
+            return False
+
+    def _count_hit(self, entry, start):
+        entry["hits"] += 1
+        self.counters["hits"] += 1
+        self.counters["saved_seconds"] += entry["seconds"]
+        self.counters["hit_ms"] += (time.perf_counter() - start) * 1000
+
+    def store(self, query_vector, scope, query, memory_context, answer, seconds):
+        """Cache an answer generated from memory_context"""
+        vector = np.asarray(query_vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self.lock:
+            entry = {
+                "id": self.next_id,
+                "scope": scope,
+                "vector": vector,
+                "query": query,
+                "fingerprint": context_fingerprint(memory_context),
+                "context": memory_context,
+                "answer": answer,
+                "generation": ingest_manifest.generation(),
+                "created": time.time(),
+                "seconds": seconds,
+                "hits": 0
+            }
+            self.entries[self.next_id] = entry
+            self.next_id += 1
+            self.counters["stores"] += 1
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+                self.counters["evicted"] += 1
+
+    def invalidate(self):
+        """Drop every cached answer"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+            counters["items"] = len(self.entries)
+        served = counters["hits"] + counters["misses"]
+        counters["hit_rate"] = round(counters["hits"] / served, 3) if served else 0.0
+        counters["avg_hit_ms"] = round(counters.pop("hit_ms") / counters["hits"], 2) if counters["hits"] else 0.0
+        counters["saved_seconds"] = round(counters["saved_seconds"], 1)
+        return counters
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Return the process-wide answer cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
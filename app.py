@@ -1,17 +1,22 @@
 # === Import section (at the top of the file) ===
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context
 import requests
 import json
 import os
 import time
 import uuid
 from datetime import datetime
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
 
 # Import the RAG manager functions
-from rag_manager import generate_rag_response, log_conversation
+from rag_manager import generate_rag_response, generate_rag_response_stream, log_conversation
+from embedding_provider import get_model_stats
+from embedding_cache import get_cache
+import reranker
+from answer_cache import get_answer_cache
+import llm_client
+import metrics
+import chat_store
 
 # Load environment variables
 load_dotenv()
@@ -28,114 +33,81 @@ LM_API_URL = os.getenv("LM_API_URL", "http://127.0.0.1:1234/v1/chat/completions"
 MODEL_NAME = os.getenv("MODEL_NAME", "llama-3-13b-instruct")
 TOP_K = int(os.getenv("TOP_K", 10))
 SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD", 0.4))
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", 50))
 
 # Create directories if they don't exist
 os.makedirs(PROJECTS_DIR, exist_ok=True)
 os.makedirs(CHAT_HISTORY_DIR, exist_ok=True)
 
+# Chats live in the SQLite chat store; bring over any saved as JSON files
+chat_store.import_json_chats(CHAT_HISTORY_DIR, PROJECTS_DIR)
 
-# === Load embedding model
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
-embed_model = SentenceTransformer(EMBEDDING_MODEL)
-qdrant = QdrantClient(
-    host=os.getenv("QDRANT_HOST", "localhost"),
-    port=int(os.getenv("QDRANT_PORT", 6333))
-)
+# Models are loaded lazily by embedding_provider on first use and shared
+# with rag_manager and the file upload blueprint
 
 # === Session management functions
+# Only the chat ID is kept in the (cookie) session; everything else is in chat_store
 def get_or_create_chat_session():
     """Gets the current chat session or creates a new one"""
-    if 'chat_id' not in session:
-        session['chat_id'] = str(uuid.uuid4())
-        session['chat_history'] = []
-        session['current_project'] = None
-        session['chat_name'] = f"Chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    chat_id = session.get('chat_id')
+    chat = chat_store.get_chat(chat_id) if chat_id else None
+    
+    if chat is None:
+        chat_id = chat_id or str(uuid.uuid4())
+        name = session.get('chat_name') or f"Chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        chat_store.create_chat(chat_id, name, session.get('current_project'))
+        # Carry over history from cookies written by older versions
+        if session.get('chat_history'):
+            chat_store.append_messages(chat_id, session['chat_history'])
+        session['chat_id'] = chat_id
+        chat = chat_store.get_chat(chat_id)
+    
+    # Drop fields older versions kept in the cookie
+    for key in ('chat_history', 'current_project', 'chat_name'):
+        session.pop(key, None)
     
     return {
-        'id': session['chat_id'],
-        'history': session['chat_history'],
-        'project': session['current_project'],
-        'name': session['chat_name']
+        'id': chat['id'],
+        'history': chat_store.get_messages(chat['id']),
+        'project': chat['project'],
+        'name': chat['name']
     }
 
-def save_chat_history(chat_session):
-    """Persists chat history to disk"""
-    chat_id = chat_session['id']
-    history = chat_session['history']
-    project = chat_session['project']
-    
-    # Determine save location based on project
-    if project:
-        project_dir = os.path.join(PROJECTS_DIR, project)
-        os.makedirs(project_dir, exist_ok=True)
-        save_path = os.path.join(project_dir, f"{chat_id}.json")
-    else:
-        save_path = os.path.join(CHAT_HISTORY_DIR, f"{chat_id}.json")
-    
-    # Save to disk
-    with open(save_path, 'w', encoding='utf-8') as f:
-        chat_data = {
-            'id': chat_id,
-            'name': chat_session['name'],
-            'project': project,
-            'history': history,
-            'last_updated': datetime.now().isoformat()
-        }
-        json.dump(chat_data, f, ensure_ascii=False, indent=2)
-    
-    return save_path
+def get_profile():
+    """Determine profile (business or private) based on current tag preference"""
+    # Default to None if not specified
+    tag_preference = session.get('tag_preference')
+    if tag_preference == 'B':
+        return 'business'
+    elif tag_preference == 'P':
+        return 'private'
+    return None
+
+def save_chat_turn(chat_session, user_input, response_text):
+    """Appends one user/assistant exchange to the chat store"""
+    turn = [
+        {"role": "user", "content": user_input},
+        {"role": "assistant", "content": response_text}
+    ]
+    chat_store.append_messages(chat_session['id'], turn)
+    chat_session['history'].extend(turn)
 
 def load_chat_history(chat_id):
     """Loads a specific chat history"""
-    # Look in both locations
-    potential_paths = [
-        os.path.join(CHAT_HISTORY_DIR, f"{chat_id}.json")
-    ]
-    
-    # Also check all project folders
-    for project in os.listdir(PROJECTS_DIR):
-        project_path = os.path.join(PROJECTS_DIR, project)
-        if os.path.isdir(project_path):
-            potential_paths.append(os.path.join(project_path, f"{chat_id}.json"))
-    
-    # Try to find and load the chat
-    for path in potential_paths:
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                chat_data = json.load(f)
-                return chat_data
-    
-    return None
+    chat = chat_store.get_chat(chat_id)
+    if chat is None:
+        return None
+    chat['history'] = chat_store.get_messages(chat_id)
+    return chat
 
-def get_all_chats():
-    """Get all chat sessions, both in projects and standalone"""
-    chats = []
-    
-    # Get standalone chats
-    for filename in os.listdir(CHAT_HISTORY_DIR):
-        if filename.endswith('.json'):
-            path = os.path.join(CHAT_HISTORY_DIR, filename)
-            with open(path, 'r', encoding='utf-8') as f:
-                chat_data = json.load(f)
-                chat_data['is_project'] = False
-                chats.append(chat_data)
-    
-    # Get project chats
-    for project in os.listdir(PROJECTS_DIR):
-        project_path = os.path.join(PROJECTS_DIR, project)
-        if os.path.isdir(project_path):
-            for filename in os.listdir(project_path):
-                if filename.endswith('.json'):
-                    path = os.path.join(project_path, filename)
-                    with open(path, 'r', encoding='utf-8') as f:
-                        chat_data = json.load(f)
-                        chat_data['is_project'] = True
-                        chat_data['project_name'] = project
-                        chats.append(chat_data)
-    
-    # Sort by last updated time, most recent first
-    chats.sort(key=lambda x: x.get('last_updated', ''), reverse=True)
-    return chats
+def get_all_chats(limit=None, offset=0, sort="last_updated", project=None):
+    """Get one page of chat sessions (metadata only), both in projects and standalone"""
+    chats, total = chat_store.list_chats(limit=limit, offset=offset, sort=sort, project=project)
+    for chat in chats:
+        chat['is_project'] = bool(chat['project'])
+        if chat['project']:
+            chat['project_name'] = chat['project']
+    return chats, total
 
 def get_all_projects():
     """Get list of all projects"""
@@ -159,15 +131,7 @@ def chat():
     # Get user input
     user_input = request.json.get("message")
     project_filter = chat_session.get('project')
-    
-    # Determine profile (business or private) based on current tag preference
-    # Default to None if not specified
-    tag_preference = session.get('tag_preference')
-    profile = None
-    if tag_preference == 'B':
-        profile = 'business'
-    elif tag_preference == 'P':
-        profile = 'private'
+    profile = get_profile()
     
     # Generate response using RAG
     result = generate_rag_response(
@@ -177,12 +141,9 @@ def chat():
         profile=profile
     )
     
-    # Update chat history
-    chat_session['history'].append({"role": "user", "content": user_input})
-    chat_session['history'].append({"role": "assistant", "content": result['response']})
-    
-    # Save updated chat
-    save_chat_history(chat_session)
+    # Save the exchange
+    with metrics.span("save_history"):
+        save_chat_turn(chat_session, user_input, result['response'])
     
     # Log conversation
     log_conversation(
@@ -194,6 +155,51 @@ def chat():
     
     return jsonify({"response": result['response']})
 
+@app.route("/chat_stream", methods=["POST"])
+def chat_stream():
+    """Stream the assistant's reply token by token as Server-Sent Events"""
+    chat_session = get_or_create_chat_session()
+    
+    user_input = request.json.get("message")
+    project_filter = chat_session.get('project')
+    profile = get_profile()
+    history = list(chat_session['history'])
+    # The request's trace stays open until the stream has finished
+    trace = metrics.defer_trace()
+    
+    def generate():
+        tokens = []
+        with metrics.use_trace(trace):
+            try:
+                for token in generate_rag_response_stream(
+                    query=user_input,
+                    chat_history=history,
+                    project=project_filter,
+                    profile=profile
+                ):
+                    tokens.append(token)
+                    yield f"data: {json.dumps({'token': token})}\n\n"
+            finally:
+                # Save history and log once the stream has completed
+                response_text = "".join(tokens).strip()
+                with metrics.span("save_history"):
+                    save_chat_turn(chat_session, user_input, response_text)
+                log_conversation(
+                    user_query=user_input,
+                    assistant_response=response_text,
+                    project=project_filter,
+                    chat_id=chat_session['id']
+                )
+                metrics.finish_trace(trace, 200)
+        
+        yield f"data: {json.dumps({'done': True})}\n\n"
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/chat_data")
 def get_chat_data():
     """Get chat data for the current session"""
@@ -202,44 +208,37 @@ def get_chat_data():
 
 @app.route("/new_chat", methods=["POST"])
 def new_chat():
-    # Clear the current session and create a new one
-    session.pop('chat_id', None)
-    session.pop('chat_history', None)
-    session.pop('current_project', None)
-    session.pop('chat_name', None)
-    
-    project = request.json.get("project")
-    if project:
-        session['current_project'] = project
-    
-    chat_name = request.json.get("name")
-    if chat_name:
-        session['chat_name'] = chat_name
-    
-    chat_session = get_or_create_chat_session()
-    save_chat_history(chat_session)
+    # Create a new chat and point the session at it
+    chat_id = str(uuid.uuid4())
+    chat_name = request.json.get("name") or f"Chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    chat_store.create_chat(chat_id, chat_name, request.json.get("project") or None)
+    session['chat_id'] = chat_id
     
-    return jsonify({"status": "success", "chat_id": chat_session['id']})
+    return jsonify({"status": "success", "chat_id": chat_id})
 
 @app.route("/load_chat/<chat_id>")
 def load_chat(chat_id):
-    chat_data = load_chat_history(chat_id)
-    
-    if chat_data:
-        # Update session with loaded chat
-        session['chat_id'] = chat_data['id']
-        session['chat_history'] = chat_data['history']
-        session['current_project'] = chat_data.get('project')
-        session['chat_name'] = chat_data.get('name', f"Chat_{chat_id[:8]}")
-        
+    if chat_store.get_chat(chat_id):
+        # Point the session at the loaded chat
+        session['chat_id'] = chat_id
         return redirect(url_for('index'))
     else:
         return "Chat not found", 404
 
 @app.route("/get_chats")
 def get_chats():
-    all_chats = get_all_chats()
-    return jsonify(all_chats)
+    limit = max(1, min(request.args.get("limit", CHAT_PAGE_SIZE, type=int), 500))
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    sort = request.args.get("sort", "last_updated")
+    chats, total = get_all_chats(limit=limit, offset=offset, sort=sort,
+                                 project=request.args.get("project"))
+    return jsonify({"chats": chats, "total": total, "limit": limit, "offset": offset})
+
+@app.route("/rebuild_chat_index", methods=["POST"])
+def rebuild_chat_index():
+    """Recompute chat metadata from stored messages and re-import JSON chats on disk"""
+    result = chat_store.rebuild_index(CHAT_HISTORY_DIR, PROJECTS_DIR)
+    return jsonify({"status": "success", **result})
 
 @app.route("/get_projects")
 def get_projects():
@@ -251,9 +250,7 @@ def set_chat_name():
     new_name = request.json.get("name")
     if new_name:
         chat_session = get_or_create_chat_session()
-        chat_session['name'] = new_name
-        save_chat_history(chat_session)
-        session['chat_name'] = new_name
+        chat_store.update_chat(chat_session['id'], name=new_name)
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "No name provided"}), 400
 
@@ -261,9 +258,7 @@ def set_chat_name():
 def set_project():
     project = request.json.get("project")
     chat_session = get_or_create_chat_session()
-    chat_session['project'] = project
-    session['current_project'] = project
-    save_chat_history(chat_session)
+    chat_store.update_chat(chat_session['id'], project=project)
     return jsonify({"status": "success"})
 
 @app.route("/set_tag_preference", methods=["POST"])
@@ -274,6 +269,26 @@ def set_tag_preference():
         return jsonify({"status": "success"})
     return jsonify({"status": "error", "message": "Invalid tag"}), 400
 
+@app.route("/model_stats")
+def model_stats():
+    """Report loaded models (load time, memory footprint), cache, reranker and LLM client counters"""
+    return jsonify({
+        "models": get_model_stats(),
+        "embedding_cache": get_cache().stats(),
+        "reranker": reranker.get_stats(),
+        "answer_cache": get_answer_cache().stats(),
+        "llm": llm_client.get_stats()
+    })
+
+# Request tracing and the Prometheus /metrics endpoint
+metrics.init_app(app)
+metrics.register_gauge("rag_llm_queue_depth", "Requests waiting for an LLM slot",
+                       lambda: llm_client.get_stats()["queue_depth"])
+metrics.register_gauge("rag_llm_active", "Generations running in LM Studio",
+                       lambda: llm_client.get_stats()["active"])
+metrics.register_gauge("rag_answer_cache_hit_rate", "Share of cacheable questions answered from the cache",
+                       lambda: get_answer_cache().stats()["hit_rate"])
+
 # Register file upload blueprint if available
 try:
     from file_uploader import file_bp, init_app
@@ -0,0 +1,296 @@
+"""
+Batch Ingestion for Local AI Assistant
+Non-interactive ingestion of the incoming folder. Files are extracted and
+chunked in a pool of worker processes that send their chunks back in
+batches through a bounded queue, while the main process runs a single
+batching embedder, and Qdrant upserts are pipelined through
+vector_store.UpsertWriter so they overlap with embedding. Tags, projects and
+image descriptions come from a sidecar manifest or from command-line flags
+instead of input().
+
+Sidecar manifest (JSON, default: <incoming>/_ingest.json):
+    {
+        "*": {"tag": "B"},
+        "report.pdf": {"tag": "PB", "project": "Alpha"},
+        "board.jpg": {"tag": "B", "description": "Sprint planning whiteboard"}
+    }
+
+Usage:
+    python batch_ingest.py --tag B --project Alpha
+    python batch_ingest.py --manifest F:/AI_documents/incoming/_ingest.json --workers 6
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+from multiprocessing import Manager
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+VALID_TAGS = {"P", "B", "PB"}
+TEXT_EXTENSIONS = {".txt", ".md", ".docx", ".rtf", ".pdf"}
+SPREADSHEET_EXTENSIONS = {".csv", ".xls", ".xlsx"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+SIDECAR_NAME = "_ingest.json"
+
+
+def extract_file(file_id, file_path, stored_keys, results, batch_size):
+    """Worker process: extract and chunk one file. New (chunk, meta, key) items
+    are put on `results` in batches as they are found, followed by every key
+    of the file; the queue is bounded, so a large file waits for the embedder
+    instead of piling up in memory. Messages are (file_id, kind, data)."""
+    from store_incoming import iter_document_chunks, chunk_key
+
+    keys, seen, items = [], {}, []
+    first_chunk = None
+    try:
+        for chunk, meta in iter_document_chunks(file_path):
+            if first_chunk is None:
+                first_chunk = chunk
+            key = chunk_key(chunk, seen, meta)
+            keys.append(key)
+            if key not in stored_keys:
+                items.append((chunk, meta, key))
+                if len(items) >= batch_size:
+                    results.put((file_id, "items", items))
+                    items = []
+        if items:
+            results.put((file_id, "items", items))
+        results.put((file_id, "done", {"keys": keys, "first_chunk": first_chunk}))
+    except Exception as e:
+        results.put((file_id, "error", str(e)))
+
+
+def load_sidecar(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def file_settings(filename, sidecar, args):
+    """Settings for one file: sidecar entry, then CLI flags, then sidecar defaults"""
+    settings = dict(sidecar.get("*", {}))
+    settings.update({k: v for k, v in (("tag", args.tag), ("project", args.project)) if v})
+    settings.update(sidecar.get(filename, {}))
+    settings["tag"] = (settings.get("tag") or "").upper()
+    return settings
+
+
+class BatchIngester:
+    """Single embedder fed by extraction workers, with pipelined upserts"""
+
+    def __init__(self, batch_size, upsert_workers):
+        import store_incoming
+        from vector_store import UpsertWriter
+        self.si = store_incoming
+        self.batch_size = batch_size
+        self.writer = UpsertWriter("local_memory", **({"parallel": upsert_workers} if upsert_workers else {}))
+        self.buffer = []             # (state, chunk, meta, key) waiting to be embedded
+        self.written = queue.Queue() # (state, count, error) reported by the writer threads
+        self.stats = {"files": 0, "skipped": 0, "failed": 0, "chunks": 0, "embedded": 0}
+
+    def start_file(self, state):
+        state.update(keys=None, first_chunk=None, sent=[], added=0, outstanding=0)
+
+    def add_items(self, state, items):
+        """Queue new chunks of a file for embedding"""
+        state["outstanding"] += len(items)
+        state["sent"].extend(key for _, _, key in items)
+        for chunk, meta, key in items:
+            self.buffer.append((state, chunk, meta, key))
+        while len(self.buffer) >= self.batch_size:
+            self.embed_batch()
+
+    def end_file(self, state, extracted=None, error=None):
+        """A worker is done with a file: extracted holds every key of it, or
+        extraction failed with error"""
+        state["extracted"] = True
+        if error:
+            state["extract_error"] = error
+        else:
+            state.update(keys=extracted["keys"], first_chunk=extracted["first_chunk"])
+            self.stats["chunks"] += len(extracted["keys"])
+        self.collect()
+        self.finish_ready([state])
+
+    def embed_batch(self):
+        """Embed one batch from the buffer and hand its points to the upsert writer"""
+        batch, self.buffer = self.buffer[:self.batch_size], self.buffer[self.batch_size:]
+        if not batch:
+            return
+        embeddings = self.si.encode([chunk for _, chunk, _, _ in batch],
+                                    batch_size=self.batch_size).tolist()
+        self.stats["embedded"] += len(batch)
+
+        # Group the batch by file so each file learns when its points are written
+        by_file = {}
+        for (state, chunk, meta, key), embedding in zip(batch, embeddings):
+            items = by_file.setdefault(id(state), (state, [], []))
+            items[1].append((chunk, meta, key))
+            items[2].append(embedding)
+        for state, items, vectors in by_file.values():
+            points = self.si.make_points(state["filename"], state["tag"], state["project"], items, vectors)
+            self.writer.add(points, callback=lambda error, state=state, count=len(points):
+                            self.written.put((state, count, error)))
+        self.collect()
+
+    def collect(self):
+        """Account for written points and finish files whose chunks are all stored"""
+        finished = []
+        while True:
+            try:
+                state, count, error = self.written.get_nowait()
+            except queue.Empty:
+                break
+            if error:
+                state["error"] = error
+            state["outstanding"] -= count
+            state["added"] += count
+            finished.append(state)
+        self.finish_ready(finished)
+
+    def finish_ready(self, states):
+        for state in states:
+            if state.get("done") or not state.get("extracted") or state["outstanding"] > 0:
+                continue
+            state["done"] = True
+            if state.get("extract_error") or not state["keys"]:
+                # Take back the chunks already written, as embed_and_store_text does
+                if state["sent"]:
+                    try:
+                        self.si.delete_chunks("local_memory", state["filename"], state["sent"])
+                    except Exception as e:
+                        print(f"⚠️ Could not remove partial chunks of {state['filename']}: {e}")
+                if state.get("extract_error"):
+                    print(f"❌ Could not process {state['filename']}: {state['extract_error']}")
+                else:
+                    print(f"⚠️ Skipping unreadable file: {state['path']}")
+                self.stats["failed"] += 1
+                continue
+            if state.get("error"):
+                print(f"❌ Upsert failed for {state['filename']}: {state['error']}")
+                self.stats["failed"] += 1
+                continue
+            try:
+                self.si.finish_text_file(state["path"], state["tag"], state["folder"], state["project"], state)
+                self.stats["files"] += 1
+            except Exception as e:
+                print(f"❌ Could not finish {state['filename']}: {e}")
+                self.stats["failed"] += 1
+
+    def drain(self):
+        """Embed what is left in the buffer and wait for every upsert"""
+        while self.buffer:
+            self.embed_batch()
+        try:
+            self.writer.close()
+        except Exception:
+            pass  # Already reported per file through the callbacks
+        self.collect()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest every file in the incoming folder without prompts")
+    parser.add_argument("--incoming", default=os.getenv("INCOMING_DIR", "F:/AI_documents/incoming"))
+    parser.add_argument("--manifest", help=f"sidecar JSON with per-file settings (default: <incoming>/{SIDECAR_NAME})")
+    parser.add_argument("--tag", help="tag for files without one in the manifest (P, B or PB)")
+    parser.add_argument("--project", help="project for files without one in the manifest")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="extraction processes")
+    parser.add_argument("--batch-size", type=int, default=64, help="chunks per embedding batch")
+    parser.add_argument("--upsert-workers", type=int, help="concurrent Qdrant upserts (default: UPSERT_PARALLEL)")
+    args = parser.parse_args(argv)
+
+    import store_incoming as si
+
+    sidecar = load_sidecar(args.manifest or os.path.join(args.incoming, SIDECAR_NAME))
+    for folder in si.subfolders.values():
+        os.makedirs(folder, exist_ok=True)
+
+    start_time = time.time()
+    ingester = BatchIngester(args.batch_size, args.upsert_workers)
+    si.ensure_collection("local_memory", sparse=True)
+
+    # Images only need their description embedded; text goes through the pool
+    jobs = []
+    for filename in sorted(os.listdir(args.incoming)):
+        full_path = os.path.join(args.incoming, filename)
+        ext = os.path.splitext(filename)[1].lower()
+        if not os.path.isfile(full_path) or filename == SIDECAR_NAME:
+            continue
+
+        settings = file_settings(filename, sidecar, args)
+        if settings["tag"] not in VALID_TAGS:
+            print(f"⚠️ No valid tag for {filename}, skipping (use --tag or the manifest)")
+            ingester.stats["skipped"] += 1
+            continue
+
+        if ext in IMAGE_EXTENSIONS:
+            if not settings.get("description"):
+                print(f"⚠️ No description for image {filename}, skipping")
+                ingester.stats["skipped"] += 1
+                continue
+            si.store_image_metadata(full_path, settings["tag"], settings["description"], settings.get("project"))
+            ingester.stats["files"] += 1
+        elif ext in TEXT_EXTENSIONS or ext in SPREADSHEET_EXTENSIONS:
+            folder = si.subfolders["spreadsheet" if ext in SPREADSHEET_EXTENSIONS else "text"]
+            project = settings.get("project") or None
+            result, content_hash, entry = si.skip_if_unchanged(full_path, settings["tag"], folder, project)
+            if result:
+                ingester.stats["skipped"] += 1
+                continue
+            stored, legacy = si.stored_chunk_keys("local_memory", filename)
+            jobs.append({
+                "path": full_path, "filename": filename, "folder": folder,
+                "tag": settings["tag"], "project": project,
+                "content_hash": content_hash, "entry": entry, "stored": stored, "legacy": legacy
+            })
+
+    # Extract in worker processes, embed and upsert here as their chunks come back
+    with Manager() as manager, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = manager.Queue(maxsize=args.workers * 2)
+        active, futures = {}, {}
+        waiting = list(enumerate(jobs))
+        while waiting or active:
+            # Keep a couple of files per worker in flight so no worker idles
+            while waiting and len(active) < args.workers * 2:
+                file_id, state = waiting.pop(0)
+                ingester.start_file(state)
+                active[file_id] = state
+                futures[file_id] = pool.submit(extract_file, file_id, state["path"], set(state["stored"]),
+                                               results, args.batch_size)
+            try:
+                file_id, kind, data = results.get(timeout=1)
+            except queue.Empty:
+                # A worker that died can't report; its future does
+                for file_id, future in list(futures.items()):
+                    if future.done() and future.exception() and file_id in active:
+                        ingester.end_file(active.pop(file_id), error=future.exception())
+                        del futures[file_id]
+                continue
+            if kind == "items":
+                ingester.add_items(active[file_id], data)
+            else:
+                futures.pop(file_id, None)
+                ingester.end_file(active.pop(file_id), data if kind == "done" else None,
+                                  data if kind == "error" else None)
+    ingester.drain()
+
+    elapsed = max(time.time() - start_time, 1e-6)
+    stats = ingester.stats
+    print(f"\n✅ Batch ingestion finished in {elapsed:.1f}s: "
+          f"{stats['files']} stored, {stats['skipped']} skipped, {stats['failed']} failed")
+    print(f"📊 Throughput: {stats['files'] / elapsed:.2f} files/s, "
+          f"{stats['chunks'] / elapsed:.1f} chunks/s ({stats['embedded']} chunks embedded)")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
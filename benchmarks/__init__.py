@@ -0,0 +1,12 @@
+"""
+Benchmarks for RAG Assistant
+Reproducible performance measurements that run without LM Studio or a Qdrant
+server:
+    corpus.py          synthetic documents with labelled questions
+    mock_llm.py        OpenAI-compatible LLM server with a configurable token rate
+    stand_ins.py       hashing embedder/tokenizer for machines without the real models
+    bench_rag.py       ingest throughput, retrieval latency and recall, concurrent chat
+    bench_chunking.py  chunker throughput and token budgets
+
+Run from the repository root, e.g. `python -m benchmarks.bench_rag --output run.json`.
+"""
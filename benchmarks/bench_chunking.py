@@ -0,0 +1,109 @@
+"""
+Chunking Benchmark
+Measures chunks/s and MB/s of the shared chunker (chunking.py) on a generated
+corpus, and checks that no chunk exceeds the token budget. With --baseline it
+also times the old approach of re-tokenising every sentence separately.
+
+Usage:
+    python benchmarks/bench_chunking.py --docs 200 --paragraphs 80
+    python benchmarks/bench_chunking.py --baseline --output chunking.json
+    python -m benchmarks.bench_chunking --stand-in-models
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import Chunker  # noqa: E402
+from benchmarks.corpus import make_document  # noqa: E402
+
+
+def baseline_chunks(chunker, text):
+    """Old approach: split sentences, then tokenise each one on its own"""
+    import re
+    sentences = [s for s in re.split(r"(?<=[.!?])\s+", text) if s.strip()]
+    chunks, current, count = [], [], 0
+    for sentence in sentences:
+        tokens = chunker.count_tokens(sentence)
+        if count + tokens > chunker.max_tokens and current:
+            chunks.append(" ".join(current))
+            current, count = [], 0
+        current.append(sentence)
+        count += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def run(label, fn, corpus):
+    start = time.perf_counter()
+    chunks = [chunk for doc in corpus for chunk in fn(doc)]
+    elapsed = time.perf_counter() - start
+    megabytes = sum(len(doc.encode("utf-8")) for doc in corpus) / (1024 ** 2)
+    result = {
+        "label": label,
+        "seconds": round(elapsed, 3),
+        "chunks": len(chunks),
+        "chunks_per_s": round(len(chunks) / elapsed, 1),
+        "mb_per_s": round(megabytes / elapsed, 2)
+    }
+    print(f"{label:>10}: {result['chunks']} chunks in {elapsed:.2f}s "
+          f"({result['chunks_per_s']} chunks/s, {result['mb_per_s']} MB/s)")
+    return result, chunks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the shared chunker")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=60)
+    parser.add_argument("--max-tokens", type=int)
+    parser.add_argument("--overlap", type=int)
+    parser.add_argument("--model", help="embedding model whose tokenizer is used")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", action="store_true", help="also time per-sentence tokenisation")
+    parser.add_argument("--stand-in-models", action="store_true",
+                        help="word-piece stand-in instead of the model's tokenizer")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.stand_in_models:
+        from benchmarks import stand_ins
+        stand_ins.install(args.model)
+
+    rng = random.Random(args.seed)
+    corpus = [make_document(rng, args.paragraphs) for _ in range(args.docs)]
+    megabytes = sum(len(doc.encode("utf-8")) for doc in corpus) / (1024 ** 2)
+    print(f"📄 Corpus: {args.docs} documents, {megabytes:.1f} MB")
+
+    chunker = Chunker(max_tokens=args.max_tokens, overlap=args.overlap, model_name=args.model)
+    chunker.count_tokens("warm up")
+    results = {"docs": args.docs, "megabytes": round(megabytes, 2),
+               "max_tokens": chunker.max_tokens, "overlap": chunker.overlap, "runs": []}
+
+    result, chunks = run("chunker", chunker.chunk, corpus)
+    sizes = chunker.count_many(chunks)
+    result["max_chunk_tokens"] = max(sizes) if sizes else 0
+    result["mean_chunk_tokens"] = round(sum(sizes) / len(sizes), 1) if sizes else 0
+    result["empty_chunks"] = sum(1 for chunk in chunks if not chunk.strip())
+    results["runs"].append(result)
+    print(f"✅ Largest chunk {result['max_chunk_tokens']} tokens (budget {chunker.max_tokens}), "
+          f"mean {result['mean_chunk_tokens']}, empty {result['empty_chunks']}")
+
+    if args.baseline:
+        result, _ = run("baseline", lambda doc: baseline_chunks(chunker, doc), corpus)
+        results["runs"].append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    return 0 if results["runs"][0]["max_chunk_tokens"] <= chunker.max_tokens else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
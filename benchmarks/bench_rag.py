@@ -0,0 +1,364 @@
+"""
+RAG Benchmark
+End-to-end performance of the assistant against in-process Qdrant
+(QdrantClient(":memory:") or a local path=) and the mock LLM server, on a
+synthetic corpus with labelled questions:
+  - ingest:    files/s, chunks/s and MB/s through embed_and_store_text
+  - retrieval: embed and search latency p50/p95/p99 and recall@k / MRR for
+               dense and hybrid retrieval
+  - chat:      end-to-end latency (and time to first token when streaming)
+               with N concurrent users, plus the per-stage breakdown from metrics
+Results are written as JSON; --compare prints the differences between two runs.
+
+Local-mode Qdrant is not thread-safe, so its calls are serialised; concurrent
+chat numbers therefore include that queueing on top of the LLM's.
+
+Usage:
+    python -m benchmarks.bench_rag --docs 200 --users 8 --output run.json
+    python -m benchmarks.bench_rag --stand-in-models --qdrant-path /tmp/bench_qdrant
+    python -m benchmarks.bench_rag --compare before.json after.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import warnings
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.corpus import make_corpus, write_corpus  # noqa: E402
+from benchmarks.mock_llm import start_server  # noqa: E402
+
+STAGES = ("ingest", "retrieval", "chat")
+RECALL_AT = (1, 5, 10)
+
+
+class SerializedClient:
+    """Qdrant client wrapper that lets one thread at a time into local mode"""
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.RLock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                return attribute(*args, **kwargs)
+        return call
+
+
+def percentiles(values):
+    """p50/p95/p99/mean/max of a list of milliseconds"""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99),
+            "mean": round(sum(ordered) / len(ordered), 2), "max": round(ordered[-1], 2)}
+
+
+def configure(args, workdir, llm_url):
+    """Point the assistant's settings at the benchmark's files and servers.
+    Must run before any assistant module is imported (settings are read at import)."""
+    processed = os.path.join(workdir, "processed")
+    os.makedirs(processed, exist_ok=True)
+    os.environ.update({
+        "PROCESSED_DIR": processed,
+        "INGEST_MANIFEST_PATH": os.path.join(processed, "_ingest_manifest.sqlite"),
+        "EMBED_CACHE_DIR": os.path.join(processed, "_embedding_cache"),
+        "SLOW_REQUEST_LOG": os.path.join(workdir, "slow_requests.jsonl"),
+        "LM_API_URL": llm_url,
+        "MEMORY_COLLECTIONS": "local_memory",
+        "ANSWER_CACHE_ENABLED": str(args.answer_cache),
+        "RERANK_ENABLED": str(args.rerank)
+    })
+    if args.llm_concurrency:
+        os.environ["LLM_MAX_CONCURRENCY"] = str(args.llm_concurrency)
+    if args.score_threshold is None and args.stand_in_models:
+        # Hashing-embedder similarities are not calibrated like bge's
+        args.score_threshold = 0.0
+    if args.score_threshold is not None:
+        os.environ["SCORE_THRESHOLD"] = str(args.score_threshold)
+
+    from qdrant_client import QdrantClient
+    import vector_store
+
+    # Local mode ignores HNSW/quantization settings and payload indexes; that is expected here
+    warnings.filterwarnings("ignore", message="(Local mode|Payload indexes)")
+    client = QdrantClient(path=args.qdrant_path) if args.qdrant_path else QdrantClient(":memory:")
+    if client.collection_exists("local_memory"):
+        print(f"⚠️ Dropping local_memory from the benchmark store {args.qdrant_path}")
+        client.delete_collection("local_memory")
+    vector_store._client = SerializedClient(client)
+
+    if args.stand_in_models:
+        from benchmarks import stand_ins
+        stand_ins.install()
+
+
+def bench_ingest(documents, questions, workdir):
+    import store_incoming
+
+    incoming = os.path.join(workdir, "incoming")
+    target = os.path.join(workdir, "processed", "text_docs")
+    os.makedirs(target, exist_ok=True)
+    store_incoming.log_file_path = os.path.join(workdir, "processed", "_processing_log.txt")
+    paths = write_corpus(incoming, documents, questions)
+    megabytes = sum(os.path.getsize(path) for path in paths) / (1024 ** 2)
+
+    per_file, chunks = [], 0
+    start = time.perf_counter()
+    for path in paths:
+        file_start = time.perf_counter()
+        result = store_incoming.embed_and_store_text(path, "bench", target)
+        per_file.append((time.perf_counter() - file_start) * 1000)
+        chunks += (result or {}).get("added", 0)
+    elapsed = time.perf_counter() - start
+
+    result = {
+        "files": len(paths),
+        "chunks": chunks,
+        "megabytes": round(megabytes, 2),
+        "seconds": round(elapsed, 3),
+        "files_per_s": round(len(paths) / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 1),
+        "mb_per_s": round(megabytes / elapsed, 3),
+        "file_ms": percentiles(per_file)
+    }
+    print(f"📥 Ingest: {len(paths)} files, {chunks} chunks in {elapsed:.2f}s "
+          f"({result['chunks_per_s']} chunks/s, {result['mb_per_s']} MB/s)")
+    return result
+
+
+def bench_retrieval(questions, modes):
+    from embedding_provider import encode
+    from sparse_encoder import encode_query
+    import rag_manager
+
+    limit = max(RECALL_AT)
+    encode("warm up")
+    results = {}
+    for mode in modes:
+        embed_ms, search_ms, ranks = [], [], []
+        for item in questions:
+            start = time.perf_counter()
+            query_vector = encode(item["question"]).tolist()
+            sparse_vector = encode_query(item["question"]) if mode == "hybrid" else None
+            embedded = time.perf_counter()
+            found = rag_manager.search_memory_collections(query_vector, sparse_vector=sparse_vector, limit=limit)
+            searched = time.perf_counter()
+            embed_ms.append((embedded - start) * 1000)
+            search_ms.append((searched - embedded) * 1000)
+            filenames = [hit["filename"] for hit in found]
+            ranks.append(filenames.index(item["filename"]) + 1 if item["filename"] in filenames else None)
+
+        result = {
+            "queries": len(questions),
+            "embed_ms": percentiles(embed_ms),
+            "search_ms": percentiles(search_ms),
+            "total_ms": percentiles([e + s for e, s in zip(embed_ms, search_ms)]),
+            "mrr": round(sum(1 / rank for rank in ranks if rank) / len(ranks), 3)
+        }
+        for k in RECALL_AT:
+            result[f"recall@{k}"] = round(sum(1 for rank in ranks if rank and rank <= k) / len(ranks), 3)
+        results[mode] = result
+        print(f"🔎 Retrieval ({mode}): search p50 {result['search_ms']['p50']}ms "
+              f"p95 {result['search_ms']['p95']}ms p99 {result['search_ms']['p99']}ms, "
+              f"recall@{RECALL_AT[1]} {result[f'recall@{RECALL_AT[1]}']}, MRR {result['mrr']}")
+    return results
+
+
+def stage_breakdown():
+    """Mean and count of every metrics stage recorded so far"""
+    import metrics
+
+    with metrics._lock:
+        series = {key: list(values) for key, values in metrics.stage_seconds.series.items()}
+    breakdown = {}
+    for key, values in sorted(series.items()):
+        label = "/".join(value for _, value in key)
+        breakdown[label] = {"count": values[-1], "mean_ms": round(values[-2] / values[-1] * 1000, 2)}
+    return breakdown
+
+
+def bench_chat(questions, users, per_user, stream):
+    import metrics
+    import llm_client
+    import rag_manager
+
+    with metrics._lock:
+        metrics.stage_seconds.series.clear()
+
+    def session(user):
+        latencies, first_tokens = [], []
+        for n in range(per_user):
+            question = questions[(user * per_user + n) % len(questions)]["question"]
+            start = time.perf_counter()
+            if stream:
+                for i, _ in enumerate(rag_manager.generate_rag_response_stream(question)):
+                    if i == 0:
+                        first_tokens.append((time.perf_counter() - start) * 1000)
+            else:
+                rag_manager.generate_rag_response(question)
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies, first_tokens
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        sessions = list(pool.map(session, range(users)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [ms for session_ms, _ in sessions for ms in session_ms]
+    result = {
+        "users": users,
+        "requests": len(latencies),
+        "stream": stream,
+        "seconds": round(elapsed, 3),
+        "requests_per_s": round(len(latencies) / elapsed, 3),
+        "latency_ms": percentiles(latencies),
+        "stages": stage_breakdown(),
+        "llm": llm_client.get_stats()
+    }
+    if stream:
+        result["first_token_ms"] = percentiles([ms for _, first in sessions for ms in first])
+    print(f"💬 Chat: {users} users, {len(latencies)} requests in {elapsed:.2f}s, "
+          f"p50 {result['latency_ms']['p50']:.0f}ms p95 {result['latency_ms']['p95']:.0f}ms")
+    return result
+
+
+def environment(args):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    import embedding_provider
+    return {
+        "time": datetime.now().isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "embedding_model": "stand-in" if args.stand_in_models else embedding_provider.EMBEDDING_MODEL,
+        "qdrant": f"path={args.qdrant_path}" if args.qdrant_path else ":memory:"
+    }
+
+
+def flatten(data, prefix=""):
+    """Numeric leaves of nested dicts as {"a.b.c": value}"""
+    values = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(before_path, after_path):
+    """Print every metric that differs between two result files"""
+    with open(before_path, encoding="utf-8") as f:
+        before = flatten(json.load(f)["results"])
+    with open(after_path, encoding="utf-8") as f:
+        after = flatten(json.load(f)["results"])
+    print(f"{'metric':<48} {'before':>12} {'after':>12} {'change':>9}")
+    for name in sorted(set(before) | set(after)):
+        old, new = before.get(name), after.get(name)
+        if old == new:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ""
+        print(f"{name:<48} {'' if old is None else old:>12} {'' if new is None else new:>12} {change:>9}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and chat")
+    parser.add_argument("--docs", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ",".join(STAGES) + " (ingest always runs)")
+    parser.add_argument("--queries", type=int, default=200, help="labelled questions used for retrieval")
+    parser.add_argument("--modes", default="dense,hybrid", help="retrieval modes to measure")
+    parser.add_argument("--users", type=int, default=4, help="concurrent chat users")
+    parser.add_argument("--requests-per-user", type=int, default=5)
+    parser.add_argument("--stream", action="store_true", help="use the streaming chat path")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0, help="mock LLM token rate")
+    parser.add_argument("--ttft", type=float, default=0.3, help="mock LLM seconds to first token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--llm-parallel", type=int, default=1, help="generations the mock LLM runs at once")
+    parser.add_argument("--llm-concurrency", type=int, help="override LLM_MAX_CONCURRENCY")
+    parser.add_argument("--qdrant-path", help="local Qdrant directory instead of :memory:")
+    parser.add_argument("--score-threshold", type=float, help="override SCORE_THRESHOLD")
+    parser.add_argument("--stand-in-models", action="store_true",
+                        help="hashing embedder and tokenizer instead of the real models")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the answer cache on")
+    parser.add_argument("--rerank", action="store_true", help="enable cross-encoder reranking")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two result files")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(*args.compare)
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    server = start_server(tokens_per_second=args.tokens_per_second, ttft=args.ttft,
+                          reply_tokens=args.reply_tokens, max_parallel=args.llm_parallel)
+    configure(args, workdir, server.url)
+
+    documents, questions = make_corpus(args.seed, args.docs, args.paragraphs)
+    print(f"📄 Corpus: {len(documents)} documents, {len(questions)} labelled questions")
+    results = {}
+    try:
+        # Retrieval and chat need a populated store, so ingestion always runs first
+        results["ingest"] = bench_ingest(documents, questions, workdir)
+        if "retrieval" in stages:
+            modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+            results["retrieval"] = bench_retrieval(questions[:args.queries], modes)
+        if "chat" in stages:
+            results["chat"] = bench_chat(questions, args.users, args.requests_per_user, args.stream)
+            results["chat"]["mock_llm_requests"] = server.requests
+    finally:
+        server.shutdown()
+        import vector_store
+        vector_store.get_qdrant().close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": environment(args),
+        "config": {key: value for key, value in vars(args).items() if key not in ("compare", "output")},
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Synthetic Corpus for the Benchmarks
+Markdown-ish documents (headings, wrapped paragraphs, long sentences) with a
+few unique facts planted in each one, plus questions labelled with the file
+that answers them. The same seed always produces the same corpus.
+"""
+
+import os
+import json
+import random
+
+WORDS = ("the project budget invoice meeting whiteboard design review customer "
+         "delivery schedule report quarter revenue server database migration "
+         "assistant memory vector search ingestion pipeline document").split()
+PEOPLE = ("Patrik Leslie John Kelly Amara Bjorn Chen Dalia Emil Farah Goran Hana "
+          "Ivan Jana Kofi Lena Marco Nadia Oskar Priya").split()
+PROJECTS = ("Alpha Borealis Cobalt Delta Ember Fjord Granite Helix Iris Juniper "
+            "Kestrel Lumen Meridian Nova Onyx Polaris").split()
+
+
+def make_document(rng, paragraphs, facts=()):
+    """A markdown-ish document with headings, wrapped paragraphs and long
+    sentences; each fact sentence is placed in a random paragraph"""
+    placed = {}
+    for fact in facts:
+        placed.setdefault(rng.randrange(max(1, paragraphs)), []).append(fact)
+
+    lines = [f"# Report {rng.randint(1, 9999)}"]
+    for index in range(paragraphs):
+        if index % 8 == 0:
+            lines += ["", f"## Section {index // 8 + 1}"]
+        sentences = []
+        for _ in range(rng.randint(2, 8)):
+            words = [rng.choice(WORDS) for _ in range(rng.randint(5, 40))]
+            sentences.append(" ".join(words).capitalize() + rng.choice(".!?"))
+        for fact in placed.get(index, []):
+            sentences.insert(rng.randrange(len(sentences) + 1), fact)
+        text = " ".join(sentences)
+        # Wrap at ~80 characters like extracted PDF text
+        lines.append("")
+        lines += [text[i:i + 80] for i in range(0, len(text), 80)]
+    return "\n".join(lines)
+
+
+def make_corpus(seed=42, docs=50, paragraphs=30, facts_per_doc=3):
+    """Return (documents, questions). documents: [{"filename", "text"}];
+    questions: [{"question", "filename"}] where filename holds the answer."""
+    rng = random.Random(seed)
+    documents, questions = [], []
+    for doc_index in range(docs):
+        filename = f"bench_{doc_index:04d}.md"
+        facts = []
+        for fact_index in range(facts_per_doc):
+            code = f"INV-{doc_index:04d}-{fact_index:02d}{rng.randint(10, 99)}"
+            person, project = rng.choice(PEOPLE), rng.choice(PROJECTS)
+            amount = rng.randint(1, 900) * 100
+            facts.append(f"Invoice {code} for project {project} was approved by {person} "
+                         f"for {amount} euros.")
+            questions.append({"question": f"Who approved invoice {code}?", "filename": filename})
+            questions.append({"question": f"How much was invoice {code} for project {project}?",
+                              "filename": filename})
+        documents.append({"filename": filename, "text": make_document(rng, paragraphs, facts)})
+    return documents, questions
+
+
+def write_corpus(directory, documents, questions):
+    """Write the documents as files plus questions.json into directory"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for document in documents:
+        path = os.path.join(directory, document["filename"])
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(document["text"])
+        paths.append(path)
+    with open(os.path.join(directory, "questions.json"), "w", encoding="utf-8") as f:
+        json.dump(questions, f, indent=2)
+    return paths
@@ -0,0 +1,142 @@
+"""
+Mock LLM Server for the Benchmarks
+A stand-in for LM Studio's OpenAI-compatible /v1/chat/completions endpoint.
+Replies are generated at a fixed token rate after a fixed time to first token,
+so chat benchmarks measure the assistant's own overhead and queueing rather
+than the speed of whatever model happens to be loaded. Streaming and
+non-streaming requests are both supported; like LM Studio with one loaded
+model, only --max-parallel generations run at once and the rest wait.
+
+Usage:
+    python -m benchmarks.mock_llm --port 1234 --tokens-per-second 30 --ttft 0.3
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = ("Based on the memory context the invoice was approved by the project owner "
+          "and the amount matches the budget for this quarter").split()
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """HTTP server producing reply_tokens tokens at tokens_per_second"""
+    daemon_threads = True
+
+    def __init__(self, address, tokens_per_second=30.0, ttft=0.3, reply_tokens=60, max_parallel=1):
+        super().__init__(address, _Handler)
+        self.tokens_per_second = tokens_per_second
+        self.ttft = ttft
+        self.reply_tokens = reply_tokens
+        self.generations = threading.Semaphore(max(1, max_parallel))
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        # Clients drop keep-alive connections whenever they like
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def tokens(self):
+        return [FILLER[i % len(FILLER)] + " " for i in range(self.reply_tokens)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive, like LM Studio
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self.send_error(400, "invalid JSON")
+            return
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        with server.generations:
+            time.sleep(server.ttft)
+            if payload.get("stream"):
+                self._stream(payload, server)
+            else:
+                self._complete(payload, server)
+
+    def _complete(self, payload, server):
+        tokens = server.tokens()
+        time.sleep(len(tokens) / server.tokens_per_second)
+        body = json.dumps({
+            "id": "bench",
+            "object": "chat.completion",
+            "model": payload.get("model", "mock"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": "".join(tokens).strip()}}]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, payload, server):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        interval = 1.0 / server.tokens_per_second
+        try:
+            for token in server.tokens():
+                self._chunk({"choices": [{"index": 0, "delta": {"content": token}}]})
+                time.sleep(interval)
+            self._chunk("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the stream early
+            self.close_connection = True
+
+    def _chunk(self, data):
+        line = f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+
+def start_server(host="127.0.0.1", port=0, **options):
+    """Start a mock server in a background thread; port 0 picks a free port"""
+    server = MockLLMServer((host, port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--tokens-per-second", type=float, default=30.0)
+    parser.add_argument("--ttft", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--max-parallel", type=int, default=1, help="generations served at once")
+    args = parser.parse_args(argv)
+
+    server = MockLLMServer((args.host, args.port), tokens_per_second=args.tokens_per_second,
+                           ttft=args.ttft, reply_tokens=args.reply_tokens, max_parallel=args.max_parallel)
+    print(f"🤖 Mock LLM on {server.url} ({args.tokens_per_second:g} tokens/s, ttft {args.ttft:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+Stand-in Models for the Benchmarks
+A hashing bag-of-words embedder and a word-piece-like tokenizer that can take
+the place of the sentence-transformers model and its Hugging Face tokenizer
+on machines without torch. Retrieval quality with the hashing embedder is not
+comparable to bge, but timings of everything around the model (chunking,
+upserts, search, prompt assembly, LLM queueing) still are. Results record
+which models were used.
+"""
+
+import re
+import zlib
+import numpy as np
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+
+
+class HashingEmbedder:
+    """Normalised hashed term counts; shares the SentenceTransformer encode() shape"""
+
+    def __init__(self, dimension=1024):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        single = isinstance(texts, str)
+        batch = [texts] if single else list(texts)
+        vectors = np.zeros((len(batch), self.dimension), dtype=np.float32)
+        for row, text in enumerate(batch):
+            for word in re.findall(r"\w+", text.lower()):
+                digest = zlib.crc32(word.encode("utf-8"))
+                vectors[row, digest % self.dimension] += 1.0 if digest & 1 << 31 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors[0] if single else vectors
+
+
+class WordPieceTokenizer:
+    """Words and punctuation marks, long words split into 4-character pieces.
+    Supports the calls the chunker makes on a fast Hugging Face tokenizer."""
+    model_max_length = 512
+
+    def _offsets(self, text):
+        offsets = []
+        for match in _WORD.finditer(text):
+            start, end = match.span()
+            offsets += [(i, min(i + 4, end)) for i in range(start, end, 4)]
+        return offsets
+
+    def __call__(self, text, add_special_tokens=False, return_offsets_mapping=False, **kwargs):
+        if isinstance(text, list):
+            return {"input_ids": [list(range(len(self._offsets(t)))) for t in text]}
+        offsets = self._offsets(text)
+        encoding = {"input_ids": list(range(len(offsets)))}
+        if return_offsets_mapping:
+            encoding["offset_mapping"] = offsets
+        return encoding
+
+
+def install(model_name=None, dimension=1024):
+    """Register the stand-ins as the loaded embedding model and tokenizer"""
+    import embedding_provider
+
+    name = model_name or embedding_provider.EMBEDDING_MODEL
+    embedding_provider._models[("embedding", name)] = HashingEmbedder(dimension)
+    embedding_provider._models[("tokenizer", name)] = WordPieceTokenizer()
+    print(f"🧪 Using stand-in embedder and tokenizer for {name}")
@@ -0,0 +1,226 @@
+"""
+Chat Store for Local AI Assistant
+Keeps chat sessions server-side in SQLite (WAL mode) so the Flask cookie only
+has to carry the chat ID. Messages are append-only rows, so saving a turn costs
+the same no matter how long the conversation is. The chats table doubles as
+the metadata index for the sidebar (name, project, last_updated, message count)
+and is kept up to date on every write, so listing chats never reads message
+bodies. Chats saved as JSON files by earlier versions are imported on startup.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+CHAT_HISTORY_DIR = os.getenv("CHAT_HISTORY_DIR", "F:/AI_documents/chat_history")
+CHAT_DB_PATH = os.getenv("CHAT_DB_PATH", os.path.join(CHAT_HISTORY_DIR, "chats.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    project TEXT,
+    created TEXT NOT NULL,
+    last_updated TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages(chat_id, id);
+CREATE INDEX IF NOT EXISTS chats_project ON chats(project);
+CREATE INDEX IF NOT EXISTS chats_last_updated ON chats(last_updated);
+"""
+
+# Sort orders accepted by list_chats
+SORT_ORDERS = {
+    "last_updated": "last_updated DESC",
+    "created": "created DESC",
+    "name": "name COLLATE NOCASE ASC"
+}
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _db():
+    """One connection per thread; the schema is created on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != CHAT_DB_PATH:
+        os.makedirs(os.path.dirname(CHAT_DB_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(CHAT_DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with _schema_lock:
+            if CHAT_DB_PATH not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _schema_ready.add(CHAT_DB_PATH)
+        _local.conn, _local.path = conn, CHAT_DB_PATH
+    return conn
+
+
+def create_chat(chat_id, name, project=None, created=None):
+    """Create an empty chat (no-op if the ID already exists)"""
+    created = created or _now()
+    _db().execute(
+        "INSERT OR IGNORE INTO chats (id, name, project, created, last_updated) VALUES (?, ?, ?, ?, ?)",
+        (chat_id, name, project, created, created)
+    )
+
+
+def get_chat(chat_id):
+    """Return chat metadata (without messages), or None"""
+    row = _db().execute("SELECT * FROM chats WHERE id = ?", (chat_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_messages(chat_id):
+    """Return the chat's messages in order as [{"role", "content"}, ...]"""
+    rows = _db().execute(
+        "SELECT role, content FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
+    ).fetchall()
+    return [{"role": row["role"], "content": row["content"]} for row in rows]
+
+
+def append_messages(chat_id, messages):
+    """Append messages to a chat and bump its counters in one transaction"""
+    now = _now()
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "INSERT INTO messages (chat_id, role, content, created) VALUES (?, ?, ?, ?)",
+            [(chat_id, m["role"], m["content"], now) for m in messages]
+        )
+        conn.execute(
+            "UPDATE chats SET message_count = message_count + ?, last_updated = ? WHERE id = ?",
+            (len(messages), now, chat_id)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def update_chat(chat_id, **fields):
+    """Update name and/or project of a chat"""
+    fields = {k: v for k, v in fields.items() if k in ("name", "project")}
+    if not fields:
+        return
+    assignments = ", ".join(f"{key} = ?" for key in fields)
+    _db().execute(
+        f"UPDATE chats SET {assignments}, last_updated = ? WHERE id = ?",
+        (*fields.values(), _now(), chat_id)
+    )
+
+
+def list_chats(limit=None, offset=0, sort="last_updated", project=None):
+    """One page of chat metadata plus the total number of matching chats.
+    Served from the chats table alone, message bodies are never read."""
+    order = SORT_ORDERS.get(sort, SORT_ORDERS["last_updated"])
+    where, params = ("WHERE project = ?", [project]) if project else ("", [])
+    conn = _db()
+    total = conn.execute(f"SELECT COUNT(*) FROM chats {where}", params).fetchone()[0]
+    rows = conn.execute(
+        f"SELECT * FROM chats {where} ORDER BY {order}, id LIMIT ? OFFSET ?",
+        params + [-1 if limit is None else limit, offset]
+    ).fetchall()
+    return [dict(row) for row in rows], total
+
+
+def rebuild_index(chat_dir=None, projects_dir=None):
+    """Recompute message counts and last_updated from the stored messages, and
+    import any JSON chats on disk that are missing from the store"""
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("""
+            UPDATE chats SET
+                message_count = (SELECT COUNT(*) FROM messages WHERE messages.chat_id = chats.id),
+                last_updated = MAX(created, COALESCE(
+                    (SELECT MAX(created) FROM messages WHERE messages.chat_id = chats.id), created))
+        """)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    imported = import_json_chats(chat_dir, projects_dir) if chat_dir else 0
+    total = conn.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+    print(f"✅ Chat index rebuilt: {total} chats ({imported} imported from JSON)")
+    return {"chats": total, "imported": imported}
+
+
+def import_chat(chat_data, project=None):
+    """Import one chat saved by the old JSON format; returns False if it already exists"""
+    chat_id = chat_data.get("id")
+    if not chat_id or get_chat(chat_id):
+        return False
+
+    history = chat_data.get("history", [])
+    last_updated = chat_data.get("last_updated") or _now()
+    conn = _db()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT INTO chats (id, name, project, created, last_updated, message_count) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, chat_data.get("name") or f"Chat_{chat_id[:8]}",
+             chat_data.get("project") or project, last_updated, last_updated, len(history))
+        )
+        conn.executemany(
+            "INSERT INTO messages (chat_id, role, content, created) VALUES (?, ?, ?, ?)",
+            [(chat_id, m["role"], m["content"], last_updated) for m in history]
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def import_json_chats(chat_dir, projects_dir=None):
+    """Import legacy JSON chats from the chat folder and every project folder.
+    Files whose chat ID is already in the store are not parsed again."""
+    folders = [(chat_dir, None)]
+    if projects_dir and os.path.isdir(projects_dir):
+        folders += [(os.path.join(projects_dir, p), p) for p in os.listdir(projects_dir)
+                    if os.path.isdir(os.path.join(projects_dir, p))]
+
+    known = {row["id"] for row in _db().execute("SELECT id FROM chats")}
+    imported = 0
+    for folder, project in folders:
+        if not os.path.isdir(folder):
+            continue
+        for filename in os.listdir(folder):
+            if not filename.endswith(".json") or filename[:-5] in known:
+                continue
+            try:
+                with open(os.path.join(folder, filename), "r", encoding="utf-8") as f:
+                    chat_data = json.load(f)
+                if import_chat(chat_data, project):
+                    imported += 1
+            except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+                print(f"⚠️ Could not import chat {filename}: {e}")
+
+    if imported:
+        print(f"✅ Imported {imported} chats from JSON into {CHAT_DB_PATH}")
+    return imported
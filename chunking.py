@@ -0,0 +1,199 @@
+"""
+Chunking for RAG Assistant
+The single chunking engine used by every ingestion path. Text is split into
+sentences and headings, and the sentences are packed into chunks whose size is
+measured with the embedding model's own tokenizer, so no chunk is silently
+truncated by the model. Each text segment (a page, a block of lines) is
+tokenised once; sentence token counts come from the character offsets of that
+single pass. Chunks break before headings and consecutive chunks share a
+configurable overlap of whole sentences.
+"""
+
+import os
+import re
+import threading
+from bisect import bisect_left
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", 256))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", 32))
+# Room left for the [CLS]/[SEP] tokens and a "passage: " style prefix
+RESERVED_TOKENS = 8
+
+# A sentence ends at . ! or ? (plus closing quotes/brackets) followed by
+# whitespace and something that can start a new sentence
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*(\s+)(?=[A-Z0-9\"'(\[])")
+_MARKDOWN_HEADING = re.compile(r"^#{1,6}\s+\S")
+
+
+def _is_heading(line):
+    """Markdown headings, short lines ending in ':' and short all-caps lines"""
+    if _MARKDOWN_HEADING.match(line):
+        return True
+    if len(line) > 80:
+        return False
+    if line.endswith(":"):
+        return True
+    letters = [c for c in line if c.isalpha()]
+    return len(letters) >= 3 and line.isupper()
+
+
+def _spans(text):
+    """Yield (start, end, is_heading) for every heading and sentence in text"""
+    offset = 0
+    para_start = para_end = None
+
+    def sentences(start, end):
+        for match in _SENTENCE_END.finditer(text, start, end):
+            yield start, match.start(1), False
+            start = match.end(1)
+        if start < end:
+            yield start, end, False
+
+    for line in text.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+        if not stripped:
+            if para_start is not None:
+                yield from sentences(para_start, para_end)
+                para_start = None
+            continue
+
+        start = line_start + len(line) - len(line.lstrip())
+        end = start + len(stripped)
+        if _is_heading(stripped):
+            if para_start is not None:
+                yield from sentences(para_start, para_end)
+                para_start = None
+            yield start, end, True
+        else:
+            # Lines of one paragraph are joined so sentences can wrap
+            if para_start is None:
+                para_start = start
+            para_end = end
+    if para_start is not None:
+        yield from sentences(para_start, para_end)
+
+
+class Chunker:
+    """Token-budgeted, sentence- and heading-aware chunker"""
+
+    def __init__(self, max_tokens=None, overlap=None, model_name=None, tokenizer=None):
+        if tokenizer is None:
+            from embedding_provider import get_tokenizer
+            tokenizer = get_tokenizer(model_name)
+        self.tokenizer = tokenizer
+
+        # Never go past what the embedding model can actually see
+        model_limit = getattr(tokenizer, "model_max_length", None) or 512
+        if model_limit > 100000:  # tokenizers without a configured limit
+            model_limit = 512
+        self.max_tokens = max(16, min(max_tokens or CHUNK_MAX_TOKENS, model_limit - RESERVED_TOKENS))
+        self.overlap = max(0, min(CHUNK_OVERLAP_TOKENS if overlap is None else overlap, self.max_tokens // 2))
+
+    def _token_starts(self, text):
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True,
+                                  return_attention_mask=False, verbose=False)
+        return encoding["offset_mapping"]
+
+    def count_tokens(self, text):
+        return len(self._token_starts(text))
+
+    def count_many(self, texts):
+        """Token counts for a list of short texts (one batched tokenizer call)"""
+        if not texts:
+            return []
+        encoding = self.tokenizer(list(texts), add_special_tokens=False,
+                                  return_attention_mask=False, verbose=False)
+        return [len(ids) for ids in encoding["input_ids"]]
+
+    def units(self, text):
+        """Yield (text, token_count, is_heading) for the sentences and headings
+        of one segment, tokenising the segment once. Sentences longer than the
+        chunk budget are cut at token boundaries."""
+        offsets = self._token_starts(text)
+        starts = [start for start, _ in offsets]
+        for start, end, is_heading in _spans(text):
+            first, last = bisect_left(starts, start), bisect_left(starts, end)
+            count = last - first
+            if count <= self.max_tokens:
+                unit = " ".join(text[start:end].split())
+                if unit:
+                    yield unit, max(count, 1), is_heading
+                continue
+            # Cut into equal pieces rather than leaving a tiny remainder
+            pieces = -(-count // self.max_tokens)
+            size = -(-count // pieces)
+            for piece in range(first, last, size):
+                piece_end = min(piece + size, last)
+                unit = " ".join(text[offsets[piece][0]:offsets[piece_end - 1][1]].split())
+                if unit:
+                    yield unit, piece_end - piece, False
+
+    def iter_chunks(self, texts):
+        """Chunk a stream of text segments, yielding chunks as soon as they are full"""
+        current, total = [], 0  # (text, tokens) of the chunk being built
+        fresh = False           # current holds units not yet part of an emitted chunk
+        body = False            # ... and at least one of them is a sentence
+
+        def overlap_tail():
+            tail, size = [], 0
+            for unit, tokens in reversed(current):
+                if size + tokens > self.overlap:
+                    break
+                tail.insert(0, (unit, tokens))
+                size += tokens
+            # Never carry the whole chunk over
+            return (tail, size) if len(tail) < len(current) else ([], 0)
+
+        for text in texts:
+            for unit, tokens, is_heading in self.units(text):
+                if is_heading and (body or not fresh):
+                    # A heading starts a new chunk, with no overlap across sections;
+                    # consecutive headings stay together
+                    if body:
+                        yield " ".join(u for u, _ in current)
+                    current, total, fresh, body = [], 0, False, False
+                elif total + tokens > self.max_tokens and fresh:
+                    yield " ".join(u for u, _ in current)
+                    current, total = overlap_tail()
+                    fresh = body = False
+                # Drop overlap sentences that would not leave room for this one
+                while current and total + tokens > self.max_tokens:
+                    total -= current.pop(0)[1]
+                current.append((unit, tokens))
+                total += tokens
+                fresh = True
+                body = body or not is_heading
+        if fresh:
+            yield " ".join(u for u, _ in current)
+
+    def chunk(self, text):
+        return list(self.iter_chunks([text]))
+
+
+_chunkers = {}
+_lock = threading.Lock()
+
+
+def get_chunker(model_name=None, max_tokens=None, overlap=None):
+    """Shared Chunker for a model and budget"""
+    key = (model_name, max_tokens, overlap)
+    if key not in _chunkers:
+        with _lock:
+            if key not in _chunkers:
+                _chunkers[key] = Chunker(max_tokens=max_tokens, overlap=overlap, model_name=model_name)
+    return _chunkers[key]
+
+
+def iter_chunks(texts, model_name=None, max_tokens=None, overlap=None):
+    return get_chunker(model_name, max_tokens, overlap).iter_chunks(texts)
+
+
+def chunk_text(text, model_name=None, max_tokens=None, overlap=None):
+    return get_chunker(model_name, max_tokens, overlap).chunk(text)
@@ -0,0 +1,252 @@
+"""
+Collection Tuning for RAG Assistant
+Applies the vector storage settings from vector_store (quantization, on-disk
+originals, HNSW) to collections that already exist, shows what a collection
+currently uses, and measures recall against latency for different search
+settings so they can be picked on our own data. Qdrant re-indexes migrated
+collections in the background; `status` shows when that has finished.
+
+Usage:
+    python collection_tuning.py status local_memory
+    python collection_tuning.py migrate local_memory --quantization scalar --on-disk
+    python collection_tuning.py report local_memory --queries 200 --ef 64,128,256 --oversampling 1,2,3
+    python collection_tuning.py report local_memory --questions questions.txt --output tuning.json
+    python collection_tuning.py image-vectors image_summary_memory --images-dir F:/AI_documents/processed/Images
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from qdrant_client import models
+from vector_store import (get_qdrant, quantization_config, hnsw_config, search_params, add_image_vectors,
+                          VECTOR_QUANTIZATION, VECTOR_ON_DISK, HNSW_M, HNSW_EF_CONSTRUCT, IMAGE_VECTOR_NAME)
+
+# Bytes per dimension of the copy Qdrant keeps in RAM for searching
+BYTES_PER_DIMENSION = {"none": 4, "scalar": 1, "binary": 1 / 8}
+
+
+def _dense_vectors(info):
+    """{name: VectorParams} of a collection ('' is the unnamed vector)"""
+    vectors = info.config.params.vectors
+    return dict(vectors) if isinstance(vectors, dict) else {"": vectors}
+
+
+def _quantization_mode(config):
+    if isinstance(config, models.ScalarQuantization):
+        return "scalar"
+    if isinstance(config, models.BinaryQuantization):
+        return "binary"
+    return "none" if config is None else type(config).__name__
+
+
+def status(collection_name):
+    """Print the storage settings, size and indexing progress of a collection"""
+    info = get_qdrant().get_collection(collection_name)
+    mode = _quantization_mode(info.config.quantization_config)
+    points = info.points_count or 0
+    print(f"📊 {collection_name}: {points} points, {info.indexed_vectors_count or 0} indexed, "
+          f"status {info.status}, optimizer {info.optimizer_status}")
+    print(f"   HNSW m={info.config.hnsw_config.m}, ef_construct={info.config.hnsw_config.ef_construct}, "
+          f"quantization {mode}")
+    for name, params in _dense_vectors(info).items():
+        per_point = params.size * BYTES_PER_DIMENSION.get(mode, 4)
+        print(f"   vector '{name or 'default'}': {params.size} dims, originals "
+              f"{'on disk' if params.on_disk else 'in RAM'}, "
+              f"~{points * per_point / 1024 ** 2:.1f} MB searched in RAM")
+    return info
+
+
+def migrate(collection_name, quantization=None, on_disk=None, m=None, ef_construct=None):
+    """Apply storage settings to an existing collection in place"""
+    client = get_qdrant()
+    info = client.get_collection(collection_name)
+    mode = (quantization or VECTOR_QUANTIZATION).lower()
+    on_disk = VECTOR_ON_DISK if on_disk is None else on_disk
+    config = quantization_config(mode)
+
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={name: models.VectorParamsDiff(on_disk=on_disk) for name in _dense_vectors(info)},
+        hnsw_config=hnsw_config(m, ef_construct),
+        quantization_config=config if config is not None else models.Disabled.DISABLED
+    )
+    print(f"✅ {collection_name}: quantization {mode}, originals {'on disk' if on_disk else 'in RAM'}, "
+          f"HNSW m={m or HNSW_M}, ef_construct={ef_construct or HNSW_EF_CONSTRUCT} "
+          f"(Qdrant re-indexes in the background)")
+
+
+def _sample_queries(collection_name, count, using=None):
+    """Stored vectors of randomly sampled points, used as queries"""
+    client = get_qdrant()
+    try:
+        points = client.query_points(collection_name=collection_name,
+                                     query=models.SampleQuery(sample=models.Sample.RANDOM),
+                                     limit=count, with_vectors=True).points
+    except Exception:
+        # Servers without random sampling: take the first points instead
+        points, _ = client.scroll(collection_name=collection_name, limit=count, with_vectors=True)
+    vectors = []
+    for point in points:
+        vector = point.vector.get(using or "") if isinstance(point.vector, dict) else point.vector
+        if vector:
+            vectors.append(vector)
+    return vectors
+
+
+def _run(collection_name, queries, limit, params, using=None):
+    """Search every query; returns (result ID lists, latencies in ms)"""
+    client = get_qdrant()
+    results, latencies = [], []
+    for vector in queries:
+        start = time.perf_counter()
+        response = client.query_points(collection_name=collection_name, query=vector, using=using,
+                                       limit=limit, search_params=params, with_payload=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([point.id for point in response.points])
+    return results, latencies
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def report(collection_name, queries=100, limit=10, efs=(64, 128, 256), oversamplings=(1.0, 2.0, 3.0),
+           questions=None, using=None):
+    """Recall@limit and latency of approximate search settings, against exact
+    search on the unquantized vectors"""
+    info = status(collection_name)
+    mode = _quantization_mode(info.config.quantization_config)
+
+    if questions:
+        from embedding_provider import encode, encode_clip_text
+        # Image vectors live in CLIP's space, everything else in the embedder's
+        query_vectors = (encode_clip_text(questions) if using == IMAGE_VECTOR_NAME else encode(questions)).tolist()
+    else:
+        query_vectors = _sample_queries(collection_name, queries, using)
+    if not query_vectors:
+        print("⚠️ No queries to run")
+        return []
+
+    # Ground truth: brute force over the original float32 vectors, even in a quantized collection
+    exact, exact_latency = _run(collection_name, query_vectors, limit,
+                                models.SearchParams(exact=True,
+                                                    quantization=models.QuantizationSearchParams(ignore=True)),
+                                using)
+    rows = [{"setting": "exact", "hnsw_ef": None, "rescore": None, "oversampling": None, "recall": 1.0,
+             "p50_ms": round(_percentile(exact_latency, 0.5), 2),
+             "p95_ms": round(_percentile(exact_latency, 0.95), 2)}]
+
+    variants = []
+    for ef in efs:
+        if mode in ("scalar", "binary"):
+            variants += [(ef, rescore, oversampling) for rescore in (True, False) for oversampling in oversamplings]
+        else:
+            variants.append((ef, None, None))
+
+    for ef, rescore, oversampling in variants:
+        params = search_params(hnsw_ef=ef, rescore=rescore, oversampling=oversampling, mode=mode)
+        found, latency = _run(collection_name, query_vectors, limit, params, using)
+        hits = sum(len(set(a) & set(e)) for a, e in zip(found, exact))
+        total = sum(len(e) for e in exact) or 1
+        rows.append({"setting": f"ef={ef}" + ("" if rescore is None else
+                                              f" rescore={'on' if rescore else 'off'} x{oversampling:g}"),
+                     "hnsw_ef": ef, "rescore": rescore, "oversampling": oversampling,
+                     "recall": round(hits / total, 4),
+                     "p50_ms": round(_percentile(latency, 0.5), 2),
+                     "p95_ms": round(_percentile(latency, 0.95), 2)})
+
+    print(f"\n{len(query_vectors)} queries, recall@{limit} against exact search")
+    print(f"{'setting':<36}{'recall':>8}{'p50 ms':>9}{'p95 ms':>9}")
+    for row in rows:
+        print(f"{row['setting']:<36}{row['recall']:>8.3f}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}")
+    return rows
+
+
+def migrate_image_vectors(collection_name, images_dirs):
+    """Rebuild an image collection with named text/image vectors, computing the
+    CLIP vector of every point whose image file is found in images_dirs"""
+    import ingest_manifest
+    from store_incoming import image_embedding
+
+    def image_vector_of(payload):
+        filename = payload.get("filename")
+        for folder in images_dirs:
+            path = os.path.join(folder, filename or "")
+            if filename and os.path.isfile(path):
+                # A different file under the same name would give the wrong vector
+                if payload.get("file_hash") and ingest_manifest.file_hash(path) != payload["file_hash"]:
+                    continue
+                return image_embedding(path)
+        return None
+
+    count, with_image = add_image_vectors(collection_name, image_vector_of)
+    print(f"✅ {collection_name}: {count} points now have named vectors, {with_image} with an image vector"
+          + (f" ({count - with_image} image files not found)" if count > with_image else ""))
+
+
+def _numbers(value, cast):
+    return tuple(cast(v) for v in value.split(",") if v.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vector storage settings and recall/latency tuning")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    status_parser = commands.add_parser("status", help="show storage settings and indexing progress")
+    status_parser.add_argument("collection")
+
+    migrate_parser = commands.add_parser("migrate", help="apply storage settings to an existing collection")
+    migrate_parser.add_argument("collection")
+    migrate_parser.add_argument("--quantization", choices=["none", "scalar", "binary"],
+                                help="default: VECTOR_QUANTIZATION")
+    migrate_parser.add_argument("--on-disk", dest="on_disk", action="store_true", default=None,
+                                help="keep float32 originals on disk (default: VECTOR_ON_DISK)")
+    migrate_parser.add_argument("--in-ram", dest="on_disk", action="store_false")
+    migrate_parser.add_argument("--m", type=int, help="HNSW edges per node (default: HNSW_M)")
+    migrate_parser.add_argument("--ef-construct", type=int, help="default: HNSW_EF_CONSTRUCT")
+
+    report_parser = commands.add_parser("report", help="measure recall against latency")
+    report_parser.add_argument("collection")
+    report_parser.add_argument("--queries", type=int, default=100, help="sampled stored vectors used as queries")
+    report_parser.add_argument("--questions", help="text file with one question per line to use instead")
+    report_parser.add_argument("--limit", type=int, default=10, help="k for recall@k")
+    report_parser.add_argument("--ef", default="64,128,256", help="comma-separated hnsw_ef values")
+    report_parser.add_argument("--oversampling", default="1,2,3", help="comma-separated oversampling factors")
+    report_parser.add_argument("--vector", help="named vector to search (default: the unnamed one)")
+    report_parser.add_argument("--output", help="write the rows as JSON to this file")
+
+    image_parser = commands.add_parser("image-vectors",
+                                       help="add named text/image (CLIP) vectors to an image collection")
+    image_parser.add_argument("collection")
+    image_parser.add_argument("--images-dir", action="append",
+                              help="folder with the archived images (repeatable; default: IMAGES_DIR)")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        status(args.collection)
+    elif args.command == "migrate":
+        migrate(args.collection, args.quantization, args.on_disk, args.m, args.ef_construct)
+        status(args.collection)
+    elif args.command == "image-vectors":
+        migrate_image_vectors(args.collection,
+                              args.images_dir or [os.getenv("IMAGES_DIR", "F:/AI_documents/processed/Images")])
+        status(args.collection)
+    else:
+        questions = None
+        if args.questions:
+            with open(args.questions, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip()]
+        rows = report(args.collection, args.queries, args.limit, _numbers(args.ef, int),
+                      _numbers(args.oversampling, float), questions, args.vector)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=2)
+            print(f"📝 Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
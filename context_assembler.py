@@ -0,0 +1,150 @@
+"""
+Context Assembler for RAG Assistant
+Keeps the prompt sent to the LLM within a token budget. The most recent chat
+turns are kept verbatim, older turns are folded into a rolling summary that is
+cached (so each part of a conversation is only summarised once), and the memory
+context block is trimmed to its own budget.
+"""
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import tiktoken
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", 1500))
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", 2000))
+SUMMARY_TOKEN_LIMIT = int(os.getenv("SUMMARY_TOKEN_LIMIT", 300))
+# Older turns are folded in blocks of this many messages, so the summary is
+# only rebuilt every few turns instead of on every request
+SUMMARY_FOLD_BLOCK = int(os.getenv("SUMMARY_FOLD_BLOCK", 6))
+SUMMARY_CACHE_SIZE = 256
+
+# Per-message overhead of the chat format (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+# Prompt sizes are estimated with the cl100k_base tokenizer
+tokenizer = tiktoken.get_encoding("cl100k_base")
+
+_summaries = OrderedDict()
+_lock = threading.Lock()
+
+
+def num_tokens(text):
+    return len(tokenizer.encode(text or "", disallowed_special=()))
+
+
+def message_tokens(message):
+    return num_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def truncate_to_tokens(text, limit):
+    """Cut text down to at most `limit` tokens"""
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= limit:
+        return text
+    return tokenizer.decode(tokens[:limit]).rstrip() + " ..."
+
+
+def split_history(chat_history, budget=HISTORY_TOKEN_BUDGET):
+    """Split history into (older, recent) so recent fits in the token budget.
+    The split point is rounded up to a SUMMARY_FOLD_BLOCK boundary as long as
+    that still leaves recent turns to send verbatim."""
+    used = 0
+    boundary = len(chat_history)
+    for index in range(len(chat_history) - 1, -1, -1):
+        used += message_tokens(chat_history[index])
+        if used > budget:
+            break
+        boundary = index
+
+    if boundary > 0:
+        block = max(1, SUMMARY_FOLD_BLOCK)
+        aligned = -(-boundary // block) * block
+        if aligned < len(chat_history):
+            boundary = aligned
+    return chat_history[:boundary], chat_history[boundary:]
+
+
+def _prefix_key(messages):
+    digest = hashlib.sha1()
+    for message in messages:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _cached_summary(key):
+    with _lock:
+        if key in _summaries:
+            _summaries.move_to_end(key)
+            return _summaries[key]
+    return None
+
+
+def _store_summary(key, summary):
+    with _lock:
+        _summaries[key] = summary
+        while len(_summaries) > SUMMARY_CACHE_SIZE:
+            _summaries.popitem(last=False)
+
+
+def summarise_history(older, summarize):
+    """Return a rolling summary of `older` turns.
+    Reuses the summary of the longest already-summarised prefix and only folds
+    the turns after it. `summarize(previous_summary, turns)` does the LLM call."""
+    if not older:
+        return None
+
+    full_key = _prefix_key(older)
+    summary = _cached_summary(full_key)
+    if summary is not None:
+        return summary
+
+    # Find the longest block-aligned prefix that already has a summary
+    block = max(1, SUMMARY_FOLD_BLOCK)
+    previous, start = None, 0
+    for end in range(((len(older) - 1) // block) * block, 0, -block):
+        cached = _cached_summary(_prefix_key(older[:end]))
+        if cached is not None:
+            previous, start = cached, end
+            break
+
+    summary = truncate_to_tokens(summarize(previous, older[start:]), SUMMARY_TOKEN_LIMIT)
+    _store_summary(full_key, summary)
+    return summary
+
+
+def assemble_history(chat_history, summarize=None, budget=HISTORY_TOKEN_BUDGET):
+    """Return (summary_or_None, recent_messages) that fit the history budget.
+    Without a summarize function (or if it fails) older turns are dropped."""
+    history = [{"role": m["role"], "content": m["content"]} for m in (chat_history or [])]
+    older, recent = split_history(history, budget)
+    if not older or summarize is None:
+        return None, recent
+
+    try:
+        return summarise_history(older, summarize), recent
+    except Exception as e:
+        print(f"⚠️ Could not summarise earlier conversation, dropping it: {e}")
+        return None, recent
+
+
+def fit_blocks(blocks, budget=MEMORY_TOKEN_BUDGET, separator="\n\n"):
+    """Keep blocks in order while they fit the budget; the first block is
+    truncated rather than dropped if it is too large on its own"""
+    kept, used = [], 0
+    separator_tokens = num_tokens(separator)
+    for block in blocks:
+        cost = num_tokens(block) + (separator_tokens if kept else 0)
+        if used + cost > budget:
+            if not kept:
+                kept.append(truncate_to_tokens(block, budget))
+            break
+        kept.append(block)
+        used += cost
+    return kept
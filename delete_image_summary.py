@@ -1,4 +1,5 @@
 from qdrant_client import QdrantClient
+import ingest_manifest
 
 qdrant = QdrantClient(host="localhost", port=6333)
 
@@ -7,3 +8,5 @@ if qdrant.collection_exists("image_summary_memory"):
     print("🧹 Deleted 'image_summary_memory' collection from server.")
 else:
     print("ℹ️ 'image_summary_memory' does not exist on server.")
+# Its files are no longer stored, so re-uploading them must not be skipped
+print(f"🧹 Forgot {ingest_manifest.clear('image_summary_memory')} ingested files of 'image_summary_memory'.")
@@ -1,4 +1,5 @@
 from qdrant_client import QdrantClient
+import ingest_manifest
 
 qdrant = QdrantClient(host="localhost", port=6333)
 
@@ -7,3 +8,5 @@ if qdrant.collection_exists("local_memory"):
     print("🧹 Deleted 'local_memory' collection from server.")
 else:
     print("ℹ️ 'local_memory' does not exist on server.")
+# Its files are no longer stored, so re-uploading them must not be skipped
+print(f"🧹 Forgot {ingest_manifest.clear('local_memory')} ingested files of 'local_memory'.")
@@ -0,0 +1,217 @@
+"""
+Embedding Cache for Local AI Assistant
+Caches sentence embeddings keyed by (model name, prefix, text hash) so the same
+text is never encoded twice. Lookups go through an in-memory LRU first and then
+a compact on-disk store: a memory-mapped float16 matrix with a SQLite index of
+key -> row. The disk store has a fixed size budget and evicts the least
+recently used rows when it is full.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+PROCESSED_DIR = os.getenv("PROCESSED_DIR", "F:/AI_documents/processed")
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", os.path.join(PROCESSED_DIR, "_embedding_cache"))
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", 512))
+EMBED_CACHE_MEMORY_ITEMS = int(os.getenv("EMBED_CACHE_MEMORY_ITEMS", 10000))
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "True").lower() == "true"
+
+
+def _safe_name(model_name):
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def cache_key(model_name, prefix, text):
+    """Stable key for one (model, prefix, text) triple"""
+    return hashlib.sha1(f"{model_name}\0{prefix}\0{text}".encode("utf-8")).hexdigest()
+
+
+class DiskStore:
+    """Fixed-capacity float16 vector store for one model, backed by a memmap"""
+
+    def __init__(self, directory, model_name, dim, max_mb):
+        safe_name = _safe_name(model_name)
+        self.dim = dim
+        self.capacity = max(1, (max_mb * 1024 * 1024) // (dim * 2))
+        os.makedirs(directory, exist_ok=True)
+
+        # Size the backing file to the current budget (new rows read as zeros)
+        vectors_path = os.path.join(directory, f"{safe_name}.{dim}.f16")
+        with open(vectors_path, "ab") as f:
+            f.truncate(self.capacity * dim * 2)
+        self.vectors = np.memmap(vectors_path, dtype=np.float16, mode="r+", shape=(self.capacity, dim))
+
+        self.db = sqlite3.connect(os.path.join(directory, f"{safe_name}.{dim}.sqlite"),
+                                  check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                        "key TEXT PRIMARY KEY, slot INTEGER UNIQUE NOT NULL, last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used)")
+        # Rows beyond the current capacity (after the size budget shrank) are dropped
+        self.db.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Return {key: float32 vector} for the keys present on disk"""
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, slot in rows:
+                found[key] = np.asarray(self.vectors[slot], dtype=np.float32)
+        if found:
+            now = time.time()
+            self.db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                [(now, key) for key in found])
+        return found
+
+    def put_many(self, items):
+        """Store {key: vector}, evicting least recently used rows when full"""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            used = self.db.execute("SELECT COUNT(*), COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()
+            count, next_slot = used
+            for key, vector in items.items():
+                row = self.db.execute("SELECT slot FROM entries WHERE key = ?", (key,)).fetchone()
+                if row:
+                    slot = row[0]
+                elif next_slot < self.capacity and count < self.capacity:
+                    slot = next_slot
+                    next_slot += 1
+                    count += 1
+                else:
+                    slot = self.db.execute(
+                        "SELECT slot FROM entries ORDER BY last_used LIMIT 1").fetchone()[0]
+                    self.db.execute("DELETE FROM entries WHERE slot = ?", (slot,))
+                    self.evictions += 1
+                self.vectors[slot] = np.asarray(vector, dtype=np.float16)
+                self.db.execute("INSERT OR REPLACE INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                                (key, slot, now))
+            self.vectors.flush()
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def size(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class EmbeddingCache:
+    """In-memory LRU in front of one DiskStore per (model, dimension)"""
+
+    def __init__(self, directory=EMBED_CACHE_DIR, max_mb=EMBED_CACHE_MAX_MB,
+                 memory_items=EMBED_CACHE_MEMORY_ITEMS):
+        self.directory = directory
+        self.max_mb = max_mb
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.stores = {}
+        self.opened_models = set()
+        self.lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+    def _store(self, model_name, dim):
+        key = (model_name, dim)
+        if key not in self.stores:
+            self.stores[key] = DiskStore(self.directory, model_name, dim, self.max_mb)
+        return self.stores[key]
+
+    def _stores_for(self, model_name):
+        """Disk stores for a model, opening any left by earlier runs on first use"""
+        if model_name not in self.opened_models:
+            self.opened_models.add(model_name)
+            pattern = re.compile(re.escape(_safe_name(model_name)) + r"\.(\d+)\.sqlite$")
+            if os.path.isdir(self.directory):
+                for filename in os.listdir(self.directory):
+                    match = pattern.match(filename)
+                    if match:
+                        self._store(model_name, int(match.group(1)))
+        return [store for (name, _), store in self.stores.items() if name == model_name]
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def encode(self, model, model_name, texts, prefix="", batch_size=32):
+        """Encode texts with `model`, serving repeated (model, prefix, text) from cache"""
+        keys = [cache_key(model_name, prefix, text) for text in texts]
+        vectors = {}
+
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    vectors[key] = self.memory[key]
+            self.counters["memory_hits"] += len(vectors)
+
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            for store in self._stores_for(model_name):
+                if not missing:
+                    break
+                found = store.get_many(missing)
+                for key, vector in found.items():
+                    vectors[key] = vector
+                    self._remember(key, vector)
+                self.counters["disk_hits"] += len(found)
+                missing = [key for key in missing if key not in found]
+
+        if missing:
+            # Encode each distinct missing text once
+            texts_by_key = dict(zip(keys, texts))
+            encoded = model.encode([prefix + texts_by_key[key] for key in missing], batch_size=batch_size)
+            encoded = np.asarray(encoded, dtype=np.float32)
+            new_items = dict(zip(missing, encoded))
+
+            with self.lock:
+                self.counters["misses"] += len(missing)
+                self._store(model_name, encoded.shape[1]).put_many(new_items)
+                for key, vector in new_items.items():
+                    self._remember(key, vector)
+            vectors.update(new_items)
+
+        return np.stack([vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self):
+        """Hit/miss counters and current sizes of both tiers"""
+        with self.lock:
+            lookups = sum(self.counters.values())
+            hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_items": len(self.memory),
+                "disk_items": sum(store.size() for store in self.stores.values()),
+                "disk_evictions": sum(store.evictions for store in self.stores.values()),
+                "disk_capacity_mb": self.max_mb
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the process-wide embedding cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
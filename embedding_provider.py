@@ -0,0 +1,195 @@
+"""
+Embedding Provider for Local AI Assistant
+This module owns every heavy model used by the assistant (sentence embedder
+and its tokenizer, the reranking cross-encoder, CLIP and EasyOCR). Each model
+is loaded lazily on first use and at most once per process, so the chat route,
+the upload blueprint and the CLI scripts all share the same weights.
+"""
+
+import os
+import time
+import threading
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_DEVICE = os.getenv("RERANK_DEVICE", "cpu")
+CLIP_MODEL = os.getenv("CLIP_MODEL", "ViT-B/32")
+OCR_LANGUAGES = os.getenv("OCR_LANGUAGES", "en").split(",")
+
+# Loaded models keyed by (kind, name), plus load statistics for reporting
+_models = {}
+_stats = {}
+_lock = threading.Lock()
+
+
+def _module_bytes(module):
+    """Approximate memory held by a torch module's parameters and buffers"""
+    try:
+        tensors = list(module.parameters()) + list(module.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+
+def _load(kind, name, loader, size_of):
+    """Load a model once, recording how long it took and how much memory it holds"""
+    key = (kind, name)
+    if key in _models:
+        return _models[key]
+
+    with _lock:
+        # Another thread may have finished loading while we waited
+        if key in _models:
+            return _models[key]
+
+        print(f"⏳ Loading {kind} model: {name}")
+        start_time = time.time()
+        model = loader()
+        load_time = time.time() - start_time
+
+        _stats[key] = {
+            "kind": kind,
+            "name": name,
+            "load_seconds": round(load_time, 2),
+            "memory_mb": round(size_of(model) / (1024 ** 2), 1),
+            "loaded_at": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        _models[key] = model
+        print(f"✅ {kind} model loaded in {load_time:.2f}s "
+              f"(~{_stats[key]['memory_mb']} MB): {name}")
+        return model
+
+
+def get_embed_model(model_name=None):
+    """Return the shared SentenceTransformer, loading it on first use"""
+    name = model_name or EMBEDDING_MODEL
+
+    def loader():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+
+    return _load("embedding", name, loader, _module_bytes)
+
+
+def encode(texts, prefix="", model_name=None, batch_size=32):
+    """Encode one text or a list of texts with the shared embedder.
+    Goes through the embedding cache, so repeated texts are not re-encoded."""
+    from embedding_cache import get_cache, EMBED_CACHE_ENABLED
+
+    name = model_name or EMBEDDING_MODEL
+    model = get_embed_model(name)
+    single = isinstance(texts, str)
+    batch = [texts] if single else list(texts)
+
+    if EMBED_CACHE_ENABLED:
+        vectors = get_cache().encode(model, name, batch, prefix=prefix, batch_size=batch_size)
+    else:
+        vectors = model.encode([prefix + text for text in batch], batch_size=batch_size)
+    return vectors[0] if single else vectors
+
+
+def get_tokenizer(model_name=None):
+    """Return the embedding model's own (fast) tokenizer without loading its weights"""
+    name = model_name or EMBEDDING_MODEL
+
+    def loader():
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(name, use_fast=True)
+
+    return _load("tokenizer", name, loader, lambda tokenizer: 0)
+
+
+def get_reranker(model_name=None):
+    """Return the shared CrossEncoder used to rerank retrieved chunks"""
+    name = model_name or RERANK_MODEL
+
+    def loader():
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(name, device=RERANK_DEVICE, max_length=512)
+
+    return _load("reranker", name, loader, lambda m: _module_bytes(getattr(m, "model", None)))
+
+
+def get_clip_model(model_name=None):
+    """Return the shared (clip_model, preprocess, device) tuple"""
+    name = model_name or CLIP_MODEL
+
+    def loader():
+        import clip
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        clip_model, clip_preprocess = clip.load(name, device=device)
+        return clip_model, clip_preprocess, device
+
+    return _load("clip", name, loader, lambda m: _module_bytes(m[0]))
+
+
+def encode_images(images, model_name=None, batch_size=32):
+    """CLIP embeddings (L2-normalised rows) for PIL images or image file paths"""
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    clip_model, preprocess, device = get_clip_model(model_name)
+    vectors = []
+    for offset in range(0, len(images), batch_size):
+        tensors = []
+        for image in images[offset:offset + batch_size]:
+            if isinstance(image, str):
+                with Image.open(image) as opened:
+                    tensors.append(preprocess(opened.convert("RGB")))
+            else:
+                tensors.append(preprocess(image.convert("RGB")))
+        with torch.no_grad():
+            features = clip_model.encode_image(torch.stack(tensors).to(device))
+            features = features / features.norm(dim=-1, keepdim=True)
+        vectors.append(features.float().cpu().numpy())
+    return np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def encode_clip_text(texts, model_name=None):
+    """CLIP text embeddings (L2-normalised) for searching image vectors;
+    one text gives one vector, a list gives rows"""
+    import clip
+    import torch
+
+    clip_model, _, device = get_clip_model(model_name)
+    single = isinstance(texts, str)
+    batch = [texts] if single else list(texts)
+    with torch.no_grad():
+        # CLIP's context is 77 tokens; long questions are cut rather than rejected
+        features = clip_model.encode_text(clip.tokenize(batch, truncate=True).to(device))
+        features = features / features.norm(dim=-1, keepdim=True)
+    vectors = features.float().cpu().numpy()
+    return vectors[0] if single else vectors
+
+
+def get_ocr_reader(languages=None):
+    """Return the shared EasyOCR reader"""
+    langs = tuple(languages or OCR_LANGUAGES)
+
+    def loader():
+        import easyocr
+        import torch
+        return easyocr.Reader(list(langs), gpu=torch.cuda.is_available())
+
+    def size_of(reader):
+        return (_module_bytes(getattr(reader, "detector", None))
+                + _module_bytes(getattr(reader, "recognizer", None)))
+
+    return _load("ocr", ",".join(langs), loader, size_of)
+
+
+def is_loaded(kind, name=None):
+    """Check whether a model has already been loaded in this process"""
+    return any(k == kind and (name is None or n == name) for k, n in _models)
+
+
+def get_model_stats():
+    """Return load time and memory footprint for every model loaded so far"""
+    return list(_stats.values())
@@ -6,12 +6,14 @@ and process them into the vector database.
 
 import os
 import shutil
-import uuid
+import threading
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
+from vector_store import get_qdrant
+import ingest_queue
+from metrics import span
 
 # Create blueprint
 file_bp = Blueprint('file_upload', __name__)
@@ -32,16 +34,19 @@ SUBFOLDERS = {
 for path in [INCOMING_DIR, PROCESSED_DIR] + list(SUBFOLDERS.values()):
     os.makedirs(path, exist_ok=True)
 
-# Load models (will be initialized when blueprint is registered)
-embed_model = None
+# One lock per filename, held while a job for that name is processed
+_filename_locks = {}
+_filename_locks_lock = threading.Lock()
+
+# Qdrant client (initialized when blueprint is registered). Embedding and
+# storage go through store_incoming, which shares the embedding model.
 qdrant = None
 
 def init_models():
-    """Initialize models - called after app context is available"""
-    global embed_model, qdrant
-    embed_model = SentenceTransformer("BAAI/bge-large-en-v1.5")
-    qdrant = QdrantClient(host="localhost", port=6333)
-    print("✅ File uploader models initialized")
+    """Initialize clients - called after app context is available"""
+    global qdrant
+    qdrant = get_qdrant()
+    print("✅ File uploader initialized")
 
 def log_file_entry(filename, tag, summary, project=None):
     """Add entry to processing log"""
@@ -83,23 +88,59 @@ def upload_file():
     if tag not in ['P', 'B', 'PB']:
         return jsonify({"status": "error", "message": "Invalid tag. Use P, B, or PB"}), 400
     
-    # Save file to incoming directory
+    # Save file to its own folder in the incoming directory, so uploads with the
+    # same name can't overwrite each other while queued; the file keeps its name
     filename = secure_filename(file.filename)
-    save_path = os.path.join(INCOMING_DIR, filename)
-    file.save(save_path)
+    job_id = ingest_queue.new_job_id()
+    save_path = os.path.join(INCOMING_DIR, job_id, filename)
+    with span("save_file"):
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        file.save(save_path)
     
-    # Queue for processing
-    process_file(save_path, tag, project, description)
+    # Queue for background processing
+    with span("enqueue"):
+        job = ingest_queue.submit(save_path, tag, project, description, job_id=job_id)
     
     return jsonify({
-        "status": "success", 
+        "status": "queued", 
         "message": f"File {filename} uploaded and queued for processing",
-        "filename": filename
-    })
+        "filename": filename,
+        "job_id": job["id"]
+    }), 202
+
+@file_bp.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List ingestion jobs, optionally filtered with ?status=queued|running|done|failed"""
+    return jsonify(ingest_queue.list_jobs(request.args.get('status')))
+
+@file_bp.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Return status and progress of a single ingestion job"""
+    job = ingest_queue.get_job(job_id)
+    if not job:
+        return jsonify({"status": "error", "message": "Job not found"}), 404
+    return jsonify(job)
 
-def process_file(file_path, tag, project=None, description=None):
-    """Process a file by embedding it and storing in Qdrant"""
+def process_file(file_path, tag, project=None, description=None, progress=None):
+    """Process a file by embedding it and storing in Qdrant. Files with the same
+    name are one document, so their jobs run one at a time."""
     filename = os.path.basename(file_path)
+    with _filename_locks_lock:
+        lock = _filename_locks.setdefault(filename, threading.Lock())
+    with lock:
+        _process_file(file_path, filename, tag, project, description, progress)
+
+    # Drop the upload's job folder once its file has moved on
+    upload_dir = os.path.dirname(file_path)
+    if os.path.dirname(os.path.abspath(upload_dir)) == os.path.abspath(INCOMING_DIR):
+        try:
+            os.rmdir(upload_dir)
+        except OSError:
+            pass
+    return True
+
+def _process_file(file_path, filename, tag, project, description, progress):
+    """Embed or move one file; the caller holds the lock for its filename"""
     file_type = get_file_type(filename)
     
     # Generate initial summary
@@ -114,51 +155,31 @@ def process_file(file_path, tag, project=None, description=None):
     dest_folder = SUBFOLDERS.get(file_type, PROCESSED_DIR)
     dest_path = os.path.join(dest_folder, filename)
     
-    if file_type == "text":
-        # Process text file with your existing code from store_incoming.py
-        from store_incoming import embed_and_store_text
-        embed_and_store_text(file_path, tag, dest_folder, project=project)
-    elif file_type == "spreadsheet":
-        # Process spreadsheet (can be implemented similar to text)
+    if file_type in ("text", "spreadsheet"):
+        # Process text files and spreadsheets with the store_incoming pipeline
         from store_incoming import embed_and_store_text
-        embed_and_store_text(file_path, tag, dest_folder, project=project)
+        if not embed_and_store_text(file_path, tag, dest_folder, project=project, progress=progress):
+            raise ValueError(f"Could not extract any text from {filename}")
     elif file_type == "image":
-        # For images, store the description
+        # For images, store the description under a content-derived point ID
         if description:
-            vector = embed_model.encode("query: " + description).tolist()
-            
-            if not qdrant.collection_exists("image_summary_memory"):
-                qdrant.create_collection(
-                    collection_name="image_summary_memory",
-                    vectors_config=models.VectorParams(size=len(vector), distance=models.Distance.COSINE)
-                )
-            
-            qdrant.upsert(
-                collection_name="image_summary_memory",
-                points=[
-                    models.PointStruct(
-                        id=uuid.uuid4().int >> 64,
-                        vector=vector,
-                        payload={
-                            "filename": filename, 
-                            "tag": tag,
-                            "project": project,
-                            "summary": description
-                        }
-                    )
-                ]
-            )
+            from store_incoming import store_image_description
+            store_image_description(file_path, tag, description, project=project)
         
         # Move file to destination
         shutil.move(file_path, dest_path)
     else:
         # Just move other file types
         shutil.move(file_path, dest_path)
-    
-    return True
 
 # Register with app
 def init_app(app):
     app.register_blueprint(file_bp, url_prefix='/file', name='file_uploader_blueprint')
     with app.app_context():
-        init_models()
\ No newline at end of file
+        init_models()
+
+@file_bp.before_app_request
+def start_ingest_queue():
+    """Start the ingestion workers (and resume pending jobs) on the first request,
+    so the debug reloader's watcher process never runs jobs itself"""
+    ingest_queue.start(process_file)
\ No newline at end of file
@@ -0,0 +1,397 @@
+"""
+Image Cache for Local AI Assistant
+Remembers what has already been done to an image so it is never decoded at
+full resolution or run through OCR/CLIP twice. Entries are keyed by content
+hash (the same SHA-256 the ingest manifest uses) and hold:
+  - a downscaled working copy (JPEG, longest side IMAGE_CACHE_MAX_SIDE)
+  - 64-bit perceptual hashes (pHash from a DCT, dHash from gradients)
+  - the OCR text and CLIP image vector, tagged with the OCR languages and
+    CLIP model that produced them
+An exact content hash hit reuses the stored results without opening the file.
+Perceptual hashes are far too coarse to tell handwriting apart (two boards with
+different text in the same layout can be a few bits apart), so they only pick
+candidates: an image whose pHash and dHash are both within
+IMAGE_CACHE_MAX_DISTANCE bits of a known image is compared with that image's
+working copy, ink stroke by ink stroke after aligning the two. Only if no part
+of the image gained or lost more than IMAGE_CACHE_MAX_INK_CHANGE pixels of ink
+(a burst of shots, a re-saved or resized copy) is it a near-duplicate that
+reuses the stored OCR text and CLIP vector; anything else is analyzed afresh.
+Working copies share a size budget; the least recently used ones are deleted
+when it is full.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+from PIL import Image, ImageFilter
+from embedding_provider import CLIP_MODEL, OCR_LANGUAGES
+from ingest_manifest import file_hash
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+PROCESSED_DIR = os.getenv("PROCESSED_DIR", "F:/AI_documents/processed")
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join(PROCESSED_DIR, "_image_cache"))
+IMAGE_CACHE_ENABLED = os.getenv("IMAGE_CACHE_ENABLED", "True").lower() == "true"
+IMAGE_CACHE_MAX_SIDE = int(os.getenv("IMAGE_CACHE_MAX_SIDE", 1600))
+IMAGE_CACHE_MAX_MB = int(os.getenv("IMAGE_CACHE_MAX_MB", 2048))
+# Bits (of 64) both hashes may differ by for an image to be compared as a
+# near-duplicate candidate; 0 = exact copies only
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", 10))
+# Ink pixels (at the 800 px comparison size) any 1/16 x 1/12 tile may gain or
+# lose for two images to count as the same content; one added letter is ~100
+IMAGE_CACHE_MAX_INK_CHANGE = int(os.getenv("IMAGE_CACHE_MAX_INK_CHANGE", 16))
+
+# Near-duplicate candidates compared per lookup, closest hashes first
+_CANDIDATES = 3
+# Comparison size, tiles and how far (in comparison pixels) shots may be offset
+_COMPARE_SIDE = 800
+_COMPARE_TILES = (16, 12)
+_MAX_OFFSET = 32
+_TILE_SHIFT = 2
+
+_COLUMNS = ("content_hash", "phash", "dhash", "working", "duplicate_of",
+            "ocr_text", "ocr_languages", "image_vector", "clip_model")
+
+
+# === Working copies and perceptual hashes
+def working_size(width, height, max_side=IMAGE_CACHE_MAX_SIDE):
+    scale = min(1.0, max_side / max(width, height, 1))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode(file_path, max_side=IMAGE_CACHE_MAX_SIDE):
+    """Open an image as RGB, downscaled so its longest side is at most max_side"""
+    with Image.open(file_path) as image:
+        image.draft("RGB", working_size(*image.size, max_side))   # JPEG: decode at reduced scale
+        image = image.convert("RGB")
+    if max(image.size) > max_side:
+        image = image.resize(working_size(*image.size, max_side), Image.LANCZOS)
+    return image
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _bits_to_hex(bits):
+    return np.packbits(bits.astype(np.uint8).ravel()).tobytes().hex()
+
+
+def phash(image):
+    """64-bit DCT hash: low frequencies of a 32x32 greyscale copy against their median"""
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8]
+    return _bits_to_hex(low > np.median(low.ravel()[1:]))
+
+
+def dhash(image):
+    """64-bit gradient hash: is each pixel of a 9x8 greyscale copy brighter than its right neighbour"""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    return _bits_to_hex(pixels[:, :-1] > pixels[:, 1:])
+
+
+# === Content comparison
+def _ink(image, size):
+    """Pen strokes: pixels clearly darker than the board around them"""
+    grey = image.convert("L").resize(size, Image.BILINEAR)
+    background = np.asarray(grey.filter(ImageFilter.GaussianBlur(12)), dtype=np.int16)
+    return np.asarray(grey, dtype=np.int16) < background - 28
+
+
+def _dilate(mask):
+    return np.asarray(Image.fromarray(mask.astype(np.uint8) * 255).filter(ImageFilter.MaxFilter(3))) > 0
+
+
+def _shifted(mask, dy, dx):
+    """mask moved by (dy, dx), with zeros shifted in"""
+    height, width = mask.shape
+    out = np.zeros_like(mask)
+    out[max(-dy, 0):height - max(dy, 0), max(-dx, 0):width - max(dx, 0)] = \
+        mask[max(dy, 0):height - max(-dy, 0), max(dx, 0):width - max(-dx, 0)]
+    return out
+
+
+def _best_offset(a, b, offsets):
+    return min(offsets, key=lambda offset: np.count_nonzero(a ^ _shifted(b, *offset)))
+
+
+def _tile_sums(counts, edges_y, edges_x):
+    return np.add.reduceat(np.add.reduceat(counts, edges_y, axis=0), edges_x, axis=1)
+
+
+def ink_change(a, b):
+    """Most ink pixels any tile gains or loses between two images of a board,
+    after aligning them; 0 for the same content, ~100 for an added letter"""
+    if abs(a.size[0] / a.size[1] - b.size[0] / b.size[1]) > 0.02:
+        return float("inf")
+    size = working_size(*a.size, _COMPARE_SIDE)
+    ink_a, ink_b = _ink(a, size), _ink(b, size)
+
+    # Align: coarse offset at quarter size, refined at full comparison size
+    step = 4
+    reach = _MAX_OFFSET // step
+    dy, dx = _best_offset(ink_a[::step, ::step], ink_b[::step, ::step],
+                          [(y, x) for y in range(-reach, reach + 1) for x in range(-reach, reach + 1)])
+    dy, dx = _best_offset(ink_a, ink_b, [(dy * step + y, dx * step + x)
+                                         for y in range(-step + 1, step) for x in range(-step + 1, step)])
+
+    # Strokes with no counterpart within a pixel, per tile; each tile may move a
+    # little more on its own (small scale and perspective differences). The
+    # frame edge differs between crops and is left out.
+    height, width = ink_a.shape
+    margin = max(height, width) // 50
+    cols, rows = _COMPARE_TILES
+    edges_y = np.linspace(margin, height - margin, rows + 1).astype(int)[:-1]
+    edges_x = np.linspace(margin, width - margin, cols + 1).astype(int)[:-1]
+    inner = (slice(margin, height - margin), slice(margin, width - margin))
+    near_a = _dilate(ink_a)
+    best = None
+    for y in range(-_TILE_SHIFT, _TILE_SHIFT + 1):
+        for x in range(-_TILE_SHIFT, _TILE_SHIFT + 1):
+            moved = _shifted(ink_b, dy + y, dx + x)
+            changed = ((ink_a & ~_dilate(moved)).astype(np.int32) + (moved & ~near_a))[inner]
+            sums = _tile_sums(changed, edges_y - margin, edges_x - margin)
+            best = sums if best is None else np.minimum(best, sums)
+    return int(best.max())
+
+
+def _hash_array(hex_hashes):
+    return np.array([int(value, 16) for value in hex_hashes], dtype=np.uint64)
+
+
+def _distances(hashes, value):
+    """Hamming distance from one 64-bit hash to each of an array of them"""
+    return np.unpackbits((hashes ^ np.uint64(int(value, 16))).view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+class ImageCache:
+    """SQLite index of image entries plus a folder of working copies"""
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_mb=IMAGE_CACHE_MAX_MB,
+                 max_distance=IMAGE_CACHE_MAX_DISTANCE):
+        self.directory = directory
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_distance = max_distance
+        os.makedirs(os.path.join(directory, "working"), exist_ok=True)
+
+        self.db = sqlite3.connect(os.path.join(directory, "images.sqlite"),
+                                  check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS images ("
+                        "content_hash TEXT PRIMARY KEY, phash TEXT NOT NULL, dhash TEXT NOT NULL, "
+                        "working TEXT, working_bytes INTEGER NOT NULL DEFAULT 0, duplicate_of TEXT, "
+                        "ocr_text TEXT, ocr_languages TEXT, image_vector BLOB, clip_model TEXT, "
+                        "last_used REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS images_last_used ON images(last_used)")
+        self.lock = threading.Lock()
+        self.working_bytes = self.db.execute("SELECT COALESCE(SUM(working_bytes), 0) FROM images").fetchone()[0]
+        # Perceptual hashes of every entry, loaded on the first near-duplicate lookup,
+        # and the entries that hold OCR text or a CLIP vector
+        self.keys = None
+        self.phashes = self.dhashes = None
+        self.analyzed = None
+        self.counters = {"exact_hits": 0, "near_duplicates": 0, "misses": 0}
+
+    def _entry(self, row):
+        if row is None:
+            return None
+        entry = dict(zip(_COLUMNS, row))
+        if entry["image_vector"] is not None:
+            entry["image_vector"] = np.frombuffer(entry["image_vector"], dtype=np.float32)
+        return entry
+
+    def lookup(self, content_hash):
+        """Entry stored for this content hash, or None"""
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(_COLUMNS)} FROM images WHERE content_hash = ?",
+                                  (content_hash,)).fetchone()
+            if row:
+                self.db.execute("UPDATE images SET last_used = ? WHERE content_hash = ?",
+                                (time.time(), content_hash))
+        return self._entry(row)
+
+    def working_copy(self, file_path, content_hash, entry=None):
+        """Return (working copy, entry), decoding the original only if no copy is cached"""
+        path = entry and entry["working"] and os.path.join(self.directory, entry["working"])
+        if path and os.path.exists(path):
+            with Image.open(path) as image:
+                return image.convert("RGB"), entry
+
+        image = decode(file_path)
+        working = os.path.join("working", content_hash[:2], f"{content_hash}.jpg")
+        os.makedirs(os.path.join(self.directory, os.path.dirname(working)), exist_ok=True)
+        image.save(os.path.join(self.directory, working), "JPEG", quality=92)
+        size = os.path.getsize(os.path.join(self.directory, working))
+        hashes = (phash(image), dhash(image))
+
+        with self.lock:
+            if entry:
+                previous = self.db.execute("SELECT working_bytes FROM images WHERE content_hash = ?",
+                                           (content_hash,)).fetchone()
+                self.db.execute("UPDATE images SET working = ?, working_bytes = ?, phash = ?, dhash = ?, "
+                                "last_used = ? WHERE content_hash = ?",
+                                (working, size, *hashes, time.time(), content_hash))
+                self.working_bytes += size - (previous[0] if previous else 0)
+            else:
+                self.db.execute("INSERT OR REPLACE INTO images (content_hash, phash, dhash, working, "
+                                "working_bytes, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                                (content_hash, *hashes, working, size, time.time()))
+                self.working_bytes += size
+                if self.keys is not None:
+                    self.keys.append(content_hash)
+                    self.phashes = np.append(self.phashes, _hash_array([hashes[0]]))
+                    self.dhashes = np.append(self.dhashes, _hash_array([hashes[1]]))
+            self._evict(keep=content_hash)
+        entry = {**dict.fromkeys(_COLUMNS), **(entry or {}), "content_hash": content_hash,
+                 "phash": hashes[0], "dhash": hashes[1], "working": working}
+        return image, entry
+
+    def _evict(self, keep):
+        """Delete least recently used working copies until they fit the budget (lock held)"""
+        while self.working_bytes > self.max_bytes:
+            row = self.db.execute("SELECT content_hash, working, working_bytes FROM images "
+                                  "WHERE working IS NOT NULL AND content_hash != ? "
+                                  "ORDER BY last_used LIMIT 1", (keep,)).fetchone()
+            if row is None:
+                break
+            content_hash, working, size = row
+            try:
+                os.remove(os.path.join(self.directory, working))
+            except OSError:
+                pass
+            self.db.execute("UPDATE images SET working = NULL, working_bytes = 0 WHERE content_hash = ?",
+                            (content_hash,))
+            self.working_bytes -= size
+
+    def nearest(self, entry, image, include=()):
+        """Closest other entry showing the same content as `image` (the entry's
+        working copy), or None. Candidates are entries whose pHash and dHash are
+        both within max_distance, and which have results or are in `include`
+        (images the caller is analyzing right now); each is confirmed against
+        its working copy with ink_change()."""
+        if self.max_distance <= 0:
+            return None
+        with self.lock:
+            if self.keys is None:
+                rows = self.db.execute("SELECT content_hash, phash, dhash, "
+                                       "ocr_text IS NOT NULL OR image_vector IS NOT NULL FROM images").fetchall()
+                self.keys = [row[0] for row in rows]
+                self.phashes = _hash_array([row[1] for row in rows])
+                self.dhashes = _hash_array([row[2] for row in rows])
+                self.analyzed = {row[0] for row in rows if row[3]}
+            if not self.keys:
+                return None
+            p_distance = _distances(self.phashes, entry["phash"])
+            d_distance = _distances(self.dhashes, entry["dhash"])
+            close = (p_distance <= self.max_distance) & (d_distance <= self.max_distance)
+            close &= np.array([key != entry["content_hash"] and (key in self.analyzed or key in include)
+                               for key in self.keys])
+            distance = np.where(close, p_distance + d_distance, 129)
+            candidates = [self.keys[i] for i in np.argsort(distance, kind="stable")[:_CANDIDATES]
+                          if distance[i] < 129]
+
+        for key in candidates:
+            candidate = self.lookup(key)
+            path = candidate and candidate["working"] and os.path.join(self.directory, candidate["working"])
+            if not path or not os.path.exists(path):
+                continue
+            with Image.open(path) as working:
+                if ink_change(image, working.convert("RGB")) <= IMAGE_CACHE_MAX_INK_CHANGE:
+                    return candidate
+        return None
+
+    def results(self, entry):
+        """Cached (ocr_text, image_vector) of an entry; either is None if it is missing
+        or was made with different OCR languages / a different CLIP model"""
+        if entry is None:
+            return None, None
+        text = entry["ocr_text"] if entry["ocr_languages"] == ",".join(OCR_LANGUAGES) else None
+        vector = entry["image_vector"] if entry["clip_model"] == CLIP_MODEL else None
+        return text, vector
+
+    def is_complete(self, entry):
+        return all(value is not None for value in self.results(entry))
+
+    def store(self, content_hash, ocr_text=None, image_vector=None, duplicate_of=None):
+        """Record OCR text and/or a CLIP vector for an image that has a working copy entry"""
+        updates, values = ["last_used = ?"], [time.time()]
+        if ocr_text is not None:
+            updates += ["ocr_text = ?", "ocr_languages = ?"]
+            values += [ocr_text, ",".join(OCR_LANGUAGES)]
+        if image_vector is not None:
+            updates += ["image_vector = ?", "clip_model = ?"]
+            values += [np.asarray(image_vector, dtype=np.float32).tobytes(), CLIP_MODEL]
+        if duplicate_of is not None:
+            updates.append("duplicate_of = ?")
+            values.append(duplicate_of)
+        with self.lock:
+            self.db.execute(f"UPDATE images SET {', '.join(updates)} WHERE content_hash = ?",
+                            (*values, content_hash))
+            if self.analyzed is not None and (ocr_text is not None or image_vector is not None):
+                self.analyzed.add(content_hash)
+
+    def store_duplicate(self, content_hash, original):
+        """Copy an original's results to a near-duplicate of it"""
+        text, vector = self.results(original)
+        self.store(content_hash, text, vector, original["duplicate_of"] or original["content_hash"])
+
+    def count(self, counter):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def clip_vector(self, file_path):
+        """CLIP vector of an image file: exact and near-duplicate hits skip CLIP,
+        a miss encodes the working copy rather than the full-resolution file"""
+        from embedding_provider import encode_images
+
+        content_hash = file_hash(file_path)
+        entry = self.lookup(content_hash)
+        _, vector = self.results(entry)
+        if vector is not None:
+            self.count("exact_hits")
+            return vector
+
+        image, entry = self.working_copy(file_path, content_hash, entry)
+        original = self.nearest(entry, image)
+        _, vector = self.results(original)
+        if vector is not None:
+            self.count("near_duplicates")
+            self.store_duplicate(content_hash, original)
+            return vector
+
+        self.count("misses")
+        vector = encode_images([image])[0]
+        self.store(content_hash, image_vector=vector)
+        return vector
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                "images": self.db.execute("SELECT COUNT(*) FROM images").fetchone()[0],
+                "working_mb": round(self.working_bytes / (1024 ** 2), 1),
+                "max_mb": round(self.max_bytes / (1024 ** 2))
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_image_cache():
+    """Return the process-wide image cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache()
+    return _cache
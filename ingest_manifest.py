@@ -0,0 +1,160 @@
+"""
+Ingestion Manifest for RAG Assistant
+Keeps a local record of the content hash of every ingested file, so unchanged
+files can be skipped without re-embedding and changed files can replace their
+old chunks. Point IDs are derived from the file hash and the chunk index, so
+storing the same content twice overwrites points instead of duplicating them.
+The record is a SQLite database (WAL mode) shared by every process that
+ingests - the web app's queue, batch_ingest.py, analyze_all.py - so each
+reads the others' entries and writes only its own rows. A manifest written
+as JSON by earlier versions is imported on first use.
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+PROCESSED_DIR = os.getenv("PROCESSED_DIR", "F:/AI_documents/processed")
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", os.path.join(PROCESSED_DIR, "_ingest_manifest.sqlite"))
+LEGACY_MANIFEST_PATH = os.path.join(PROCESSED_DIR, "_ingest_manifest.json")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    collection TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (collection, filename)
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+
+def file_hash(file_path, block_size=1024 * 1024):
+    """SHA-256 of a file's content, read in blocks so large files stay cheap"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def point_id(content_hash, index=0):
+    """Deterministic Qdrant point ID for chunk `index` of a file with this content hash"""
+    return str(uuid.UUID(hashlib.md5(f"{content_hash}_{index}".encode()).hexdigest()))
+
+
+def _db():
+    """One connection per thread; the schema is created (and a JSON manifest
+    imported) on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != MANIFEST_PATH:
+        os.makedirs(os.path.dirname(MANIFEST_PATH) or ".", exist_ok=True)
+        conn = sqlite3.connect(MANIFEST_PATH, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _schema_lock:
+            if MANIFEST_PATH not in _schema_ready:
+                conn.executescript(SCHEMA)
+                _import_json(conn)
+                _schema_ready.add(MANIFEST_PATH)
+        _local.conn, _local.path = conn, MANIFEST_PATH
+    return conn
+
+
+def _import_json(conn):
+    """Move the entries of a JSON manifest into the database, once"""
+    if not os.path.exists(LEGACY_MANIFEST_PATH):
+        return
+    try:
+        with open(LEGACY_MANIFEST_PATH, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not read ingestion manifest {LEGACY_MANIFEST_PATH}: {e}")
+        return
+    with _write(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO files (collection, filename, entry) VALUES (?, ?, ?)",
+            [(entry["collection"], entry["filename"], json.dumps(entry, ensure_ascii=False))
+             for entry in entries.values()]
+        )
+    # Renamed, so entries cleared later are not imported again
+    os.replace(LEGACY_MANIFEST_PATH, LEGACY_MANIFEST_PATH + ".imported")
+    print(f"✅ Imported {len(entries)} ingestion manifest entries into {MANIFEST_PATH}")
+
+
+@contextmanager
+def _write(conn):
+    """Write transaction that also bumps the manifest generation"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+        conn.execute("INSERT INTO counters (name, value) VALUES ('generation', 1) "
+                     "ON CONFLICT(name) DO UPDATE SET value = value + 1")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def get_entry(collection, filename):
+    """Return the manifest entry for a file in a collection, or None"""
+    row = _db().execute("SELECT entry FROM files WHERE collection = ? AND filename = ?",
+                        (collection, filename)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def record(collection, filename, content_hash, chunk_count, tag=None, project=None, **extra):
+    """Record that a file's current content is stored in a collection"""
+    entry = {
+        **extra,
+        "filename": filename,
+        "collection": collection,
+        "file_hash": content_hash,
+        "chunks": chunk_count,
+        "tag": tag,
+        "project": project,
+        "ingested_at": datetime.now().isoformat()
+    }
+    conn = _db()
+    with _write(conn):
+        conn.execute("INSERT OR REPLACE INTO files (collection, filename, entry) VALUES (?, ?, ?)",
+                     (collection, filename, json.dumps(entry, ensure_ascii=False)))
+
+
+def generation():
+    """Changes whenever any process writes the manifest, i.e. after every
+    ingestion; cached answers generated before that are re-checked"""
+    row = _db().execute("SELECT value FROM counters WHERE name = 'generation'").fetchone()
+    return row[0] if row else 0
+
+
+def remove(collection, filename):
+    """Forget a file, e.g. after its points were deleted"""
+    conn = _db()
+    with _write(conn):
+        conn.execute("DELETE FROM files WHERE collection = ? AND filename = ?", (collection, filename))
+
+
+def clear(collection):
+    """Forget every file of a collection, e.g. after the collection was deleted
+    or recreated, so the files are ingested again. Returns how many were forgotten."""
+    conn = _db()
+    with _write(conn):
+        return conn.execute("DELETE FROM files WHERE collection = ?", (collection,)).rowcount
@@ -0,0 +1,211 @@
+"""
+Ingestion Job Queue for RAG Assistant
+Runs uploaded files through the ingestion pipeline on a bounded pool of
+background worker threads so /file/upload can return as soon as the file is
+saved. Workers run in-process and share the embedding model loaded by
+embedding_provider. Jobs are persisted to disk, and any job that was still
+queued or running when the process stopped is resumed on the next start.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+import metrics
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+PROCESSED_DIR = os.getenv("PROCESSED_DIR", "F:/AI_documents/processed")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+INGEST_JOBS_PATH = os.getenv("INGEST_JOBS_PATH", os.path.join(PROCESSED_DIR, "_ingest_jobs.json"))
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", 200))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+_jobs = {}
+_lock = threading.Lock()
+# Held while the pool starts, so concurrent first requests start (and resume) it once
+_start_lock = threading.Lock()
+_executor = None
+_process_fn = None
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _persist():
+    """Write the job table to disk atomically (caller holds the lock)"""
+    # Keep every unfinished job but only the most recent finished ones
+    finished = sorted(
+        (j for j in _jobs.values() if j["status"] in (DONE, FAILED)),
+        key=lambda j: j["updated"]
+    )
+    for job in finished[:max(len(finished) - INGEST_JOB_HISTORY, 0)]:
+        _jobs.pop(job["id"], None)
+
+    os.makedirs(os.path.dirname(INGEST_JOBS_PATH) or ".", exist_ok=True)
+    tmp_path = INGEST_JOBS_PATH + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(list(_jobs.values()), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, INGEST_JOBS_PATH)
+
+
+def _load():
+    """Load persisted jobs from disk"""
+    if not os.path.exists(INGEST_JOBS_PATH):
+        return []
+    try:
+        with open(INGEST_JOBS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Could not read ingestion job file {INGEST_JOBS_PATH}: {e}")
+        return []
+
+
+def _update(job_id, persist=True, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        job.update(fields)
+        job["updated"] = _now()
+        if persist:
+            _persist()
+
+
+def _run(job_id):
+    """Worker body: run one job through the processing function"""
+    job = get_job(job_id)
+    if not job:
+        return
+
+    _update(job_id, status=RUNNING, stage="starting", progress=0.0, started=_now())
+    trace = metrics.start_trace("ingest_job")
+    current = {"stage": "starting", "since": time.perf_counter()}
+
+    def end_stage():
+        metrics.observe("ingest_" + current["stage"], time.perf_counter() - current["since"])
+
+    def report(progress, stage=None):
+        # Progress updates stay in memory; only state changes hit the disk
+        fields = {"progress": round(min(max(progress, 0.0), 1.0), 3)}
+        if stage:
+            fields["stage"] = stage
+            if stage != current["stage"]:
+                end_stage()
+                current.update(stage=stage, since=time.perf_counter())
+        _update(job_id, persist=False, **fields)
+
+    try:
+        _process_fn(
+            job["path"],
+            job["tag"],
+            job.get("project"),
+            job.get("description"),
+            progress=report
+        )
+        _update(job_id, status=DONE, stage="done", progress=1.0, finished=_now())
+        print(f"✅ Ingestion job {job_id} finished: {job['filename']}")
+        status = DONE
+    except Exception as e:
+        _update(job_id, status=FAILED, stage="failed", error=f"{type(e).__name__}: {e}", finished=_now())
+        print(f"⚠️ Ingestion job {job_id} failed for {job['filename']}: {e}")
+        status = FAILED
+    end_stage()
+    # Ingestion is expected to be slow, so jobs are not written to the slow-request log
+    metrics.finish_trace(trace, status, log_slow=False)
+
+
+def start(process_fn, workers=None):
+    """Start the worker pool and resume jobs left over from a previous run"""
+    global _executor, _process_fn
+    if _executor is not None:
+        return
+
+    with _start_lock:
+        # Another request may have started the pool while we waited
+        if _executor is not None:
+            return
+
+        _process_fn = process_fn
+        executor = ThreadPoolExecutor(max_workers=workers or INGEST_WORKERS, thread_name_prefix="ingest")
+
+        resumed = []
+        with _lock:
+            for job in _load():
+                if job.get("status") in (QUEUED, RUNNING):
+                    if os.path.exists(job["path"]):
+                        job.update(status=QUEUED, stage="queued", progress=0.0, updated=_now())
+                        resumed.append(job["id"])
+                    else:
+                        job.update(status=FAILED, stage="failed", updated=_now(),
+                                   error="File no longer in incoming folder after restart")
+                _jobs[job["id"]] = job
+            _persist()
+
+        for job_id in resumed:
+            executor.submit(_run, job_id)
+        # Published last: submit() treats a set _executor as "started"
+        _executor = executor
+
+    print(f"✅ Ingestion queue started with {workers or INGEST_WORKERS} workers"
+          + (f", resumed {len(resumed)} pending jobs" if resumed else ""))
+
+
+def new_job_id():
+    return str(uuid.uuid4())
+
+
+def submit(file_path, tag, project=None, description=None, job_id=None):
+    """Queue a saved file for ingestion and return its job record. job_id lets
+    the caller pick the id (from new_job_id()) before the file is saved"""
+    if _executor is None:
+        raise RuntimeError("Ingestion queue has not been started")
+
+    job = {
+        "id": job_id or new_job_id(),
+        "filename": os.path.basename(file_path),
+        "path": file_path,
+        "tag": tag,
+        "project": project,
+        "description": description,
+        "status": QUEUED,
+        "stage": "queued",
+        "progress": 0.0,
+        "error": None,
+        "created": _now(),
+        "updated": _now()
+    }
+    with _lock:
+        _jobs[job["id"]] = job
+        _persist()
+
+    # Persist before submitting so a crash can never lose an accepted upload
+    _executor.submit(_run, job["id"])
+    return dict(job)
+
+
+def get_job(job_id):
+    """Return a copy of a job record, or None if it is unknown"""
+    with _lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_jobs(status=None):
+    """Return job records, most recent first, optionally filtered by status"""
+    with _lock:
+        jobs = [dict(j) for j in _jobs.values() if status is None or j["status"] == status]
+    jobs.sort(key=lambda j: j["created"], reverse=True)
+    return jobs
@@ -0,0 +1,209 @@
+"""
+LLM Client for RAG Assistant
+The single way the assistant talks to LM Studio's OpenAI-compatible API. One
+keep-alive requests.Session (with a connection pool) is shared by every
+thread, and a semaphore limits how many generations run at once; the local
+model works through requests one at a time anyway, so extra callers wait here
+in an orderly queue instead of piling up and timing out inside LM Studio.
+Identical non-streaming prompts that are already in flight are coalesced, so
+the second caller gets the first caller's answer. Queue depth, waits and
+latencies are kept for reporting.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+from metrics import observe
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+LM_API_URL = os.getenv("LM_API_URL", "http://127.0.0.1:1234/v1/chat/completions")
+MODEL_NAME = os.getenv("MODEL_NAME", "llama-3-13b-instruct")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 1))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 8))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+# How long a request may wait for a free generation slot
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 180))
+LLM_COALESCE = os.getenv("LLM_COALESCE", "True").lower() == "true"
+
+
+class LLMBusyError(requests.exceptions.RequestException):
+    """No generation slot became free within LLM_QUEUE_TIMEOUT"""
+
+
+_session = None
+_session_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+_inflight = {}            # prompt key -> _Call shared by coalesced callers
+_inflight_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"requests": 0, "streams": 0, "coalesced": 0, "errors": 0, "busy": 0,
+          "queue_depth": 0, "max_queue_depth": 0, "active": 0}
+_waits = deque(maxlen=500)       # ms spent waiting for a slot
+_latencies = deque(maxlen=500)   # ms per generation (to the last token)
+
+
+def get_session():
+    """Return the shared keep-alive session"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Retry only failed connects (a POST that reached the model is not repeated)
+                retry = Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.3, allowed_methods=None)
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE, max_retries=retry)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _count(**deltas):
+    with _stats_lock:
+        for key, delta in deltas.items():
+            _stats[key] += delta
+        _stats["max_queue_depth"] = max(_stats["max_queue_depth"], _stats["queue_depth"])
+
+
+class _Slot:
+    """Context manager holding one generation slot, with queue accounting"""
+
+    def __enter__(self):
+        _count(queue_depth=1)
+        start = time.perf_counter()
+        acquired = _slots.acquire(timeout=LLM_QUEUE_TIMEOUT)
+        _count(queue_depth=-1)
+        if not acquired:
+            _count(busy=1)
+            raise LLMBusyError(f"LLM busy: no free slot after {LLM_QUEUE_TIMEOUT:g}s")
+        waited = time.perf_counter() - start
+        _waits.append(waited * 1000)
+        observe("llm_queue", waited)
+        _count(active=1)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _latencies.append((time.perf_counter() - self.start) * 1000)
+        _count(active=-1, errors=1 if exc_type else 0)
+        _slots.release()
+
+
+class _Call:
+    """Result of one in-flight request, shared with coalesced callers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _payload(messages, temperature, top_p, stream=False, **extra):
+    payload = {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "temperature": temperature,
+        "top_p": top_p,
+        **extra
+    }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+
+def _post(payload):
+    with _Slot():
+        response = get_session().post(LM_API_URL, json=payload,
+                                      timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT))
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+
+def complete(messages, temperature=0.7, top_p=0.9, **extra):
+    """Return the completion text for a chat; raises requests exceptions on failure"""
+    payload = _payload(messages, temperature, top_p, **extra)
+    _count(requests=1)
+    if not LLM_COALESCE:
+        return _post(payload)
+
+    key = hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight[key] = _Call()
+    if not leader:
+        _count(coalesced=1)
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = _post(payload)
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+        call.done.set()
+
+
+def stream(messages, temperature=0.7, top_p=0.9, **extra):
+    """Yield content tokens as they arrive; raises requests exceptions on failure.
+    The generation slot is held until the stream ends or is closed."""
+    payload = _payload(messages, temperature, top_p, stream=True, **extra)
+    _count(requests=1, streams=1)
+    with _Slot():
+        with get_session().post(LM_API_URL, json=payload, stream=True,
+                                timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT)) as response:
+            response.raise_for_status()
+
+            # OpenAI-compatible servers send one "data: {...}" line per chunk
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                choices = chunk.get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    yield token
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1) if ordered else 0.0
+
+
+def get_stats():
+    """Request counters, current queue depth and wait/latency percentiles (ms)"""
+    with _stats_lock:
+        stats = dict(_stats)
+    waits, latencies = list(_waits), list(_latencies)
+    stats.update({
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "wait_p50_ms": _percentile(waits, 0.5),
+        "wait_p95_ms": _percentile(waits, 0.95),
+        "latency_p50_ms": _percentile(latencies, 0.5),
+        "latency_p95_ms": _percentile(latencies, 0.95)
+    })
+    return stats
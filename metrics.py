@@ -0,0 +1,216 @@
+"""
+Metrics for Local AI Assistant
+Per-request latency breakdown for the chat and upload routes. A trace is
+started for each traced request and carried in a context variable; code on the
+request path wraps its stages in span("embed"), span("search", collection=...)
+and so on. Every span is aggregated into a Prometheus-style latency histogram
+and attached to the request's trace. Requests slower than SLOW_REQUEST_MS are
+written with their stage breakdown to the slow-request log. The aggregated
+histograms are served as Prometheus text on /metrics.
+"""
+
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", 30000))
+SLOW_REQUEST_LOG = os.getenv("SLOW_REQUEST_LOG", "F:/AI_documents/logs/slow_requests.jsonl")
+TRACED_PATHS = {p.strip() for p in os.getenv("TRACED_PATHS", "/chat,/chat_stream,/file/upload").split(",") if p.strip()}
+
+# Histogram bucket bounds in seconds (from embedding lookups up to long generations)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+_current = contextvars.ContextVar("metrics_trace", default=None)
+_lock = threading.Lock()
+_gauges = []   # (name, help, fn) read when /metrics is rendered
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram keyed by a label tuple"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.series = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels, seconds):
+        key = tuple(sorted(labels.items()))
+        with _lock:
+            series = self.series.setdefault(key, [0] * len(BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            series = {key: list(values) for key, values in self.series.items()}
+        for key, values in sorted(series.items()):
+            labels = ",".join(f'{k}="{v}"' for k, v in key)
+            prefix = f"{labels}," if labels else ""
+            for bound, count in zip(BUCKETS, values):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {values[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {values[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {values[-1]}")
+        return lines
+
+
+stage_seconds = Histogram("rag_stage_seconds", "Latency of one stage of a request")
+request_seconds = Histogram("rag_request_seconds", "End-to-end latency of traced requests")
+
+
+class Trace:
+    """Stages recorded for one request (spans may come from worker threads)"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = []
+        self.deferred = False
+        self.finished = False
+        self.lock = threading.Lock()
+
+    def add(self, stage, labels, seconds):
+        with self.lock:
+            self.spans.append({"stage": stage, **labels, "ms": round(seconds * 1000, 1)})
+
+
+def current_trace():
+    return _current.get()
+
+
+def start_trace(name):
+    """Start a trace and make it current for this context"""
+    trace = Trace(name)
+    _current.set(trace)
+    return trace
+
+
+@contextmanager
+def use_trace(trace):
+    """Make an existing trace current, e.g. inside a streaming response generator"""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def defer_trace():
+    """Keep the current trace open after the view returns (streamed responses);
+    the caller finishes it with finish_trace once the stream is done"""
+    trace = _current.get()
+    if trace:
+        trace.deferred = True
+    return trace
+
+
+def observe(stage, seconds, **labels):
+    """Record a stage duration measured elsewhere"""
+    stage_seconds.observe({"stage": stage, **labels}, seconds)
+    trace = _current.get()
+    if trace:
+        trace.add(stage, labels, seconds)
+
+
+@contextmanager
+def span(stage, **labels):
+    """Time a block as one stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, **labels)
+
+
+def in_context(fn):
+    """Wrap fn so it runs with the caller's trace when submitted to a thread pool"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def finish_trace(trace, status="ok", log_slow=True):
+    """Record the request's total latency and log it if it was slow"""
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    total = time.perf_counter() - trace.started
+    request_seconds.observe({"route": trace.name, "status": str(status)}, total)
+    if log_slow and total * 1000 >= SLOW_REQUEST_MS:
+        _log_slow(trace, total, status)
+
+
+def _log_slow(trace, total, status):
+    with trace.lock:
+        spans = list(trace.spans)
+    breakdown = ", ".join(
+        f"{s['stage']}{'[' + s['collection'] + ']' if s.get('collection') else ''} {s['ms']:.0f}ms" for s in spans
+    )
+    print(f"🐢 Slow request {trace.name} ({status}) took {total:.1f}s: {breakdown or 'no stages recorded'}")
+    try:
+        os.makedirs(os.path.dirname(SLOW_REQUEST_LOG) or ".", exist_ok=True)
+        with open(SLOW_REQUEST_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps({
+                "time": datetime.now().isoformat(),
+                "route": trace.name,
+                "status": status,
+                "total_ms": round(total * 1000, 1),
+                "stages": spans
+            }) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not write slow-request log {SLOW_REQUEST_LOG}: {e}")
+
+
+def register_gauge(name, help_text, fn):
+    """Expose a value computed at scrape time (e.g. LLM queue depth)"""
+    _gauges.append((name, help_text, fn))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = stage_seconds.render() + request_seconds.render()
+    for name, help_text, fn in _gauges:
+        try:
+            value = float(fn())
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Trace requests to TRACED_PATHS and serve /metrics"""
+    from flask import request, Response
+
+    @app.before_request
+    def _start_request_trace():
+        if request.path in TRACED_PATHS:
+            start_trace(request.path)
+        else:
+            _current.set(None)
+
+    @app.after_request
+    def _finish_request_trace(response):
+        trace = _current.get()
+        if trace:
+            if not trace.deferred:
+                finish_trace(trace, response.status_code)
+            # Threads are reused across requests; don't leak the trace into the next one
+            _current.set(None)
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
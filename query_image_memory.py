@@ -1,20 +1,24 @@
 import os
-import torch
-from sentence_transformers import SentenceTransformer, util
+from embedding_provider import get_embed_model, encode_clip_text
+from vector_store import has_image_vectors, IMAGE_VECTOR_NAME
 from qdrant_client import QdrantClient, models
 
 # === Config ===
 collection_name = "image_summary_memory"
 tag_to_search = "PB"  # Change as needed
 
-# === Load embedding model
-text_model = SentenceTransformer('BAAI/bge-base-en-v1.5')
+# === Load embedding model (the one the collection was built with)
+text_model = get_embed_model()
 
 # === Get user query
 query = input("🔍 Enter your image memory question: ")
 
-# === Get embedding for semantic search
-query_vector = text_model.encode("query: " + query).tolist()
+# === Search by image content (CLIP) when the collection has image vectors,
+# otherwise by the stored summaries
+if has_image_vectors(collection_name):
+    query_vector, using = encode_clip_text(query).tolist(), IMAGE_VECTOR_NAME
+else:
+    query_vector, using = text_model.encode("query: " + query).tolist(), None
 
 # === Connect to Qdrant
 qdrant = QdrantClient(host="localhost", port=6333, timeout=30.0)
@@ -33,6 +37,7 @@ filter_condition = models.Filter(
 response = qdrant.query_points(
     collection_name=collection_name,
     query=query_vector,
+    using=using,
     limit=5,
     with_payload=True,
     query_filter=filter_condition
@@ -41,7 +46,7 @@ response = qdrant.query_points(
 # === Show results
 print("\n🖼️ Top Image Matches:")
 for r in response:
-    caption = r.payload.get("caption", "")
+    summary = r.payload.get("summary", "")
     filename = r.payload.get("filename", "Unknown")
     print(f"🔹 Score: {r.score:.4f} | File: {filename}")
-    print(f"   📝 Caption: {caption}\n")
+    print(f"   📝 Summary: {summary}\n")
@@ -1,25 +1,18 @@
 import os
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-import clip
-import torch
+from embedding_provider import get_embed_model, encode_clip_text
+from vector_store import has_image_vectors, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME
 
-# === Load models
-text_model = SentenceTransformer('BAAI/bge-large-en-v1.5')
-print("✅ Text embedding model loaded: bge-large-en-v1.5")
-clip_model, clip_preprocess = clip.load("ViT-B/32")
-print("✅ CLIP model loaded")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-clip_model.to(device)
+# === Load model (shared loader, reports load time and memory; CLIP loads on first use)
+text_model = get_embed_model()
 
 # === User query input
 query = input("🔍 Enter your memory question: ")
 
-# === Encode query for each modality
+# === Encode query for each modality (CLIP only if images have CLIP vectors)
 text_vector = text_model.encode("query: " + query).tolist()
-with torch.no_grad():
-    clip_tokens = clip.tokenize([query]).to(device)
-    clip_vector = clip_model.encode_text(clip_tokens).cpu().numpy()[0].tolist()
+image_vectors = has_image_vectors("image_summary_memory")
+clip_vector = encode_clip_text(query).tolist() if image_vectors else None
 
 # === Connect to Qdrant (server)
 qdrant = QdrantClient(host="localhost", port=6333)
@@ -29,11 +22,12 @@ filter_condition = None
 
 # === Search function
 
-def search_collection(collection_name, vector, top_k=3):
+def search_collection(collection_name, vector, top_k=3, using=None):
     try:
         response = qdrant.query_points(
             collection_name=collection_name,
             query=vector,
+            using=using,
             limit=top_k,
             with_payload=True,
             query_filter=filter_condition
@@ -59,9 +53,13 @@ print("\n🔎 Searching text memory...")
 doc_results_local = search_collection("local_memory", text_vector, top_k=3)
 
 print("\n🔎 Searching image memory...")
-img_results = search_collection("image_summary_memory", clip_vector, top_k=3)
+# Image summaries are bge vectors ("text"), image content is CLIP ("image")
+img_results = search_collection("image_summary_memory", text_vector, top_k=3,
+                                using=TEXT_VECTOR_NAME if image_vectors else None)
+pixel_results = search_collection("image_summary_memory", clip_vector, top_k=3,
+                                  using=IMAGE_VECTOR_NAME) if image_vectors else []
 
-# === Combine and sort
+# === Combine and sort (bge scores only; CLIP scores are on a different scale)
 combined = sorted(doc_results_local + img_results, key=lambda x: x["score"], reverse=True)
 
 # === Apply threshold and limit to top 1
@@ -81,3 +79,8 @@ if top_result:
     print("----- SYSTEM PROMPT END -----")
 else:
     print("⚠️ No results above confidence threshold.")
+
+if pixel_results:
+    print("\n🖼️ Images matching by content (CLIP):")
+    for r in pixel_results:
+        print(f"🔹 Score: {r['score']:.4f} | [{r['tag']}] {r['filename']}")
@@ -1,26 +1,19 @@
 import os
 import re
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
-import clip
-import torch
+from embedding_provider import get_embed_model, encode_clip_text
+from vector_store import has_image_vectors, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME
 
-# === Load models
-text_model = SentenceTransformer('BAAI/bge-large-en-v1.5')
-print("✅ Text embedding model loaded: bge-large-en-v1.5")
-clip_model, clip_preprocess = clip.load("ViT-B/32")
-print("✅ CLIP model loaded")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-clip_model.to(device)
+# === Load model (shared loader, reports load time and memory; CLIP loads on first use)
+text_model = get_embed_model()
 
 # === User query input
 query = input("🔍 Enter your memory question: ").strip()
 
-# === Encode query
+# === Encode query (CLIP only if images have CLIP vectors)
 text_vector = text_model.encode("query: " + query).tolist()
-with torch.no_grad():
-    clip_tokens = clip.tokenize([query]).to(device)
-    clip_vector = clip_model.encode_text(clip_tokens).cpu().numpy()[0].tolist()
+image_vectors = has_image_vectors("image_summary_memory")
+clip_vector = encode_clip_text(query).tolist() if image_vectors else None
 
 # === Extract target keyword for entity match
 name_match = None
@@ -33,11 +26,12 @@ for word in query.split():
 qdrant = QdrantClient(host="localhost", port=6333)
 
 # === Search function
-def search_collection(collection_name, vector, top_k=5):
+def search_collection(collection_name, vector, top_k=5, using=None):
     try:
         response = qdrant.query_points(
             collection_name=collection_name,
             query=vector,
+            using=using,
             limit=top_k,
             with_payload=True
         )
@@ -58,8 +52,12 @@ def search_collection(collection_name, vector, top_k=5):
         return []
 
 # === Perform searches
+# Image summaries are bge vectors ("text"), image content is CLIP ("image")
 doc_results = search_collection("local_memory", text_vector)
-img_results = search_collection("image_summary_memory", clip_vector)
+img_results = search_collection("image_summary_memory", text_vector,
+                                using=TEXT_VECTOR_NAME if image_vectors else None)
+pixel_results = search_collection("image_summary_memory", clip_vector,
+                                  using=IMAGE_VECTOR_NAME) if image_vectors else []
 
 combined = sorted(doc_results + img_results, key=lambda x: x["score"], reverse=True)
 
@@ -86,4 +84,10 @@ if relevant_results:
 else:
     print("⚠️ No matching information found for this question.")
     if name_match:
-        print(f"ℹ️ Memory does not contain any reference to '{name_match}'.")
\ No newline at end of file
+        print(f"ℹ️ Memory does not contain any reference to '{name_match}'.")
+
+# CLIP scores are on a different scale, so image content matches are listed separately
+if pixel_results:
+    print("\n🖼️ Images matching by content (CLIP):")
+    for r in pixel_results:
+        print(f"🔹 Score: {r['score']:.4f} | [{r['tag']}] {r['filename']}")
\ No newline at end of file
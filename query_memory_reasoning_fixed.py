@@ -1,11 +1,11 @@
 import os
 import re
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+from embedding_provider import get_embed_model
+from vector_store import has_image_vectors, TEXT_VECTOR_NAME
 
 # === Load model
-text_model = SentenceTransformer('BAAI/bge-large-en-v1.5')
-print("✅ Text embedding model loaded: bge-large-en-v1.5")
+text_model = get_embed_model()
 
 # === User query input
 query = input("🔍 Enter your memory question: ").strip()
@@ -24,11 +24,12 @@ for word in query.split():
 qdrant = QdrantClient(host="localhost", port=6333)
 
 # === Search function
-def search_collection(collection_name, vector, top_k=5):
+def search_collection(collection_name, vector, top_k=5, using=None):
     try:
         response = qdrant.query_points(
             collection_name=collection_name,
             query=vector,
+            using=using,
             limit=top_k,
             with_payload=True
         )
@@ -50,7 +51,8 @@ def search_collection(collection_name, vector, top_k=5):
 
 # === Perform searches using text model only
 doc_results = search_collection("local_memory", text_vector)
-img_results = search_collection("image_summary_memory", text_vector)
+img_results = search_collection("image_summary_memory", text_vector,
+                                using=TEXT_VECTOR_NAME if has_image_vectors("image_summary_memory") else None)
 
 combined = sorted(doc_results + img_results, key=lambda x: x["score"], reverse=True)
 
@@ -1,13 +1,14 @@
 from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+from embedding_provider import get_embed_model
+from vector_store import has_image_vectors, TEXT_VECTOR_NAME
 
 # === Config
 collection_name = "image_summary_memory"
 tag = "PB"
 query = input("🔍 Enter your question about a stored whiteboard: ")
 
-# === Load embedding model
-model = SentenceTransformer("BAAI/bge-base-en-v1.5")
+# === Load embedding model (the one the collection was built with)
+model = get_embed_model()
 query_vector = model.encode("query: " + query)
 
 # === Connect to Qdrant
@@ -27,6 +28,7 @@ filter_condition = models.Filter(
 response = qdrant.query_points(
     collection_name=collection_name,
     query=query_vector.tolist(),
+    using=TEXT_VECTOR_NAME if has_image_vectors(collection_name) else None,
     limit=5,
     with_payload=True,
     query_filter=filter_condition
@@ -5,106 +5,239 @@ implementing Retrieval Augmented Generation for the chatbot.
 """
 
 import os
+import math
+import time
 import requests
-import json
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+from qdrant_client import models
 from dotenv import load_dotenv
+from embedding_provider import encode, encode_clip_text
+from vector_store import (get_qdrant, has_sparse_vectors, has_image_vectors, search_params, forget_collection,
+                          is_vector_name_error, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME)
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_query
+import reranker
+import llm_client
+from answer_cache import AnswerCache, get_answer_cache
+from metrics import span, observe, in_context
+from context_assembler import assemble_history, fit_blocks, truncate_to_tokens
 
 # Load environment variables
 load_dotenv()
 
 # === Configuration ===
-LM_API_URL = os.getenv("LM_API_URL", "http://127.0.0.1:1234/v1/chat/completions")
+# LM Studio URL, timeouts and concurrency are configured in llm_client
 MODEL_NAME = os.getenv("MODEL_NAME", "llama-3-13b-instruct")
 TOP_K = int(os.getenv("TOP_K", 10))
 SCORE_THRESHOLD = float(os.getenv("SCORE_THRESHOLD", 0.4))
-EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
+MEMORY_COLLECTIONS = [c.strip() for c in os.getenv("MEMORY_COLLECTIONS", "local_memory,image_summary_memory").split(",") if c.strip()]
+COLLECTION_TIMEOUT = float(os.getenv("COLLECTION_TIMEOUT", 5))
+# "dense" searches the bge vectors only; "hybrid" also matches BM25 terms and
+# fuses both rankings with reciprocal-rank fusion
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+HYBRID_PREFETCH = int(os.getenv("HYBRID_PREFETCH", 40))
+# Qdrant's RRF constant: a point ranked first contributes 1 / RRF_K
+RRF_K = 2
+# Image collections are also searched by pixels: the question's CLIP text
+# embedding against the stored CLIP image vectors, fused with the summary match.
+# CLIP text-to-image similarities are much lower than bge's, hence a separate threshold.
+IMAGE_SEARCH_ENABLED = os.getenv("IMAGE_SEARCH_ENABLED", "True").lower() == "true"
+IMAGE_SCORE_THRESHOLD = float(os.getenv("IMAGE_SCORE_THRESHOLD", 0.2))
 
-# Initialize clients and models
-embed_model = SentenceTransformer(EMBEDDING_MODEL)
-qdrant = QdrantClient(
-    host=os.getenv("QDRANT_HOST", "localhost"),
-    port=int(os.getenv("QDRANT_PORT", 6333))
-)
+# Shared Qdrant client (the embedding model is loaded lazily by embedding_provider)
+qdrant = get_qdrant()
 
-def retrieve_memory_context(query, project_filter=None, tag_filter=None):
-    """Retrieve relevant memory context based on query similarity"""
-    query_vector = embed_model.encode(query).tolist()
+# Collection searches run concurrently on this pool
+_search_pool = ThreadPoolExecutor(max_workers=max(4, len(MEMORY_COLLECTIONS)), thread_name_prefix="qdrant-search")
+
+# Set when CLIP can't be loaded, so image vectors are not searched again
+_clip_failed = False
+
+def build_memory_filter(project_filter=None, tag_filter=None):
+    """Build the Qdrant payload filter for project/tag scoping, or None"""
+    filter_conditions = []
+    if project_filter:
+        filter_conditions.append(
+            models.FieldCondition(
+                key="project",
+                match=models.MatchValue(value=project_filter)
+            )
+        )
+    if tag_filter:
+        filter_conditions.append(
+            models.FieldCondition(
+                key="tag",
+                match=models.MatchValue(value=tag_filter)
+            )
+        )
     
-    def search_memory(collection):
-        try:
-            # Build filter conditions if needed
-            filter_conditions = []
-            if project_filter:
-                filter_conditions.append(
-                    models.FieldCondition(
-                        key="project",
-                        match=models.MatchValue(value=project_filter)
-                    )
-                )
-            if tag_filter:
-                filter_conditions.append(
-                    models.FieldCondition(
-                        key="tag",
-                        match=models.MatchValue(value=tag_filter)
-                    )
-                )
-                
-            # Apply filter if conditions exist
-            query_filter = None
-            if filter_conditions:
-                query_filter = models.Filter(
-                    must=filter_conditions
-                )
-            
-            response = qdrant.query_points(
+    # Apply filter if conditions exist
+    if filter_conditions:
+        return models.Filter(must=filter_conditions)
+    return None
+
+def search_memory(collection, query_vector, query_filter=None, limit=TOP_K, sparse_vector=None,
+                  image_vector=None, _refreshed=False):
+    """Search one collection and return scored results above SCORE_THRESHOLD.
+    With a sparse query vector the dense and BM25 candidates are fetched in the
+    same request and fused with RRF; in an image collection the CLIP query
+    vector is matched against the image vectors and fused the same way.
+    Fused scores are scaled by the number of rankings the query fuses (not the
+    ones this collection has), so a point ranked first by every ranking scores
+    1.0 and equal ranks score the same in every collection."""
+    try:
+        # Image collections keep the summary embedding as the named "text" vector
+        named = has_image_vectors(collection)
+        using = TEXT_VECTOR_NAME if named else None
+        timeout = max(1, math.ceil(COLLECTION_TIMEOUT))
+        rankings = 1 + (sparse_vector is not None) + (image_vector is not None)
+        scale = RRF_K / rankings if rankings > 1 else 1.0
+        with_sparse = sparse_vector is not None and has_sparse_vectors(collection)
+        with_image = named and image_vector is not None
+
+        if not with_sparse and not with_image:
+            # Nothing to fuse with: a plain dense search
+            points = qdrant.query_points(
                 collection_name=collection,
                 query=query_vector,
-                limit=TOP_K,
+                using=using,
+                limit=limit,
                 with_payload=True,
-                query_filter=query_filter
-            )
-            
-            results = []
-            for point in response.points:
-                score = point.score
-                if score >= SCORE_THRESHOLD:
-                    payload = point.payload
-                    text = payload.get('chunk') or payload.get('summary')
-                    if text:
-                        results.append({
-                            'score': score,
-                            'text': text.strip(),
-                            'filename': payload.get('filename', 'Unknown'),
-                            'tag': payload.get('tag', 'N/A'),
-                            'collection': collection,
-                            'project': payload.get('project', 'General')
-                        })
-            return results
-        except Exception as e:
-            print(f"⚠️ Qdrant error: {e}")
-            return []
-
-    # Search both text and image collections
-    text_mem = search_memory("local_memory")
-    img_mem = search_memory("image_summary_memory")
-
-    # Combine and sort by relevance score
-    combined = sorted(text_mem + img_mem, key=lambda x: x['score'], reverse=True)
-    
-    # Format context with metadata
+                query_filter=query_filter,
+                search_params=search_params(),
+                score_threshold=SCORE_THRESHOLD,
+                timeout=timeout
+            ).points
+            if rankings > 1:
+                # Part of a fused query: score the dense ranking the way RRF would
+                points = [point.model_copy(update={"score": 1 / (RRF_K + rank)})
+                          for rank, point in enumerate(points)]
+            return _results(collection, points, scale)
+
+        prefetch = [models.Prefetch(query=query_vector, using=using, filter=query_filter, params=search_params(),
+                                    limit=HYBRID_PREFETCH, score_threshold=SCORE_THRESHOLD)]
+        if with_sparse:
+            prefetch.append(models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME,
+                                            filter=query_filter, limit=HYBRID_PREFETCH))
+        if with_image:
+            prefetch.append(models.Prefetch(query=image_vector, using=IMAGE_VECTOR_NAME, filter=query_filter,
+                                            params=search_params(), limit=HYBRID_PREFETCH,
+                                            score_threshold=IMAGE_SCORE_THRESHOLD))
+        # Points only one ranking found (an exact name or code only BM25 matches,
+        # an image only its pixels match) are kept at their fused rank
+        return _results(collection, qdrant.query_points(
+            collection_name=collection,
+            prefetch=prefetch,
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            limit=limit,
+            with_payload=True,
+            timeout=timeout
+        ).points, scale)
+    except Exception as e:
+        if not _refreshed and is_vector_name_error(e):
+            # The collection's vectors changed since they were cached (e.g. it was
+            # migrated to named vectors while the app was running): look again
+            forget_collection(collection)
+            return search_memory(collection, query_vector, query_filter, limit, sparse_vector, image_vector,
+                                 _refreshed=True)
+        print(f"⚠️ Qdrant error ({collection}): {e}")
+        return []
+
+def _results(collection, points, scale=1.0):
+    """Result dicts for scored points that carry text"""
+    results = []
+    for point in points:
+        payload = point.payload
+        text = payload.get('chunk') or payload.get('summary')
+        if text:
+            results.append({
+                'score': point.score * scale,
+                'text': text.strip(),
+                'filename': payload.get('filename', 'Unknown'),
+                'tag': payload.get('tag', 'N/A'),
+                'collection': collection,
+                'project': payload.get('project', 'General'),
+                'sheet': payload.get('sheet'),
+                'rows': (payload.get('row_start'), payload.get('row_end'))
+            })
+    return results
+
+def _timed_search(collection, *args, **kwargs):
+    with span("search", collection=collection):
+        return search_memory(collection, *args, **kwargs)
+
+def search_memory_collections(query_vector, project_filter=None, tag_filter=None, collections=None,
+                              sparse_vector=None, limit=TOP_K, image_vector=None):
+    """Search all memory collections concurrently with one shared query vector
+    (and BM25 query vector in hybrid mode, CLIP query vector for image collections).
+    A collection that doesn't answer within COLLECTION_TIMEOUT is skipped."""
+    collections = collections or MEMORY_COLLECTIONS
+    query_filter = build_memory_filter(project_filter, tag_filter)
+    
+    futures = {
+        _search_pool.submit(in_context(_timed_search), collection, query_vector, query_filter, limit,
+                            sparse_vector=sparse_vector, image_vector=image_vector): collection
+        for collection in collections
+    }
+    done, not_done = wait(futures, timeout=COLLECTION_TIMEOUT)
+    for future in not_done:
+        future.cancel()
+        print(f"⚠️ Qdrant search timed out after {COLLECTION_TIMEOUT}s: {futures[future]}")
+    
+    results = []
+    for future in done:
+        results.extend(future.result())
+    
+    # Combine and sort by relevance score (fused scores keep each collection's RRF order)
+    return sorted(results, key=lambda x: x['score'], reverse=True)
+
+def clip_query_vector(query, collections=None):
+    """The question's CLIP text embedding for searching image vectors, or None
+    when no searched collection has them (or CLIP can't be loaded)"""
+    global _clip_failed
+    collections = collections or MEMORY_COLLECTIONS
+    if not IMAGE_SEARCH_ENABLED or _clip_failed or not any(has_image_vectors(c) for c in collections):
+        return None
+    try:
+        with span("embed_image_query"):
+            return encode_clip_text(query).tolist()
+    except Exception as e:
+        _clip_failed = True
+        print(f"⚠️ CLIP unavailable, images are only searched by their summaries: {e}")
+        return None
+
+def format_memory_context(items):
+    """Format retrieved items with their metadata for the prompt"""
     context_lines = []
-    for item in combined[:TOP_K]:
+    for item in items[:TOP_K]:
         source_info = f"{item['filename']} [{item['tag']}]"
+        if item.get('sheet'):
+            source_info += f" sheet {item['sheet']}, rows {item['rows'][0]}-{item['rows'][1]}"
         confidence = round(item['score'] * 100)
         context_lines.append(f"SOURCE: {source_info} (Confidence: {confidence}%)\nCONTENT: {item['text']}")
     
     if not context_lines:
         return "No relevant information found in memory."
     
-    return "\n\n".join(context_lines)
+    # Keep the best sources that fit the memory token budget
+    return "\n\n".join(fit_blocks(context_lines))
+
+def retrieve_memory_context(query, project_filter=None, tag_filter=None, query_vector=None):
+    """Retrieve relevant memory context based on query similarity (and matching
+    terms when RETRIEVAL_MODE is hybrid). With reranking on, more candidates
+    are fetched and only the cross-encoder's best few go into the prompt."""
+    if query_vector is None:
+        with span("embed"):
+            query_vector = encode(query).tolist()
+    sparse_vector = encode_query(query) if RETRIEVAL_MODE == "hybrid" else None
+    limit = max(TOP_K, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else TOP_K
+    combined = search_memory_collections(query_vector, project_filter, tag_filter,
+                                         sparse_vector=sparse_vector, limit=limit,
+                                         image_vector=clip_query_vector(query))
+    if reranker.RERANK_ENABLED:
+        with span("rerank"):
+            combined = reranker.rerank(query, combined)
+    return format_memory_context(combined)
 
 def build_system_prompt(project=None, profile=None):
     """Build system prompt based on project and profile context"""
@@ -140,38 +273,69 @@ Private Profile Guidelines:
     
     return base_prompt
 
+def request_completion(messages, temperature=0.7, top_p=0.9):
+    """Send a query to the LLM and return the response text; raises on failure"""
+    return llm_client.complete(messages, temperature, top_p)
+
+def llm_error_message(error):
+    print(f"⚠️ LLM API error: {error}")
+    return f"I encountered an error when trying to process your request. Please check that LM Studio is running with model '{MODEL_NAME}'. Error: {str(error)}"
+
 def query_llm(messages, temperature=0.7, top_p=0.9):
     """Send a query to the LLM and return the response"""
-    payload = {
-        "model": MODEL_NAME,
-        "messages": messages,
-        "temperature": temperature,
-        "top_p": top_p
-    }
-    
     try:
-        response = requests.post(LM_API_URL, json=payload, timeout=60)
-        response.raise_for_status()  # Raise exception for bad status codes
-        result = response.json()
-        return result["choices"][0]["message"]["content"].strip()
+        return request_completion(messages, temperature, top_p)
     except requests.exceptions.RequestException as e:
-        print(f"⚠️ LLM API error: {e}")
-        return f"I encountered an error when trying to process your request. Please check that LM Studio is running with model '{MODEL_NAME}'. Error: {str(e)}"
+        return llm_error_message(e)
 
-def generate_rag_response(query, chat_history=None, project=None, profile=None, tag_filter=None):
-    """Generate a response using RAG methodology"""
+def stream_completion(messages, temperature=0.7, top_p=0.9):
+    """Send a query to the LLM with stream=True and yield content tokens as they arrive; raises on failure"""
+    return llm_client.stream(messages, temperature, top_p)
+
+def query_llm_stream(messages, temperature=0.7, top_p=0.9):
+    """Send a query to the LLM with stream=True and yield content tokens as they arrive"""
+    try:
+        yield from stream_completion(messages, temperature, top_p)
+    except requests.exceptions.RequestException as e:
+        yield llm_error_message(e)
+
+def summarize_conversation(previous_summary, turns):
+    """Fold older chat turns into a short rolling summary (used by context_assembler)"""
+    transcript = "\n".join(f"{turn['role'].upper()}: {turn['content']}" for turn in turns)
+    prompt = ""
+    if previous_summary:
+        prompt += f"Summary of the conversation so far:\n{previous_summary}\n\n"
+    prompt += f"""Newer messages:
+{truncate_to_tokens(transcript, 3000)}
+
+Write an updated summary of the whole conversation in a few sentences. Keep names, numbers,
+decisions and open questions. Reply with the summary only."""
+    
+    return request_completion([
+        {"role": "system", "content": "You summarise conversations concisely and factually."},
+        {"role": "user", "content": prompt}
+    ], temperature=0.2)
+
+def build_rag_messages(query, chat_history=None, project=None, profile=None, tag_filter=None, query_vector=None):
+    """Retrieve memory context and build the messages array for the LLM API"""
     # Retrieve relevant context
-    memory_context = retrieve_memory_context(query, project_filter=project, tag_filter=tag_filter)
+    memory_context = retrieve_memory_context(query, project_filter=project, tag_filter=tag_filter,
+                                             query_vector=query_vector)
+    
+    # Keep recent turns within the history budget; older ones become a rolling summary
+    with span("assemble"):
+        summary, recent_history = assemble_history(chat_history, summarize=summarize_conversation)
     
     # Build messages array for the LLM API
+    system_prompt = build_system_prompt(project, profile)
+    if summary:
+        system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
     messages = [
-        {"role": "system", "content": build_system_prompt(project, profile)}
+        {"role": "system", "content": system_prompt}
     ]
     
-    # Add chat history if available
-    if chat_history:
-        for entry in chat_history:
-            messages.append({"role": entry["role"], "content": entry["content"]})
+    # Add recent chat history
+    messages.extend(recent_history)
     
     # Add memory context and current query
     context_message = f"""
@@ -188,15 +352,96 @@ Answer based on the provided memory context when relevant. If the answer isn't i
     
     messages.append({"role": "user", "content": context_message})
     
-    # Query the LLM
-    response = query_llm(messages)
+    return messages, memory_context
+
+def _cached_answer(query, chat_history, project, profile, tag_filter):
+    """Look the question up in the answer cache. Returns (answer, lookup) where
+    lookup carries what is needed to revalidate or store the answer later."""
+    with span("embed"):
+        query_vector = encode(query).tolist()
+    if not AnswerCache.usable(chat_history):
+        return None, {"vector": query_vector, "cache": None}
+    cache = get_answer_cache()
+    scope = (project, profile, tag_filter)
+    with span("answer_cache"):
+        entry, fresh = cache.lookup(query_vector, scope)
+    lookup = {"vector": query_vector, "cache": cache, "scope": scope, "entry": entry}
+    return (entry["answer"] if fresh else None), lookup
+
+def _revalidated_answer(lookup, memory_context):
+    entry = lookup.get("entry")
+    if entry and lookup["cache"].revalidate(entry, memory_context):
+        return entry["answer"]
+    return None
+
+def _store_answer(lookup, query, memory_context, answer, started):
+    if lookup["cache"] and answer:
+        lookup["cache"].store(lookup["vector"], lookup["scope"], query, memory_context,
+                              answer, time.time() - started)
+
+def generate_rag_response(query, chat_history=None, project=None, profile=None, tag_filter=None):
+    """Generate a response using RAG methodology (answers to repeated questions
+    come from the answer cache)"""
+    answer, lookup = _cached_answer(query, chat_history, project, profile, tag_filter)
+    if answer is not None:
+        return {
+            "response": answer,
+            "context_used": lookup["entry"]["context"],
+            "timestamp": datetime.now().isoformat(),
+            "cached": True
+        }
+    
+    messages, memory_context = build_rag_messages(query, chat_history, project, profile, tag_filter,
+                                                  query_vector=lookup["vector"])
+    response = _revalidated_answer(lookup, memory_context)
+    cached = response is not None
+    if not cached:
+        # Query the LLM
+        started = time.time()
+        try:
+            with span("llm_total"):
+                response = request_completion(messages)
+            _store_answer(lookup, query, memory_context, response, started)
+        except requests.exceptions.RequestException as e:
+            response = llm_error_message(e)
     
     return {
         "response": response,
         "context_used": memory_context,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "cached": cached
     }
 
+def generate_rag_response_stream(query, chat_history=None, project=None, profile=None, tag_filter=None):
+    """Generate a response using RAG methodology, yielding tokens as they arrive"""
+    answer, lookup = _cached_answer(query, chat_history, project, profile, tag_filter)
+    if answer is not None:
+        yield answer
+        return
+    
+    messages, memory_context = build_rag_messages(query, chat_history, project, profile, tag_filter,
+                                                  query_vector=lookup["vector"])
+    answer = _revalidated_answer(lookup, memory_context)
+    if answer is not None:
+        yield answer
+        return
+    
+    started = time.time()
+    tokens = []
+    try:
+        for token in stream_completion(messages):
+            if not tokens:
+                observe("llm_first_token", time.time() - started)
+            tokens.append(token)
+            yield token
+    except requests.exceptions.RequestException as e:
+        yield llm_error_message(e)
+        return
+    finally:
+        observe("llm_total", time.time() - started)
+    # Only complete answers are cached
+    _store_answer(lookup, query, memory_context, "".join(tokens).strip(), started)
+
 def log_conversation(user_query, assistant_response, project=None, chat_id=None):
     """Log the conversation for future reference"""
     log_dir = os.getenv("CHAT_HISTORY_DIR", "F:/AI_documents/chat_history")
@@ -1,103 +1,25 @@
-import re
-from qdrant_client import QdrantClient, models
-from sentence_transformers import SentenceTransformer
+from embedding_provider import encode
+from sparse_encoder import encode_query
+from rag_manager import search_memory_collections, clip_query_vector
 
 # === Config
-MODEL_NAME = 'BAAI/bge-large-en-v1.5'
-TOP_K = 10
-SCORE_THRESHOLD = 0.4
-
-# === Load model
-model = SentenceTransformer(MODEL_NAME)
-print(f"✅ Loaded embedding model: {MODEL_NAME}")
-
-# === Connect to Qdrant
-qdrant = QdrantClient(host="localhost", port=6333)
+COLLECTIONS = ["local_memory", "image_summary_memory"]
 
 # === Input user question
 question = input("🧠 Enter your assistant question: ").strip()
-query_vector = model.encode(question).tolist()
-
-# === Search function
-def search_memory(collection, vector, top_k=TOP_K):
-    try:
-        response = qdrant.query_points(
-            collection_name=collection,
-            query=vector,
-            limit=top_k,
-            with_payload=True
-        )
-        results = []
-        for point in response.points:
-            score = point.score
-            if score >= SCORE_THRESHOLD:
-                payload = point.payload
-                text = payload.get('chunk') or payload.get('summary')
-                if text:
-                    results.append({
-                        'score': score,
-                        'text': text.strip(),
-                        'filename': payload.get('filename', 'Unknown'),
-                        'tag': payload.get('tag', 'N/A'),
-                        'collection': collection
-                    })
-        return results
-    except Exception as e:
-        print(f"⚠️ Failed to query {collection}: {e}")
-        return []
-
-# === Fallback: keyword search for named entities
-def keyword_matches(name, collection):
-    try:
-        response = qdrant.scroll(
-            collection_name=collection,
-            scroll_filter=models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="chunk",
-                        match=models.MatchText(text=name)
-                    )
-                ]
-            ),
-            limit=TOP_K,
-            with_payload=True
-        )
-        results = []
-        for point in response[0]:
-            payload = point.payload
-            text = payload.get('chunk') or payload.get('summary')
-            if text:
-                results.append({
-                    'score': 0.5,  # Neutral fallback score
-                    'text': text.strip(),
-                    'filename': payload.get('filename', 'Unknown'),
-                    'tag': payload.get('tag', 'N/A'),
-                    'collection': collection
-                })
-        return results
-    except Exception as e:
-        print(f"⚠️ Keyword fallback failed for {name}: {e}")
-        return []
-
-# === Perform searches
-text_mem = search_memory("local_memory", query_vector)
-img_mem = search_memory("image_summary_memory", query_vector)
-
-# === Fallback search for keywords
-fallback_names = []
-for word in question.split():
-    if word.lower() in ["patrik", "leslie", "john", "kelly"]:
-        fallback_names.append(word)
+query_vector = encode(question).tolist()
 
-fallback_mem = []
-for name in fallback_names:
-    fallback_mem += keyword_matches(name, "local_memory")
+# === Hybrid search: dense similarity plus BM25 term matches (names, codes, IDs)
+# and, for images, CLIP matches on the pixels, fused with reciprocal-rank fusion
+# in one query per collection
+results = search_memory_collections(query_vector, collections=COLLECTIONS,
+                                    sparse_vector=encode_query(question),
+                                    image_vector=clip_query_vector(question, COLLECTIONS))
 
-# === Combine and deduplicate
-all_results = text_mem + img_mem + fallback_mem
+# === Deduplicate
 seen = set()
 combined = []
-for item in all_results:
+for item in results:
     key = (item['filename'], item['text'])
     if key not in seen:
         combined.append(item)
@@ -0,0 +1,144 @@
+"""
+Reranker for RAG Assistant
+Optional second retrieval stage: the vector search over-fetches candidates and
+a small cross-encoder scores each (query, chunk) pair in batches on the CPU, so
+only the few best chunks reach the LLM prompt. Scores are cached per pair, and
+reranking is skipped (keeping the retrieval order) whenever the estimated
+scoring time would exceed the latency budget or the model is still loading.
+"""
+
+import os
+import math
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "False").lower() == "true"
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", 5))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", 16))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 400))
+RERANK_CACHE_ITEMS = int(os.getenv("RERANK_CACHE_ITEMS", 5000))
+# Chunks the cross-encoder rates below this relevance (0-1) are dropped
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", 0.0))
+
+_cache = OrderedDict()   # pair key -> relevance (0-1)
+_lock = threading.Lock()
+_ms_per_pair = None       # moving average of measured scoring cost
+_loading = None
+_load_failed = False
+_stats = {"queries": 0, "reranked": 0, "skipped_budget": 0, "skipped_loading": 0,
+          "pairs_scored": 0, "cache_hits": 0, "last_ms": 0.0}
+
+
+def _pair_key(model_name, query, text):
+    return hashlib.sha1(f"{model_name}\0{query}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _load_model(model_name):
+    global _load_failed
+    from embedding_provider import get_reranker
+    try:
+        get_reranker(model_name)
+    except Exception as e:
+        _load_failed = True
+        print(f"❌ Could not load reranker {model_name}, reranking disabled: {e}")
+
+
+def _model_ready(model_name):
+    """Whether the cross-encoder is loaded; starts loading it in the background if not"""
+    global _loading
+    from embedding_provider import is_loaded
+    if is_loaded("reranker", model_name):
+        return True
+    with _lock:
+        if not _load_failed and (_loading is None or not _loading.is_alive()):
+            _loading = threading.Thread(target=_load_model, args=(model_name,),
+                                        name="reranker-load", daemon=True)
+            _loading.start()
+    return False
+
+
+def _score_pairs(model, query, texts):
+    """Relevance in 0-1 for each text (ms-marco cross-encoders output logits)"""
+    logits = model.predict([(query, text) for text in texts], batch_size=RERANK_BATCH_SIZE,
+                           show_progress_bar=False)
+    return [1 / (1 + math.exp(-float(logit))) for logit in logits]
+
+
+def rerank(query, items, top_n=RERANK_TOP_N, budget_ms=RERANK_BUDGET_MS, model_name=None):
+    """Reorder retrieved items by cross-encoder relevance and keep the best top_n.
+    Each kept item's 'score' becomes the rerank relevance; the vector score is
+    kept as 'retrieval_score'. Falls back to the retrieval order when the
+    budget would be exceeded."""
+    global _ms_per_pair
+    from embedding_provider import RERANK_MODEL, get_reranker
+
+    name = model_name or RERANK_MODEL
+    _stats["queries"] += 1
+    if len(items) <= 1:
+        return items[:top_n]
+    if not _model_ready(name):
+        _stats["skipped_loading"] += 1
+        if not _load_failed:
+            print("⏭️ Reranker still loading, using retrieval order")
+        return items[:top_n]
+
+    keys = [_pair_key(name, query, item["text"]) for item in items]
+    scores = {}
+    with _lock:
+        for key in keys:
+            if key in _cache:
+                _cache.move_to_end(key)
+                scores[key] = _cache[key]
+    _stats["cache_hits"] += len(scores)
+    # Unscored pairs, each distinct text once
+    missing = list({key: item["text"] for key, item in zip(keys, items) if key not in scores}.items())
+
+    # Skip when the measured cost per pair says the budget can't be met
+    if missing and _ms_per_pair is not None and len(missing) * _ms_per_pair > budget_ms:
+        _stats["skipped_budget"] += 1
+        # Let the estimate drift down so a one-off slow run doesn't disable reranking
+        _ms_per_pair *= 0.9
+        print(f"⏭️ Reranking {len(missing)} chunks would take ~{len(missing) * _ms_per_pair:.0f}ms "
+              f"(budget {budget_ms:.0f}ms), using retrieval order")
+        return items[:top_n]
+
+    start = time.perf_counter()
+    if missing:
+        model = get_reranker(name)
+        fresh = _score_pairs(model, query, [text for _, text in missing])
+        elapsed = (time.perf_counter() - start) * 1000
+        per_pair = elapsed / len(missing)
+        _ms_per_pair = per_pair if _ms_per_pair is None else 0.8 * _ms_per_pair + 0.2 * per_pair
+        _stats["pairs_scored"] += len(missing)
+        with _lock:
+            for (key, _), score in zip(missing, fresh):
+                scores[key] = _cache[key] = score
+                _cache.move_to_end(key)
+            while len(_cache) > RERANK_CACHE_ITEMS:
+                _cache.popitem(last=False)
+    _stats["last_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    _stats["reranked"] += 1
+
+    ranked = sorted(zip(keys, items), key=lambda pair: scores[pair[0]], reverse=True)
+    kept = []
+    for key, item in ranked:
+        if scores[key] < RERANK_MIN_SCORE:
+            break
+        kept.append({**item, "retrieval_score": item["score"], "score": scores[key]})
+        if len(kept) == top_n:
+            break
+    return kept
+
+
+def get_stats():
+    """Counters for reporting: queries, reranks, skips, cache hits, cost per pair"""
+    return {**_stats, "cache_items": len(_cache),
+            "ms_per_pair": round(_ms_per_pair, 2) if _ms_per_pair is not None else None}
@@ -1,4 +1,5 @@
 from qdrant_client import QdrantClient
+import ingest_manifest
 
 qdrant = QdrantClient(path="F:/qdrant_storage")
 
@@ -8,3 +9,5 @@ for name in ["local_memory", "image_summary_memory"]:
         print(f"🧹 Deleted collection: {name}")
     else:
         print(f"ℹ️ Collection not found: {name}")
+    # Its files are no longer stored, so re-uploading them must not be skipped
+    print(f"🧹 Forgot {ingest_manifest.clear(name)} ingested files of {name}")
@@ -88,15 +88,15 @@ def check_embedding_model():
     """Check if sentence transformers can be loaded"""
     print("\n🔍 Checking embedding model...")
     try:
-        from sentence_transformers import SentenceTransformer
+        from embedding_provider import get_embed_model, get_model_stats
         model_name = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-en-v1.5")
         
         print(f"   Loading model: {model_name}")
-        start_time = time.time()
-        model = SentenceTransformer(model_name)
-        load_time = time.time() - start_time
+        model = get_embed_model(model_name)
+        stats = next(s for s in get_model_stats() if s["name"] == model_name)
         
-        print(f"✅ Embedding model loaded successfully in {load_time:.2f} seconds")
+        print(f"✅ Embedding model loaded successfully in {stats['load_seconds']:.2f} seconds")
+        print(f"   Approximate memory footprint: {stats['memory_mb']} MB")
         
         # Test encoding
         test_text = "This is a test sentence to check if encoding works."
@@ -0,0 +1,101 @@
+"""
+Sparse (BM25) Encoder for RAG Assistant
+Turns text into sparse term vectors that Qdrant stores next to the dense bge
+embeddings, so exact names, codes and IDs can be matched in the same query.
+Documents get BM25 term-frequency weights (saturated and length normalised);
+Qdrant applies the IDF part itself through the collection's IDF modifier, so
+nothing has to be recomputed as the corpus grows. Terms are hashed into the
+32-bit index space, so no vocabulary has to be kept.
+
+Existing collections created without sparse vectors can be migrated:
+    python sparse_encoder.py --migrate local_memory
+"""
+
+import os
+import re
+import sys
+import zlib
+import argparse
+from collections import Counter
+from qdrant_client import models
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+SPARSE_VECTOR_NAME = "bm25"
+BM25_K1 = float(os.getenv("BM25_K1", 1.2))
+BM25_B = float(os.getenv("BM25_B", 0.75))
+# Typical chunk length in terms, used for BM25 length normalisation
+BM25_AVG_DOC_LEN = float(os.getenv("BM25_AVG_DOC_LEN", 180))
+
+# Words, numbers and codes; "INV-2024/07" is kept whole and also split into its parts
+_TERM = re.compile(r"\w+(?:[-_./:#]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i if in into is it its
+me my not of on or our she so that the their them then there these they this to
+was we were what when which who will with you your
+""".split())
+
+
+def tokenize(text):
+    """Lowercased terms of a text, compound codes followed by their parts"""
+    terms = []
+    for match in _TERM.finditer(text.lower()):
+        term = match.group()
+        parts = _PART.findall(term)
+        if len(parts) > 1:
+            terms.append(term)
+        terms.extend(part for part in parts if part not in STOPWORDS)
+    return terms
+
+
+def term_index(term):
+    """Stable 32-bit index of a term (the same in every process)"""
+    return zlib.crc32(term.encode("utf-8"))
+
+
+def _sparse_vector(weights):
+    indices = sorted(weights)
+    return models.SparseVector(indices=indices, values=[weights[i] for i in indices])
+
+
+def encode_document(text):
+    """BM25 document vector: saturated term frequencies, normalised by length"""
+    terms = tokenize(text)
+    if not terms:
+        return None
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * len(terms) / BM25_AVG_DOC_LEN)
+    weights = {}
+    for term, tf in Counter(terms).items():
+        index = term_index(term)
+        weights[index] = weights.get(index, 0.0) + tf * (BM25_K1 + 1) / (tf + norm)
+    return _sparse_vector(weights)
+
+
+def encode_query(text):
+    """Query vector: every distinct term once (IDF is applied by Qdrant)"""
+    weights = {term_index(term): 1.0 for term in tokenize(text)}
+    return _sparse_vector(weights) if weights else None
+
+
+def text_of(payload):
+    """The text that is indexed for a stored point"""
+    return payload.get("chunk") or payload.get("summary") or ""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add BM25 sparse vectors to an existing collection")
+    parser.add_argument("--migrate", required=True, metavar="COLLECTION")
+    args = parser.parse_args(argv)
+
+    from vector_store import add_sparse_vectors
+    count = add_sparse_vectors(args.migrate)
+    print(f"✅ {args.migrate}: {count} points now carry '{SPARSE_VECTOR_NAME}' sparse vectors")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,53 +1,30 @@
 import os
 import hashlib
-import nltk
-import tiktoken
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, PointStruct
 from document_loader import load_text_from_file
-from sentence_transformers import SentenceTransformer
+from embedding_provider import get_embed_model, encode
+from chunking import chunk_text
 
 # === Config ===
 file_path = "F:\\AI_documents\\incoming\\sample_test.txt"
 collection_name = "local_memory"
 chunk_token_limit = 400
+EMBED_MODEL_NAME = 'BAAI/bge-base-en-v1.5'
 
 # === Load and preprocess ===
 text = load_text_from_file(file_path)
-sentences = nltk.sent_tokenize(text)
-
-# === Tokenizer ===
-tokenizer = tiktoken.get_encoding("cl100k_base")  # Same tokenizer used by OpenAI & many LLMs
-
-def num_tokens(text):
-    return len(tokenizer.encode(text))
 
 # Set this to "P", "B", or "PB" depending on the file type
 doc_tag = "P"  # <-- Change this per document
 
-# === Sentence-aware token-limited chunking ===
-chunks = []
-current_chunk = []
-token_count = 0
-
-for sentence in sentences:
-    sentence_tokens = num_tokens(sentence)
-    if token_count + sentence_tokens > chunk_token_limit:
-        if current_chunk:
-            chunks.append(" ".join(current_chunk))
-        current_chunk = [sentence]
-        token_count = sentence_tokens
-    else:
-        current_chunk.append(sentence)
-        token_count += sentence_tokens
-
-if current_chunk:
-    chunks.append(" ".join(current_chunk))
+# === Sentence-aware token-limited chunking (measured with the embedding model's tokenizer) ===
+chunks = chunk_text(text, model_name=EMBED_MODEL_NAME, max_tokens=chunk_token_limit)
 
 print(f"📄 Split into {len(chunks)} smart chunks.")
 
 # === Embed & store chunks ===
-model = SentenceTransformer('BAAI/bge-base-en-v1.5')
+model = get_embed_model(EMBED_MODEL_NAME)
 qdrant = QdrantClient(
     host="localhost",
     port=6333,
@@ -67,10 +44,10 @@ if collection_name not in [c.name for c in qdrant.get_collections().collections]
         )
     )
 
-# Prepare points
+# Prepare points (embeddings go through the shared cache, so unchanged chunks are not re-encoded)
+embeddings = encode(chunks, prefix="passage: ", model_name=EMBED_MODEL_NAME)
 points = []
-for i, chunk in enumerate(chunks):
-    embedding = model.encode("passage: " + chunk)
+for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
     point = PointStruct(
         id=int(hashlib.md5(f"{file_path}_{i}".encode()).hexdigest(), 16) % (10 ** 12),
         vector=embedding.tolist(),
@@ -1,15 +1,30 @@
 import os
+import json
+import itertools
 import shutil
-import uuid
+import hashlib
 from datetime import datetime
 from PIL import Image
 from docx import Document
 from striprtf.striprtf import rtf_to_text
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient, models
+from qdrant_client import models
+from embedding_provider import encode, encode_images
+from image_cache import get_image_cache, IMAGE_CACHE_ENABLED
+from chunking import get_chunker, iter_chunks
+from vector_store import (get_qdrant, ensure_collection, has_sparse_vectors, has_image_vectors, UpsertWriter,
+                          TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME, IMAGE_VECTOR_SIZE)
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document
+import ingest_manifest
 import fitz  # PyMuPDF for PDF
 import pandas as pd  # For XLSX
 
+EMBED_BATCH_SIZE = 32
+# Extraction block sizes: characters of plain text, rows of a spreadsheet
+BLOCK_CHARS = 64 * 1024
+ROWS_PER_BLOCK = 500
+# Spreadsheets are stored as row-group chunks (token budget from chunking.py)
+TABLE_EXTENSIONS = {".csv", ".xlsx", ".xls"}
+
 # === Paths
 incoming_dir = "F:/AI_documents/incoming"
 processed_dir = "F:/AI_documents/processed"
@@ -21,10 +36,8 @@ subfolders = {
 }
 log_file_path = os.path.join(processed_dir, "_processing_log.txt")
 
-# === Qdrant + Model
-qdrant = QdrantClient(host="localhost", port=6333)
-model = SentenceTransformer("BAAI/bge-large-en-v1.5")
-print("✅ Embedding model loaded.")
+# === Qdrant (client and embedding model are shared across the app)
+qdrant = get_qdrant()
 
 # === Logging
 def log_file_entry(filename, tag, summary, project=None):
@@ -36,118 +49,439 @@ def log_file_entry(filename, tag, summary, project=None):
         f.write(f"{timestamp} {filename} | {project_info}Tag: {tag} | {summary}\n")
 
 # === Load content file
-def load_text(filepath):
+# Text is extracted as a stream of (text, meta) segments - a PDF page or a block
+# of lines - so memory stays flat for large files. Spreadsheets are chunked by
+# rows instead (see iter_table_chunks).
+# meta["progress"] is the fraction of the file read so far, where it is known.
+def _line_blocks(f, progress_of=None, max_chars=BLOCK_CHARS):
+    block, size = [], 0
+    for line in f:
+        block.append(line)
+        size += len(line)
+        if size >= max_chars:
+            yield "".join(block), {"progress": progress_of() if progress_of else None}
+            block, size = [], 0
+    if block:
+        yield "".join(block), {"progress": 1.0}
+
+def iter_segments(filepath):
+    """Yield (text, meta) segments of a document one page or block at a time"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if ext in [".txt", ".md"]:
+        size = max(os.path.getsize(filepath), 1)
+        with open(filepath, "r", encoding="utf-8") as f:
+            yield from _line_blocks(f, lambda: min(f.buffer.tell() / size, 1.0))
+    elif ext == ".docx":
+        paragraphs = (p.text + "\n" for p in Document(filepath).paragraphs)
+        yield from _line_blocks(paragraphs)
+    elif ext == ".rtf":
+        with open(filepath, "r", encoding="utf-8") as f:
+            yield rtf_to_text(f.read()), {"progress": 1.0}
+    elif ext == ".pdf":
+        with fitz.open(filepath) as doc:
+            for number, page in enumerate(doc, start=1):
+                yield page.get_text(), {"page": number, "progress": number / max(len(doc), 1)}
+
+# === Tabular chunking
+def _clean_row(row):
+    """Cell values as strings, without trailing empty cells"""
+    values = ["" if value is None else str(value).strip() for value in row]
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+def _iter_sheets(filepath):
+    """Yield (sheet_name, rows) with rows as an iterator of value tuples, streamed where possible"""
     ext = os.path.splitext(filepath)[1].lower()
+    if ext == ".xlsx":
+        from openpyxl import load_workbook
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        try:
+            for sheet in workbook.worksheets:
+                yield sheet.title, sheet.iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    elif ext == ".xls":
+        for name in pd.ExcelFile(filepath).sheet_names:
+            sheet = pd.read_excel(filepath, sheet_name=name, header=None, dtype=str, keep_default_na=False)
+            yield name, sheet.itertuples(index=False, name=None)
+    elif ext == ".csv":
+        def rows():
+            for block in pd.read_csv(filepath, chunksize=ROWS_PER_BLOCK, header=None,
+                                     dtype=str, keep_default_na=False):
+                yield from block.itertuples(index=False, name=None)
+        yield os.path.splitext(os.path.basename(filepath))[0], rows()
+
+def _row_groups(rows, budget, chunker):
+    """Pack (row_number, line) pairs into groups of at most `budget` tokens.
+    Rows are token-counted a block at a time with one tokenizer call."""
+    group, size = [], 0
+    block = []
+
+    def pack(block):
+        nonlocal group, size
+        for (row_number, line), tokens in zip(block, chunker.count_many([line for _, line in block])):
+            if group and size + tokens > budget:
+                yield group
+                group, size = [], 0
+            group.append((row_number, line))
+            size += tokens
+
+    for item in rows:
+        block.append(item)
+        if len(block) >= ROWS_PER_BLOCK:
+            yield from pack(block)
+            block = []
+    yield from pack(block)
+    if group:
+        yield group
+
+def iter_table_chunks(filepath):
+    """Yield (chunk, meta) row groups of a spreadsheet or CSV. Every chunk starts
+    with the sheet name and column header; meta holds sheet, row range and columns.
+    Row numbers are as shown in the spreadsheet (the header is row 1)."""
+    chunker = get_chunker()
+    for sheet_name, rows in _iter_sheets(filepath):
+        header = {}
+
+        def data_rows():
+            for row_number, row in enumerate(rows, start=1):
+                values = _clean_row(row)
+                if not any(values):
+                    continue
+                if not header:
+                    # First non-empty row is the header
+                    header["columns"] = [value or f"column_{i + 1}" for i, value in enumerate(values)]
+                    header["text"] = f"Sheet: {sheet_name}\nColumns: {' | '.join(header['columns'])}"
+                    continue
+                yield row_number, " | ".join(values)
+
+        rows_iter = data_rows()
+        first = next(rows_iter, None)
+        if first is None:
+            continue
+        budget = max(chunker.max_tokens - chunker.count_tokens(header["text"]), 16)
+        row_splitter = get_chunker(max_tokens=budget, overlap=0)
+
+        for group in _row_groups(itertools.chain([first], rows_iter), budget, chunker):
+            meta = {"sheet": sheet_name, "row_start": group[0][0], "row_end": group[-1][0],
+                    "columns": header["columns"]}
+            lines = [line for _, line in group]
+            if len(group) == 1 and chunker.count_tokens(lines[0]) > budget:
+                # A single row too large for one chunk is split like text
+                for piece in row_splitter.chunk(lines[0]):
+                    yield f"{header['text']}\n{piece}", meta
+                continue
+            yield "\n".join([header["text"]] + lines), meta
+
+def iter_document_chunks(filepath, on_progress=None):
+    """Yield (chunk, meta) for any supported file: row groups for tables, text chunks otherwise"""
+    if os.path.splitext(filepath)[1].lower() in TABLE_EXTENSIONS:
+        yield from iter_table_chunks(filepath)
+        return
+
+    def segments():
+        for text, meta in iter_segments(filepath):
+            if on_progress and meta.get("progress") is not None:
+                on_progress(meta["progress"])
+            yield text
+
+    for chunk in iter_chunks(segments()):
+        yield chunk, {}
+
+# === Qdrant helpers
+def delete_stale_points(collection_name, filename, content_hash):
+    """Delete points of a file that don't belong to its current content.
+    Called after the new points are upserted, so the file is never missing
+    from memory while it is being replaced."""
+    qdrant.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(
+            filter=models.Filter(
+                must=[models.FieldCondition(key="filename", match=models.MatchValue(value=filename))],
+                must_not=[models.FieldCondition(key="file_hash", match=models.MatchValue(value=content_hash))]
+            )
+        )
+    )
+
+def has_points(collection_name, filename):
+    """Whether any point of a file is stored; the manifest can outlive a
+    collection that was deleted or recreated outside the assistant"""
     try:
-        if ext in [".txt", ".md"]:
-            with open(filepath, "r", encoding="utf-8") as f:
-                return f.read()
-        elif ext == ".docx":
-            return "\n".join([p.text for p in Document(filepath).paragraphs])
-        elif ext == ".rtf":
-            with open(filepath, "r", encoding="utf-8") as f:
-                return rtf_to_text(f.read())
-        elif ext == ".pdf":
-            doc = fitz.open(filepath)
-            return "\n".join([page.get_text() for page in doc])
-        elif ext in [".xlsx", ".xls"]:
-            df = pd.read_excel(filepath, sheet_name=None)
-            flattened = []
-            for name, sheet in df.items():
-                flattened.append(f"Sheet: {name}")
-                flattened.append(sheet.to_string(index=False))
-            return "\n".join(flattened)
-        elif ext == ".csv":
-            df = pd.read_csv(filepath)
-            return df.to_string(index=False)
-    except Exception as e:
-        print(f"⚠️ Could not load {filepath}: {e}")
-    return None
-
-# === Chunking
-def chunk_text(text, max_len=512):
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-    chunks, current = [], ""
-    for line in lines:
-        if len(current) + len(line) < max_len:
-            current += " " + line
-        else:
-            chunks.append(current.strip())
-            current = line
-    if current:
-        chunks.append(current.strip())
-    return chunks
+        return qdrant.count(
+            collection_name=collection_name,
+            count_filter=models.Filter(
+                must=[models.FieldCondition(key="filename", match=models.MatchValue(value=filename))]
+            ),
+            exact=True
+        ).count > 0
+    except Exception:
+        return False  # Missing collection
 
-# === Text Processor
-def embed_and_store_text(file_path, tag, target_folder, project=None):
-    text = load_text(file_path)
-    if not text:
-        print(f"⚠️ Skipping unreadable file: {file_path}")
+def update_file_payload(collection_name, filename, entry, tag, project):
+    """Re-tag every stored point of a file if its tag or project changed"""
+    if entry and entry.get("tag") == tag and entry.get("project") == project:
         return
+    qdrant.set_payload(
+        collection_name=collection_name,
+        payload={"tag": tag, "project": project},
+        points=models.Filter(
+            must=[models.FieldCondition(key="filename", match=models.MatchValue(value=filename))]
+        )
+    )
 
-    chunks = chunk_text(text)
-    embeddings = model.encode(chunks).tolist()
+# === Chunk diffing
+def chunk_key(chunk, seen, meta=None):
+    """Content key for a chunk: hash of the chunk text (and its metadata, e.g. row
+    range) plus an occurrence counter (tracked in `seen`) so repeated identical
+    chunks in one file stay distinct"""
+    source = chunk + "\0" + json.dumps(meta, sort_keys=True) if meta else chunk
+    chunk_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:32]
+    occurrence = seen.get(chunk_hash, 0)
+    seen[chunk_hash] = occurrence + 1
+    return f"{chunk_hash}:{occurrence}"
 
-    if not qdrant.collection_exists("local_memory"):
-        qdrant.create_collection(
-            collection_name="local_memory",
-            vectors_config=models.VectorParams(size=1024, distance=models.Distance.COSINE)
+def stored_chunk_keys(collection_name, filename):
+    """Return ({chunk_key: point_id}, legacy_count) for the points stored for a file.
+    Points from older ingestion schemes have no chunk_key and are only counted."""
+    stored = {}
+    legacy = 0
+    scroll_filter = models.Filter(
+        must=[models.FieldCondition(key="filename", match=models.MatchValue(value=filename))]
+    )
+    offset = None
+    while True:
+        points, offset = qdrant.scroll(
+            collection_name=collection_name,
+            scroll_filter=scroll_filter,
+            with_payload=["chunk_key"],
+            with_vectors=False,
+            limit=1024,
+            offset=offset
         )
+        for point in points:
+            key = (point.payload or {}).get("chunk_key")
+            if key:
+                stored[key] = point.id
+            else:
+                legacy += 1
+        if offset is None:
+            return stored, legacy
 
+def delete_stale_chunks(collection_name, filename, current_keys):
+    """Delete every point of a file whose chunk_key is not in the current version"""
+    qdrant.delete(
+        collection_name=collection_name,
+        points_selector=models.FilterSelector(
+            filter=models.Filter(
+                must=[models.FieldCondition(key="filename", match=models.MatchValue(value=filename))],
+                must_not=[models.FieldCondition(key="chunk_key", match=models.MatchAny(any=list(current_keys)))]
+            )
+        )
+    )
+
+def delete_chunks(collection_name, filename, keys):
+    """Delete the points of a file with these chunk keys"""
+    qdrant.delete(
+        collection_name=collection_name,
+        points_selector=models.PointIdsList(
+            points=[ingest_manifest.point_id(f"{filename}_{key}") for key in keys]
+        )
+    )
+
+# === Text Processor
+def skip_if_unchanged(file_path, tag, target_folder, project=None):
+    """If the file's content is already stored, re-tag it, move it and return
+    the result counts; otherwise return (None, content_hash, manifest_entry)"""
+    filename = os.path.basename(file_path)
+    content_hash = ingest_manifest.file_hash(file_path)
+    entry = ingest_manifest.get_entry("local_memory", filename)
+    if entry and entry["file_hash"] == content_hash and has_points("local_memory", filename):
+        update_file_payload("local_memory", filename, entry, tag, project)
+        ingest_manifest.record("local_memory", filename, content_hash, entry["chunks"], tag, project)
+        shutil.move(file_path, os.path.join(target_folder, filename))
+        print(f"⏭️ Unchanged since last ingestion, skipped re-embedding: {filename}")
+        return {"reused": entry["chunks"], "added": 0, "removed": 0}, content_hash, entry
+    return None, content_hash, entry
+
+def make_points(filename, tag, project, items, embeddings):
+    """PointStructs for (chunk, meta, chunk_key) items and their embeddings.
+    Points also get a BM25 sparse vector when local_memory has one."""
+    sparse = has_sparse_vectors("local_memory")
     points = []
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+    for (chunk, meta, key), embedding in zip(items, embeddings):
         payload = {
+            **meta,
             "chunk": chunk, 
-            "filename": os.path.basename(file_path), 
-            "tag": tag
+            "filename": filename, 
+            "tag": tag,
+            "chunk_key": key
         }
         
         # Add project if available
         if project:
             payload["project"] = project
             
+        vector = embedding
+        if sparse:
+            sparse_vector = encode_document(chunk)
+            if sparse_vector is not None:
+                vector = {"": embedding, SPARSE_VECTOR_NAME: sparse_vector}
+
         points.append(
             models.PointStruct(
-                id=uuid.uuid4().int >> 64,
-                vector=embedding,
+                id=ingest_manifest.point_id(f"{filename}_{key}"),
+                vector=vector,
                 payload=payload
             )
         )
-    
-    qdrant.upsert(
-        collection_name="local_memory",
-        points=points
-    )
+    return points
+
+def finish_text_file(file_path, tag, target_folder, project, state):
+    """Delete stale chunks, record the manifest, log and move a file whose new
+    chunks have all been upserted. `state` holds content_hash, entry, keys,
+    stored, legacy, added and first_chunk. Returns the result counts."""
+    filename = os.path.basename(file_path)
+    keys = state["keys"]
+    reused = len(keys) - state["added"]
+    removed = len(set(state["stored"]) - set(keys)) + state["legacy"]
+
+    # New points are in place, so stale ones can go without a gap in memory
+    if removed:
+        delete_stale_chunks("local_memory", filename, keys)
+    if reused:
+        update_file_payload("local_memory", filename, state["entry"], tag, project)
+    ingest_manifest.record("local_memory", filename, state["content_hash"], len(keys), tag, project)
 
     # Write one-line summary to log (use first chunk)
-    first_chunk = chunks[0] if chunks else ""
-    summary = " ".join(first_chunk.split()[:50])
-    log_file_entry(os.path.basename(file_path), tag, summary, project)
+    summary = " ".join((state["first_chunk"] or "").split()[:50])
+    log_file_entry(filename, tag, summary, project)
 
-    dest_path = os.path.join(target_folder, os.path.basename(file_path))
-    shutil.move(file_path, dest_path)
-    print(f"✅ Stored {len(chunks)} chunks from {file_path}")
+    shutil.move(file_path, os.path.join(target_folder, filename))
+    print(f"✅ Stored {len(keys)} chunks from {file_path} "
+          f"(reused {reused}, added {state['added']}, removed {removed})")
+    return {"reused": reused, "added": state["added"], "removed": removed}
+
+def embed_and_store_text(file_path, tag, target_folder, project=None, progress=None):
+    """Embed a text file into local_memory. Only chunks whose content is not
+    already stored for this file are embedded; stale chunks are deleted.
+    Returns counts of chunks reused, added and removed, or None if unreadable."""
+    # progress(fraction, stage) is an optional callback used by the ingestion queue
+    report = progress or (lambda fraction, stage=None: None)
+    filename = os.path.basename(file_path)
+
+    # Skip files whose content is already stored
+    result, content_hash, entry = skip_if_unchanged(file_path, tag, target_folder, project)
+    if result:
+        return result
+
+    # Diff against what is already stored for this file
+    report(0.05, "diffing")
+    ensure_collection("local_memory", sparse=True)
+    stored, legacy = stored_chunk_keys("local_memory", filename)
+
+    # Extract, chunk and embed in one pass; only chunk keys are kept in memory
+    state = {"content_hash": content_hash, "entry": entry, "stored": stored, "legacy": legacy,
+             "keys": [], "added": 0, "first_chunk": None}
+    seen, batch, written = {}, [], []
+    fraction = 0.0
+    writer = UpsertWriter("local_memory")
+
+    def flush():
+        embeddings = encode([chunk for chunk, _, _ in batch]).tolist()
+        writer.add(make_points(filename, tag, project, batch, embeddings))
+        written.extend(key for _, _, key in batch)
+        state["added"] += len(batch)
+        batch.clear()
+
+    def on_progress(value):
+        nonlocal fraction
+        fraction = value
+
+    chunks = iter_document_chunks(file_path, on_progress)
+    while True:
+        # Only extraction errors make a file "unreadable"; embedding and upsert
+        # errors propagate with their own type
+        try:
+            chunk, meta = next(chunks)
+        except StopIteration:
+            break
+        except Exception as e:
+            # Take back the chunks already written: with no manifest entry
+            # they would be mixed into the next ingestion of the file
+            writer.close()
+            if written:
+                delete_chunks("local_memory", filename, written)
+            print(f"⚠️ Could not load {file_path}: {e}")
+            return None
+
+        if state["first_chunk"] is None:
+            state["first_chunk"] = chunk
+        key = chunk_key(chunk, seen, meta)
+        state["keys"].append(key)
+        if key in stored:
+            continue
+        batch.append((chunk, meta, key))
+        if len(batch) >= EMBED_BATCH_SIZE:
+            report(0.1 + 0.85 * fraction, "embedding")
+            flush()
+    if batch:
+        flush()
+
+    # Every new point must be written before stale ones are deleted
+    writer.close()
+
+    if not state["keys"]:
+        print(f"⚠️ Skipping unreadable file: {file_path}")
+        return None
+
+    report(0.95, "storing")
+    return finish_text_file(file_path, tag, target_folder, project, state)
 
 # === Image archiver
-def store_image_metadata(file_path, tag, description=None, project=None):
-    print(f"🖼️ Archiving image: {file_path}")
-    if not description:
-        description = input("📝 Enter a short description of this image (max 50 words): ").strip()
-    if not description:
-        description = "No description provided."
+def image_embedding(file_path):
+    """CLIP vector of an image file, or None if it can't be read or CLIP can't be loaded.
+    Goes through the image cache, so re-uploads and near-duplicates are not re-encoded."""
+    try:
+        if IMAGE_CACHE_ENABLED:
+            return get_image_cache().clip_vector(file_path).tolist()
+        return encode_images([file_path])[0].tolist()
+    except Exception as e:
+        print(f"⚠️ No image vector for {os.path.basename(file_path)}: {e}")
+        return None
 
-    vector = model.encode("query: " + description).tolist()
+def image_vectors(file_path, text_vector, image_vector=None, collection_name="image_summary_memory"):
+    """Vector(s) of an image point: named text and image vectors when the
+    collection has them, otherwise just the summary's text vector"""
+    if not has_image_vectors(collection_name):
+        return text_vector
+    vectors = {TEXT_VECTOR_NAME: text_vector}
+    if image_vector is None:
+        image_vector = image_embedding(file_path)
+    if image_vector is not None:
+        vectors[IMAGE_VECTOR_NAME] = image_vector
+    return vectors
 
-    if not qdrant.collection_exists("image_summary_memory"):
-        qdrant.create_collection(
-            collection_name="image_summary_memory",
-            vectors_config=models.VectorParams(size=1024, distance=models.Distance.COSINE)
-        )
+def store_image_description(file_path, tag, description, project=None):
+    """Embed an image description under a point ID derived from the image content"""
+    filename = os.path.basename(file_path)
+    content_hash = ingest_manifest.file_hash(file_path)
+    entry = ingest_manifest.get_entry("image_summary_memory", filename)
+    if (entry and entry["file_hash"] == content_hash and entry.get("summary") == description
+            and has_points("image_summary_memory", filename)):
+        update_file_payload("image_summary_memory", filename, entry, tag, project)
+        ingest_manifest.record("image_summary_memory", filename, content_hash, 1, tag, project, summary=description)
+        print(f"⏭️ Unchanged image, skipped re-embedding: {filename}")
+        return False
+
+    vector = encode(description, prefix="query: ").tolist()
+    ensure_collection("image_summary_memory", size=len(vector), image_size=IMAGE_VECTOR_SIZE)
 
     payload = {
-        "filename": os.path.basename(file_path), 
+        "filename": filename, 
         "tag": tag, 
-        "summary": description
+        "summary": description,
+        "file_hash": content_hash
     }
     
     # Add project if specified
@@ -158,12 +492,24 @@ def store_image_metadata(file_path, tag, description=None, project=None):
         collection_name="image_summary_memory",
         points=[
             models.PointStruct(
-                id=uuid.uuid4().int >> 64,
-                vector=vector,
+                id=ingest_manifest.point_id(content_hash),
+                vector=image_vectors(file_path, vector),
                 payload=payload
             )
         ]
     )
+    delete_stale_points("image_summary_memory", filename, content_hash)
+    ingest_manifest.record("image_summary_memory", filename, content_hash, 1, tag, project, summary=description)
+    return True
+
+def store_image_metadata(file_path, tag, description=None, project=None):
+    print(f"🖼️ Archiving image: {file_path}")
+    if not description:
+        description = input("📝 Enter a short description of this image (max 50 words): ").strip()
+    if not description:
+        description = "No description provided."
+
+    store_image_description(file_path, tag, description, project)
 
     log_file_entry(os.path.basename(file_path), tag, description, project)
     dest_path = os.path.join(subfolders["image"], os.path.basename(file_path))
@@ -194,7 +540,7 @@ if __name__ == "__main__":
             project = input("📂 Add to project (leave blank for none)? ").strip()
             if tag in {"P", "B", "PB"}:
                 embed_and_store_text(full_path, tag, subfolders["text"], project if project else None)
-        elif ext in [".xls", ".xlsx"]:
+        elif ext in TABLE_EXTENSIONS:
             print(f"\n📊 Found spreadsheet file: {filename}")
             tag = input("📌 Tag this spreadsheet as P, B, or PB? ").strip().upper()
             project = input("📂 Add to project (leave blank for none)? ").strip()
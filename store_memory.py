@@ -3,14 +3,14 @@ import hashlib
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, PointStruct
 from document_loader import load_text_from_file
-from sentence_transformers import SentenceTransformer
+from embedding_provider import get_embed_model
 
 # === Load your document ===
 file_path = "F:\\AI_documents\\incoming\\sample_test.txt"
 text = load_text_from_file(file_path)
 
 # === Load local BGE embedding model ===
-model = SentenceTransformer('BAAI/bge-base-en-v1.5')
+model = get_embed_model('BAAI/bge-base-en-v1.5')
 
 # === Create embedding ===
 # BGE recommends using a "query: " or "passage: " prefix
@@ -0,0 +1,84 @@
+"""
+Test Configuration
+Points the assistant's settings at a temporary directory, an in-process Qdrant
+(QdrantClient(":memory:"), fresh for every test) and the benchmarks' stand-in
+embedder, so the tests run without a Qdrant server, LM Studio or the real models.
+Settings are read when a module is imported, so they are set here first.
+
+Run from the repository root: `python -m pytest tests`
+"""
+
+import os
+import sys
+import tempfile
+import warnings
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKDIR = tempfile.mkdtemp(prefix="rag_tests_")
+os.environ.update({
+    "PROCESSED_DIR": os.path.join(WORKDIR, "processed"),
+    "INGEST_MANIFEST_PATH": os.path.join(WORKDIR, "processed", "_ingest_manifest.sqlite"),
+    "INGEST_JOBS_PATH": os.path.join(WORKDIR, "processed", "_ingest_jobs.json"),
+    "EMBED_CACHE_DIR": os.path.join(WORKDIR, "processed", "_embedding_cache"),
+    "CHAT_HISTORY_DIR": os.path.join(WORKDIR, "chat_history"),
+    "PROJECTS_DIR": os.path.join(WORKDIR, "projects"),
+    "SLOW_REQUEST_LOG": os.path.join(WORKDIR, "slow_requests.jsonl"),
+    "MEMORY_COLLECTIONS": "local_memory,image_summary_memory",
+    "RETRIEVAL_MODE": "hybrid",
+    "SCORE_THRESHOLD": "0.4",
+    "TOP_K": "5",
+    "ANSWER_CACHE_ENABLED": "False",
+    "RERANK_ENABLED": "False",
+    "VECTOR_QUANTIZATION": "none"
+})
+
+from qdrant_client import QdrantClient  # noqa: E402
+import vector_store  # noqa: E402
+from benchmarks import stand_ins  # noqa: E402
+
+# Local mode ignores HNSW/quantization settings and payload indexes; that is expected here
+LOCAL_MODE_WARNINGS = "(Local mode|Payload indexes)"
+warnings.filterwarnings("ignore", message=LOCAL_MODE_WARNINGS)
+# Modules grab the shared client when imported; never let that be a server client
+vector_store._client = QdrantClient(":memory:")
+stand_ins.install()
+
+
+def pytest_configure(config):
+    config.addinivalue_line("filterwarnings", f"ignore:{LOCAL_MODE_WARNINGS}")
+
+
+@pytest.fixture
+def qdrant(monkeypatch):
+    """A fresh in-memory Qdrant, installed as every module's shared client"""
+    client = QdrantClient(":memory:")
+    monkeypatch.setattr(vector_store, "_client", client)
+    for name in ("rag_manager", "store_incoming"):
+        if name in sys.modules:
+            monkeypatch.setattr(sys.modules[name], "qdrant", client)
+    for cache in (vector_store._known_collections, vector_store._sparse_collections,
+                  vector_store._image_collections):
+        cache.clear()
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    """An empty ingestion manifest for one test"""
+    import ingest_manifest
+
+    monkeypatch.setattr(ingest_manifest, "MANIFEST_PATH", str(tmp_path / "_ingest_manifest.sqlite"))
+    monkeypatch.setattr(ingest_manifest, "LEGACY_MANIFEST_PATH", str(tmp_path / "_ingest_manifest.json"))
+    return ingest_manifest
+
+
+@pytest.fixture
+def log_file(tmp_path, monkeypatch):
+    """Keep store_incoming's processing log out of its hardcoded folder"""
+    import store_incoming
+
+    monkeypatch.setattr(store_incoming, "log_file_path", str(tmp_path / "_processing_log.txt"))
@@ -0,0 +1,74 @@
+"""
+Batch ingestion: extraction workers stream a file's chunks back in bounded
+batches, and the main process embeds them as they arrive. Workers are run
+in-process here, writing to a plain queue.
+"""
+
+import queue
+import batch_ingest
+import store_incoming
+from test_store_incoming import chunks_then_error, report  # noqa: F401
+
+
+def extracted_messages(path, batch_size, monkeypatch, chunks):
+    monkeypatch.setattr(store_incoming, "iter_document_chunks", chunks)
+    results = queue.Queue()
+    batch_ingest.extract_file(7, str(path), set(), results, batch_size)
+    return [results.get_nowait() for _ in range(results.qsize())]
+
+
+def clauses(count):
+    """iter_document_chunks stand-in yielding `count` chunks"""
+    def chunks(file_path, on_progress=None):
+        for n in range(count):
+            yield f"Clause {n} of the contract.", {}
+    return chunks
+
+
+def new_file(path):
+    return {"path": str(path), "filename": path.name, "folder": str(path.parent.parent / "processed"),
+            "tag": "B", "project": None, "content_hash": "hash", "entry": None, "stored": [], "legacy": 0}
+
+
+def test_chunks_come_back_in_bounded_batches(report, monkeypatch):
+    messages = extracted_messages(report, 10, monkeypatch, clauses(25))
+
+    assert [(file_id, kind, len(data) if kind == "items" else None) for file_id, kind, data in messages] == \
+        [(7, "items", 10), (7, "items", 10), (7, "items", 5), (7, "done", None)]
+    assert len(messages[-1][2]["keys"]) == 25
+    assert messages[-1][2]["first_chunk"] == "Clause 0 of the contract."
+
+
+def feed(ingester, state, messages):
+    """Hand one file's worker messages to the ingester, as main() does"""
+    ingester.start_file(state)
+    for _, kind, data in messages:
+        if kind == "items":
+            ingester.add_items(state, data)
+        else:
+            ingester.end_file(state, data if kind == "done" else None, data if kind == "error" else None)
+    ingester.drain()
+
+
+def test_streamed_file_is_stored(qdrant, manifest, log_file, report, monkeypatch):
+    store_incoming.ensure_collection("local_memory", sparse=True)
+    ingester, state = batch_ingest.BatchIngester(4, None), new_file(report)
+
+    feed(ingester, state, extracted_messages(report, 4, monkeypatch, clauses(10)))
+
+    assert ingester.stats["files"] == 1 and ingester.stats["failed"] == 0
+    assert qdrant.count("local_memory").count == len(state["keys"]) == 10
+    assert manifest.get_entry("local_memory", report.name) is not None
+
+
+def test_failed_extraction_takes_back_streamed_chunks(qdrant, manifest, log_file, report, monkeypatch):
+    store_incoming.ensure_collection("local_memory", sparse=True)
+    ingester, state = batch_ingest.BatchIngester(4, None), new_file(report)
+
+    # Two full batches are embedded and upserted before the worker fails
+    feed(ingester, state, extracted_messages(report, 4, monkeypatch, chunks_then_error(11)))
+
+    assert ingester.stats["embedded"] == 8 and ingester.stats["failed"] == 1
+    assert qdrant.count("local_memory").count == 0
+    assert manifest.get_entry("local_memory", report.name) is None
+    assert report.exists()
@@ -0,0 +1,48 @@
+"""
+Chat listing: /get_chats pages through the chat store and keeps its limit and
+offset within bounds whatever the client sends.
+"""
+
+import pytest
+import chat_store
+import ingest_queue
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Test client for app.py with an empty chat store holding three chats"""
+    # Importing creates file_uploader's hardcoded folders relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ingest_queue, "start", lambda *args, **kwargs: None)
+    monkeypatch.setattr(chat_store, "CHAT_DB_PATH", str(tmp_path / "chats.sqlite"))
+    from app import app
+
+    for number in range(3):
+        chat_store.create_chat(f"chat-{number}", f"Chat {number}", created=f"2026-01-0{number + 1}T09:00:00")
+    return app.test_client()
+
+
+def page(client, **args):
+    return client.get("/get_chats", query_string=args).get_json()
+
+
+@pytest.mark.parametrize("limit, expected", [(-5, 1), (0, 1), (2, 2), (10000, 500)])
+def test_limit_is_clamped(client, limit, expected):
+    reply = page(client, limit=limit)
+
+    assert reply["limit"] == expected
+    assert len(reply["chats"]) == min(expected, 3)
+    assert reply["total"] == 3
+
+
+def test_negative_offset_starts_at_the_first_chat(client):
+    reply = page(client, limit=2, offset=-4)
+
+    assert reply["offset"] == 0
+    assert [chat["id"] for chat in reply["chats"]] == [chat["id"] for chat in page(client, limit=2)["chats"]]
+
+
+def test_pages_cover_every_chat_once(client):
+    ids = [chat["id"] for offset in range(3) for chat in page(client, limit=1, offset=offset)["chats"]]
+
+    assert sorted(ids) == ["chat-0", "chat-1", "chat-2"]
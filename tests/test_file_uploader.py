@@ -0,0 +1,67 @@
+"""
+Uploads through /file/upload: each upload is saved under its own job folder in
+the incoming directory and keeps its file name through the pipeline.
+"""
+
+import io
+import os
+import threading
+import pytest
+from flask import Flask
+import ingest_queue
+
+
+@pytest.fixture
+def uploader(tmp_path, monkeypatch):
+    """file_uploader with its folders in tmp_path and a fresh ingestion queue"""
+    # Importing creates its hardcoded folders relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    import file_uploader
+
+    monkeypatch.setattr(file_uploader, "INCOMING_DIR", str(tmp_path / "incoming"))
+    monkeypatch.setattr(file_uploader, "PROCESSED_DIR", str(tmp_path / "processed"))
+    monkeypatch.setattr(file_uploader, "LOG_FILE_PATH", str(tmp_path / "_processing_log.txt"))
+    os.makedirs(tmp_path / "incoming"), os.makedirs(tmp_path / "processed")
+    monkeypatch.setattr(ingest_queue, "INGEST_JOBS_PATH", str(tmp_path / "_ingest_jobs.json"))
+    monkeypatch.setattr(ingest_queue, "_jobs", {})
+    monkeypatch.setattr(ingest_queue, "_executor", None)
+    yield file_uploader
+    if ingest_queue._executor is not None:
+        ingest_queue._executor.shutdown(wait=True)
+
+
+def upload(client, content, filename="minutes.log"):
+    response = client.post("/file/upload", data={"file": (io.BytesIO(content), filename), "tag": "B"})
+    assert response.status_code == 202
+    return response.get_json()
+
+
+def test_same_name_uploads_are_all_kept(uploader, tmp_path):
+    release, seen = threading.Event(), []
+
+    def process(file_path, *args, **kwargs):
+        release.wait(5)
+        with open(file_path, "rb") as f:
+            seen.append(f.read())
+        return uploader.process_file(file_path, *args, **kwargs)
+
+    app = Flask(__name__)
+    app.register_blueprint(uploader.file_bp, url_prefix="/file")
+    ingest_queue.start(process, workers=1)
+    client = app.test_client()
+
+    first, second = upload(client, b"first version"), upload(client, b"second version")
+
+    jobs = [ingest_queue.get_job(reply["job_id"]) for reply in (first, second)]
+    assert [job["filename"] for job in jobs] == ["minutes.log", "minutes.log"]
+    assert jobs[0]["path"] != jobs[1]["path"]
+    assert os.path.basename(os.path.dirname(jobs[0]["path"])) == first["job_id"]
+
+    release.set()
+    ingest_queue._executor.shutdown(wait=True)
+
+    assert seen == [b"first version", b"second version"]
+    assert [ingest_queue.get_job(job["id"])["status"] for job in jobs] == ["done", "done"]
+    # Job folders are removed once their files have been moved to processed
+    assert os.listdir(tmp_path / "incoming") == []
+    assert (tmp_path / "processed" / "minutes.log").read_bytes() == b"second version"
@@ -0,0 +1,112 @@
+"""
+Ingestion manifest: entries shared between processes, the generation counter,
+the JSON import and skipping files whose content is already stored.
+"""
+
+import os
+import sys
+import json
+import runpy
+import subprocess
+from conftest import ROOT
+
+
+def record_in_other_process(manifest, filename, content_hash):
+    script = ("import ingest_manifest as m; "
+              f"m.MANIFEST_PATH = {manifest.MANIFEST_PATH!r}; "
+              f"m.record('local_memory', {filename!r}, {content_hash!r}, 3)")
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True)
+
+
+def test_entries_from_other_processes_are_seen_and_kept(manifest):
+    manifest.record("local_memory", "a.txt", "hash-a", 1)
+    assert manifest.get_entry("local_memory", "b.txt") is None
+
+    record_in_other_process(manifest, "b.txt", "hash-b")
+    manifest.record("local_memory", "c.txt", "hash-c", 1)
+
+    assert manifest.get_entry("local_memory", "b.txt")["file_hash"] == "hash-b"
+    # Neither process overwrote the other's entries
+    assert {name: manifest.get_entry("local_memory", name)["file_hash"]
+            for name in ("a.txt", "b.txt", "c.txt")} == {"a.txt": "hash-a", "b.txt": "hash-b", "c.txt": "hash-c"}
+
+
+def test_generation_changes_on_every_write(manifest):
+    before = manifest.generation()
+    manifest.record("local_memory", "a.txt", "hash-a", 1)
+    after_record = manifest.generation()
+    record_in_other_process(manifest, "b.txt", "hash-b")
+    after_other = manifest.generation()
+    manifest.remove("local_memory", "a.txt")
+
+    assert before < after_record < after_other < manifest.generation()
+    assert manifest.get_entry("local_memory", "a.txt") is None
+
+
+def test_json_manifest_is_imported_once(manifest):
+    entry = {"filename": "old.txt", "collection": "local_memory", "file_hash": "hash-old", "chunks": 2,
+             "tag": "P", "project": None, "ingested_at": "2024-01-01T00:00:00"}
+    with open(manifest.LEGACY_MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump({"local_memory/old.txt": entry}, f)
+
+    assert manifest.get_entry("local_memory", "old.txt") == entry
+    assert not os.path.exists(manifest.LEGACY_MANIFEST_PATH)
+    assert os.path.exists(manifest.LEGACY_MANIFEST_PATH + ".imported")
+
+
+def ingest(tmp_path, tag="B"):
+    """Drop a report in incoming and store it; returns embed_and_store_text's counts"""
+    import store_incoming
+
+    incoming, processed = tmp_path / "incoming", tmp_path / "processed"
+    incoming.mkdir(exist_ok=True), processed.mkdir(exist_ok=True)
+    text = "Quarterly report.\n\n" + "\n\n".join(f"Paragraph {n} about the warehouse budget." for n in range(20))
+    (incoming / "report.txt").write_text(text, encoding="utf-8")
+    return store_incoming.embed_and_store_text(str(incoming / "report.txt"), tag, str(processed))
+
+
+def test_unchanged_file_is_skipped(qdrant, manifest, log_file, tmp_path):
+    first = ingest(tmp_path)
+    second = ingest(tmp_path, tag="P")
+
+    assert first["added"] > 0 and first["reused"] == 0
+    assert second == {"reused": first["added"], "added": 0, "removed": 0}
+    # Skipped, but re-tagged
+    points, _ = qdrant.scroll("local_memory", with_payload=["tag"], limit=100)
+    assert len(points) == first["added"] and {point.payload["tag"] for point in points} == {"P"}
+
+
+def test_clear_forgets_one_collection(manifest):
+    manifest.record("local_memory", "a.txt", "hash-a", 1)
+    manifest.record("local_memory", "b.txt", "hash-b", 1)
+    manifest.record("image_summary_memory", "a.jpg", "hash-c", 1)
+
+    assert manifest.clear("local_memory") == 2
+    assert manifest.get_entry("local_memory", "a.txt") is None
+    assert manifest.get_entry("image_summary_memory", "a.jpg") is not None
+
+
+def test_reset_script_makes_files_ingest_again(qdrant, manifest, log_file, tmp_path, monkeypatch):
+    import qdrant_client
+    import vector_store
+
+    first = ingest(tmp_path)
+    monkeypatch.setattr(qdrant_client, "QdrantClient", lambda **kwargs: qdrant)
+    runpy.run_path(os.path.join(ROOT, "delete_local_memory_server.py"))
+    vector_store.forget_collection("local_memory")
+
+    assert manifest.get_entry("local_memory", "report.txt") is None
+    assert ingest(tmp_path) == {"reused": 0, "added": first["added"], "removed": 0}
+
+
+def test_collection_deleted_elsewhere_is_refilled(qdrant, manifest, log_file, tmp_path):
+    import vector_store
+
+    first = ingest(tmp_path)
+    # E.g. from the Qdrant dashboard: the manifest still lists the file
+    qdrant.delete_collection("local_memory")
+    vector_store.forget_collection("local_memory")
+
+    assert manifest.get_entry("local_memory", "report.txt") is not None
+    assert ingest(tmp_path) == {"reused": 0, "added": first["added"], "removed": 0}
+    assert qdrant.count("local_memory").count == first["added"]
@@ -0,0 +1,129 @@
+"""
+Hybrid retrieval: RRF fusion of dense and BM25 rankings in search_memory and
+the merge across collections. Dense vectors are built by hand (unit vectors at
+a chosen cosine to the query) so the rankings are known exactly.
+"""
+
+import numpy as np
+from qdrant_client import models
+import rag_manager
+from vector_store import ensure_collection, TEXT_VECTOR_NAME, IMAGE_VECTOR_NAME
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document, encode_query
+
+DIMENSION = 1024
+QUERY = [1.0] + [0.0] * (DIMENSION - 1)
+
+
+def at_cosine(cosine, axis=1):
+    """Unit vector with the given cosine similarity to QUERY"""
+    vector = np.zeros(DIMENSION)
+    vector[0], vector[axis] = cosine, np.sqrt(1 - cosine ** 2)
+    return vector.tolist()
+
+
+def store(client, collection, documents, sparse=True):
+    """Upsert (filename, chunk, cosine) documents the way store_incoming does"""
+    ensure_collection(collection, sparse=sparse)
+    points = []
+    for number, (filename, chunk, cosine) in enumerate(documents):
+        vector = at_cosine(cosine, axis=number + 1)
+        if sparse:
+            vector = {"": vector, SPARSE_VECTOR_NAME: encode_document(chunk)}
+        points.append(models.PointStruct(id=number, vector=vector,
+                                         payload={"chunk": chunk, "filename": filename, "tag": "test"}))
+    client.upsert(collection_name=collection, points=points)
+
+
+SIMILAR = [
+    ("roof.txt", "The warehouse roof repair is planned for the spring.", 0.9),
+    ("budget.txt", "Facilities budget for repairs was raised this year.", 0.7),
+    ("vendor.txt", "The roofing vendor sent a revised quote.", 0.5),
+    ("schedule.txt", "Repairs are scheduled around the delivery peaks.", 0.45),
+    ("permits.txt", "Building permits for the repair were filed.", 0.42),
+    ("minutes.txt", "Meeting minutes mention the warehouse again.", 0.41)
+]
+INVOICE = ("invoice.txt", "Invoice INV-20931 was approved by facilities.", 0.0)
+
+
+def test_keyword_only_hit_ranks_first_and_reaches_the_prompt(qdrant):
+    # A bare code is not similar to anything, only BM25 finds it
+    store(qdrant, "local_memory", [(name, chunk, 0.2) for name, chunk, _ in SIMILAR] + [INVOICE])
+
+    results = rag_manager.search_memory_collections(QUERY, collections=["local_memory"],
+                                                    sparse_vector=encode_query("INV-20931"))
+
+    assert [item["filename"] for item in results] == ["invoice.txt"]
+    assert results[0]["score"] == 0.5  # first in one of the two rankings
+    assert "Invoice INV-20931 was approved" in rag_manager.format_memory_context(results)
+
+
+def test_fused_order_is_kept(qdrant):
+    store(qdrant, "local_memory", SIMILAR + [INVOICE])
+    sparse_vector = encode_query("INV-20931")
+
+    results = rag_manager.search_memory_collections(QUERY, collections=["local_memory"],
+                                                    sparse_vector=sparse_vector)
+    fused = qdrant.query_points(
+        collection_name="local_memory",
+        prefetch=[models.Prefetch(query=QUERY, limit=rag_manager.HYBRID_PREFETCH,
+                                  score_threshold=rag_manager.SCORE_THRESHOLD),
+                  models.Prefetch(query=sparse_vector, using=SPARSE_VECTOR_NAME,
+                                  limit=rag_manager.HYBRID_PREFETCH)],
+        query=models.FusionQuery(fusion=models.Fusion.RRF),
+        limit=rag_manager.TOP_K,
+        with_payload=True
+    ).points
+
+    assert [item["filename"] for item in results] == [point.payload["filename"] for point in fused]
+    # The keyword hit ties with the best dense hit and makes the prompt's TOP_K
+    assert "invoice.txt" in [item["filename"] for item in results[:2]]
+    assert "INV-20931" in rag_manager.format_memory_context(results)
+
+
+def test_scores_are_comparable_across_collections(qdrant):
+    # A weak match in a collection without BM25 vectors must not outrank a chunk
+    # that both rankings put first elsewhere
+    store(qdrant, "local_memory", [("invoice.txt", "Invoice INV-20931 was approved by facilities.", 0.94),
+                                   ("roof.txt", "The warehouse roof repair is planned for the spring.", 0.6)])
+    store(qdrant, "legacy_memory", [("notes.txt", "Loose notes from the facilities meeting.", 0.41)],
+          sparse=False)
+
+    results = rag_manager.search_memory_collections(QUERY, collections=["local_memory", "legacy_memory"],
+                                                    sparse_vector=encode_query("INV-20931"))
+
+    scores = {item["filename"]: item["score"] for item in results}
+    assert [item["filename"] for item in results][0] == "invoice.txt"
+    assert scores["invoice.txt"] == 1.0
+    # Ranked first by its only ranking, like the first dense-only hit in local_memory
+    assert scores["notes.txt"] == 0.5
+    assert scores["roof.txt"] < scores["notes.txt"]
+
+
+def test_image_found_by_its_pixels_makes_the_prompt(qdrant):
+    # The summary doesn't match the question, the CLIP image vector does
+    store(qdrant, "local_memory", SIMILAR)
+    ensure_collection("image_summary_memory", sparse=True, image_size=512)
+    clip_query = [1.0] + [0.0] * 511
+    qdrant.upsert(collection_name="image_summary_memory", points=[models.PointStruct(
+        id=0,
+        vector={TEXT_VECTOR_NAME: at_cosine(0.1), IMAGE_VECTOR_NAME: clip_query,
+                SPARSE_VECTOR_NAME: encode_document("Photo of a whiteboard")},
+        payload={"summary": "Whiteboard sketch of the loading bay layout", "filename": "board.jpg", "tag": "test"}
+    )])
+
+    results = rag_manager.search_memory_collections(QUERY, sparse_vector=encode_query("loading dock plan"),
+                                                    image_vector=clip_query)
+
+    scores = {item["filename"]: item["score"] for item in results}
+    # Ranked first by the pixels, as high as the best dense-only text hit
+    assert scores["board.jpg"] == scores["roof.txt"]
+    assert "Whiteboard sketch of the loading bay layout" in rag_manager.format_memory_context(results)
+
+
+def test_dense_mode_keeps_cosine_scores(qdrant):
+    store(qdrant, "local_memory", SIMILAR[:2] + [INVOICE])
+
+    results = rag_manager.search_memory_collections(QUERY, collections=["local_memory"])
+
+    assert [item["filename"] for item in results] == ["roof.txt", "budget.txt"]
+    assert np.isclose(results[0]["score"], 0.9)
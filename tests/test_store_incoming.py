@@ -0,0 +1,54 @@
+"""
+Text ingestion through store_incoming.embed_and_store_text: what is left in
+Qdrant and the manifest when a file can't be read to the end.
+"""
+
+import pytest
+import store_incoming
+
+
+def chunks_then_error(count):
+    """iter_document_chunks stand-in that fails after `count` chunks"""
+    def chunks(file_path, on_progress=None):
+        for n in range(count):
+            yield f"Section {n} of the contract, clause {n * 7}.", {}
+        raise ValueError("corrupt page")
+    return chunks
+
+
+@pytest.fixture
+def report(tmp_path):
+    (tmp_path / "incoming").mkdir(), (tmp_path / "processed").mkdir()
+    path = tmp_path / "incoming" / "contract.txt"
+    path.write_text("\n\n".join(f"Section {n} of the contract, clause {n * 7}." for n in range(10)),
+                    encoding="utf-8")
+    return path
+
+
+def test_failed_extraction_leaves_nothing_behind(qdrant, manifest, log_file, report, monkeypatch):
+    # More chunks than one embedding batch, so some are upserted before the error
+    monkeypatch.setattr(store_incoming, "iter_document_chunks",
+                        chunks_then_error(store_incoming.EMBED_BATCH_SIZE * 2 + 5))
+
+    result = store_incoming.embed_and_store_text(str(report), "B", str(report.parent.parent / "processed"))
+
+    assert result is None
+    assert qdrant.count("local_memory").count == 0
+    assert manifest.get_entry("local_memory", "contract.txt") is None
+    assert report.exists()
+
+
+def test_failed_update_keeps_the_stored_version(qdrant, manifest, log_file, report, monkeypatch):
+    processed = str(report.parent.parent / "processed")
+    stored = store_incoming.embed_and_store_text(str(report), "B", processed)
+    entry = manifest.get_entry("local_memory", "contract.txt")
+
+    # A new version whose extraction fails partway
+    report.write_text("changed", encoding="utf-8")
+    monkeypatch.setattr(store_incoming, "iter_document_chunks",
+                        chunks_then_error(store_incoming.EMBED_BATCH_SIZE * 2 + 5))
+    assert store_incoming.embed_and_store_text(str(report), "B", processed) is None
+
+    points, _ = qdrant.scroll("local_memory", with_payload=["chunk_key"], limit=1000)
+    assert len(points) == stored["added"]
+    assert manifest.get_entry("local_memory", "contract.txt") == entry
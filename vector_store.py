@@ -0,0 +1,441 @@
+"""
+Vector Store Access for RAG Assistant
+One shared Qdrant client per process (gRPC when available), a per-process cache
+of collections known to exist, and an upsert writer that splits points into
+size-bounded batches, keeps a few batches in flight at once and retries
+transient failures with exponential backoff. Text collections can carry a
+named BM25 sparse vector next to the dense one for hybrid retrieval; image
+collections store two named dense vectors per point, "text" (the summary's
+embedding) and "image" (the CLIP embedding of the pixels). New
+collections are created with the storage settings below (quantization, on-disk
+originals, HNSW); collection_tuning.py applies them to existing collections.
+"""
+
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from qdrant_client import QdrantClient, models
+from dotenv import load_dotenv
+from sparse_encoder import SPARSE_VECTOR_NAME, encode_document, text_of
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
+QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "True").lower() == "true"
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", 30))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", 256))
+UPSERT_PARALLEL = int(os.getenv("UPSERT_PARALLEL", 2))
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", 3))
+UPSERT_BACKOFF = float(os.getenv("UPSERT_BACKOFF", 0.5))
+# Bulk ingestion doesn't read its own writes back, so batches can be
+# acknowledged once Qdrant has logged them instead of after indexing
+UPSERT_WAIT = os.getenv("UPSERT_WAIT", "False").lower() == "true"
+
+# === Storage settings for new collections
+# none = float32 vectors in RAM; scalar = int8 copies (4x smaller); binary = 1 bit
+# per dimension (32x smaller, needs more oversampling). Searches rescore the
+# quantized candidates with the original vectors.
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none").lower()
+QUANTIZATION_ALWAYS_RAM = os.getenv("QUANTIZATION_ALWAYS_RAM", "True").lower() == "true"
+# Keep the float32 originals on disk (only read for rescoring)
+VECTOR_ON_DISK = os.getenv("VECTOR_ON_DISK", "False").lower() == "true"
+HNSW_M = int(os.getenv("HNSW_M", 16))
+HNSW_EF_CONSTRUCT = int(os.getenv("HNSW_EF_CONSTRUCT", 100))
+# Search-time settings; 0 means Qdrant's default / the per-mode default below
+SEARCH_HNSW_EF = int(os.getenv("SEARCH_HNSW_EF", 0))
+SEARCH_RESCORE = os.getenv("SEARCH_RESCORE", "True").lower() == "true"
+SEARCH_OVERSAMPLING = float(os.getenv("SEARCH_OVERSAMPLING", 0))
+DEFAULT_OVERSAMPLING = {"scalar": 1.5, "binary": 3.0}
+
+# Payload fields indexed on every collection (used to replace a file's points)
+PAYLOAD_INDEXES = ("filename", "file_hash", "chunk_key")
+
+# Named vectors of image collections; IMAGE_VECTOR_SIZE must match CLIP_MODEL
+# (ViT-B/32: 512, ViT-L/14: 768)
+TEXT_VECTOR_NAME = "text"
+IMAGE_VECTOR_NAME = "image"
+IMAGE_VECTOR_SIZE = int(os.getenv("IMAGE_VECTOR_SIZE", 512))
+
+_client = None
+_client_lock = threading.Lock()
+_known_collections = set()
+_sparse_collections = {}  # collection -> whether it has the BM25 sparse vector
+_image_collections = {}   # collection -> whether it has the named text/image vectors
+_collections_lock = threading.Lock()
+_upsert_pool = None
+
+
+def get_qdrant():
+    """Return the process-wide Qdrant client"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = QdrantClient(
+                    host=QDRANT_HOST,
+                    port=QDRANT_PORT,
+                    grpc_port=QDRANT_GRPC_PORT,
+                    prefer_grpc=QDRANT_PREFER_GRPC,
+                    timeout=QDRANT_TIMEOUT
+                )
+    return _client
+
+
+def quantization_config(mode=None):
+    """Qdrant quantization config for a mode (none, scalar or binary)"""
+    mode = (mode or VECTOR_QUANTIZATION).lower()
+    if mode == "scalar":
+        return models.ScalarQuantization(scalar=models.ScalarQuantizationConfig(
+            type=models.ScalarType.INT8, quantile=0.99, always_ram=QUANTIZATION_ALWAYS_RAM))
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(
+            always_ram=QUANTIZATION_ALWAYS_RAM))
+    if mode == "none":
+        return None
+    raise ValueError(f"Unknown quantization mode: {mode} (use none, scalar or binary)")
+
+
+def hnsw_config(m=None, ef_construct=None):
+    return models.HnswConfigDiff(m=m or HNSW_M, ef_construct=ef_construct or HNSW_EF_CONSTRUCT)
+
+
+def search_params(hnsw_ef=None, rescore=None, oversampling=None, mode=None, exact=False):
+    """SearchParams for dense queries, or None when everything is at Qdrant's defaults"""
+    mode = (mode or VECTOR_QUANTIZATION).lower()
+    hnsw_ef = hnsw_ef if hnsw_ef is not None else SEARCH_HNSW_EF
+    quantization = None
+    if mode != "none":
+        quantization = models.QuantizationSearchParams(
+            rescore=SEARCH_RESCORE if rescore is None else rescore,
+            oversampling=oversampling or SEARCH_OVERSAMPLING or DEFAULT_OVERSAMPLING.get(mode)
+        )
+    if not (hnsw_ef or quantization or exact):
+        return None
+    return models.SearchParams(hnsw_ef=hnsw_ef or None, exact=exact, quantization=quantization)
+
+
+def _sparse_config():
+    return {SPARSE_VECTOR_NAME: models.SparseVectorParams(modifier=models.Modifier.IDF)}
+
+
+def _create_payload_indexes(client, collection_name, payload_indexes):
+    for field in payload_indexes:
+        client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field,
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+
+
+def _vector_params(size):
+    return models.VectorParams(size=size, distance=models.Distance.COSINE, on_disk=VECTOR_ON_DISK)
+
+
+def ensure_collection(collection_name, size=1024, payload_indexes=PAYLOAD_INDEXES, sparse=False,
+                      image_size=None):
+    """Create a collection (with its payload indexes) unless it is known to exist.
+    Existence is checked against Qdrant only once per collection and process.
+    With sparse=True new collections also get the BM25 sparse vector; with
+    image_size they get the named "text" (size) and "image" (image_size) vectors."""
+    if collection_name in _known_collections:
+        return
+    with _collections_lock:
+        if collection_name in _known_collections:
+            return
+        client = get_qdrant()
+        if not client.collection_exists(collection_name):
+            vectors_config = _vector_params(size)
+            if image_size:
+                vectors_config = {TEXT_VECTOR_NAME: vectors_config, IMAGE_VECTOR_NAME: _vector_params(image_size)}
+            client.create_collection(
+                collection_name=collection_name,
+                vectors_config=vectors_config,
+                sparse_vectors_config=_sparse_config() if sparse else None,
+                hnsw_config=hnsw_config(),
+                quantization_config=quantization_config()
+            )
+            _create_payload_indexes(client, collection_name, payload_indexes)
+            _sparse_collections[collection_name] = sparse
+            _image_collections[collection_name] = bool(image_size)
+        else:
+            _lookup_vectors(collection_name)
+            if sparse and not _sparse_collections[collection_name]:
+                print(f"⚠️ {collection_name} has no '{SPARSE_VECTOR_NAME}' sparse vectors, hybrid search "
+                      f"is off for it (run: python sparse_encoder.py --migrate {collection_name})")
+            if image_size and not _image_collections[collection_name]:
+                print(f"⚠️ {collection_name} has no '{IMAGE_VECTOR_NAME}' vectors, images are only found "
+                      f"by their summaries (run: python collection_tuning.py image-vectors {collection_name})")
+        _known_collections.add(collection_name)
+
+
+def _lookup_vectors(collection_name):
+    """Look up (and cache) whether a collection has the sparse and the image vectors"""
+    params = get_qdrant().get_collection(collection_name).config.params
+    _sparse_collections[collection_name] = SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+    _image_collections[collection_name] = isinstance(params.vectors, dict) and IMAGE_VECTOR_NAME in params.vectors
+
+
+def has_sparse_vectors(collection_name):
+    """Whether a collection stores BM25 sparse vectors (looked up once per process)"""
+    if collection_name not in _sparse_collections:
+        try:
+            _lookup_vectors(collection_name)
+        except Exception:
+            return False  # Missing collection; don't cache so it is checked again
+    return _sparse_collections[collection_name]
+
+
+def has_image_vectors(collection_name):
+    """Whether a collection stores named "text" and "image" vectors (looked up once per process)"""
+    if collection_name not in _image_collections:
+        try:
+            _lookup_vectors(collection_name)
+        except Exception:
+            return False  # Missing collection; don't cache so it is checked again
+    return _image_collections[collection_name]
+
+
+def forget_collection(collection_name):
+    """Drop a collection from the existence cache, e.g. after deleting it"""
+    with _collections_lock:
+        _known_collections.discard(collection_name)
+        _sparse_collections.pop(collection_name, None)
+        _image_collections.pop(collection_name, None)
+
+
+def is_vector_name_error(error):
+    """Whether Qdrant rejected a request for a vector name the collection doesn't have,
+    i.e. the cached vector layout is stale (the collection was migrated by another process)"""
+    message = str(error).lower()
+    return "vector name" in message or ("vector" in message and "not found in the collection" in message)
+
+
+def _copy_points(source, target, transform=None):
+    """Copy every point (vectors and payload) from one collection to another"""
+    client = get_qdrant()
+    copied, offset = 0, None
+    while True:
+        records, offset = client.scroll(collection_name=source, limit=UPSERT_BATCH_SIZE, offset=offset,
+                                        with_payload=True, with_vectors=True)
+        points = [models.PointStruct(id=r.id, vector=transform(r) if transform else r.vector,
+                                     payload=r.payload) for r in records]
+        if points:
+            upsert_with_retry(target, points)
+            copied += len(points)
+        if offset is None:
+            return copied
+
+
+def _rebuild_collection(collection_name, transform, vectors_config=None, sparse_config=None):
+    """Recreate a collection with a new vector layout, passing every point's
+    vectors through transform(record). Qdrant can't add a vector to an existing
+    collection, so the points are copied to a temporary collection and back.
+    HNSW, quantization and keyword payload indexes are kept."""
+    client = get_qdrant()
+    temp_name = f"{collection_name}__migrating"
+    if client.collection_exists(temp_name):
+        raise RuntimeError(f"{temp_name} exists, an earlier migration did not finish; "
+                           f"check it and delete it before migrating again")
+
+    info = client.get_collection(collection_name)
+    vectors_config = vectors_config or info.config.params.vectors
+    if sparse_config is None:
+        sparse_config = info.config.params.sparse_vectors
+    indexes = [field for field, schema in (info.payload_schema or {}).items()
+               if schema.data_type == models.PayloadSchemaType.KEYWORD] or list(PAYLOAD_INDEXES)
+
+    def create(name):
+        client.create_collection(collection_name=name, vectors_config=vectors_config,
+                                 sparse_vectors_config=sparse_config,
+                                 hnsw_config=hnsw_config(info.config.hnsw_config.m,
+                                                         info.config.hnsw_config.ef_construct),
+                                 quantization_config=info.config.quantization_config)
+        _create_payload_indexes(client, name, indexes)
+
+    create(temp_name)
+    count = _copy_points(collection_name, temp_name, transform)
+    print(f"📦 Copied {count} points of {collection_name} to {temp_name}")
+    client.delete_collection(collection_name)
+    forget_collection(collection_name)
+    create(collection_name)
+    _copy_points(temp_name, collection_name)
+    client.delete_collection(temp_name)
+    return count
+
+
+def _named_vectors(record):
+    return dict(record.vector) if isinstance(record.vector, dict) else {"": record.vector}
+
+
+def add_sparse_vectors(collection_name):
+    """Rebuild a collection with the BM25 sparse vector and encode every stored
+    point's text"""
+    sparse_config = {**(get_qdrant().get_collection(collection_name).config.params.sparse_vectors or {}),
+                     **_sparse_config()}
+
+    def with_sparse(record):
+        vectors = _named_vectors(record)
+        sparse = encode_document(text_of(record.payload or {}))
+        if sparse is not None:
+            vectors[SPARSE_VECTOR_NAME] = sparse
+        return vectors
+
+    return _rebuild_collection(collection_name, with_sparse, sparse_config=sparse_config)
+
+
+def add_image_vectors(collection_name, image_vector_of, image_size=IMAGE_VECTOR_SIZE):
+    """Rebuild an image collection of single (summary) vectors with the named
+    "text" and "image" vectors. image_vector_of(payload) returns the CLIP
+    vector of the point's image, or None when the file can't be found (the
+    point then keeps only its text vector). Returns (points, with image vector)."""
+    vectors = get_qdrant().get_collection(collection_name).config.params.vectors
+    if isinstance(vectors, dict):
+        raise ValueError(f"{collection_name} already has named vectors: {', '.join(vectors)}")
+    vectors_config = {TEXT_VECTOR_NAME: vectors, IMAGE_VECTOR_NAME: _vector_params(image_size)}
+    with_image = 0
+
+    def named(record):
+        nonlocal with_image
+        named_vectors = _named_vectors(record)
+        named_vectors[TEXT_VECTOR_NAME] = named_vectors.pop("")
+        image_vector = image_vector_of(record.payload or {})
+        if image_vector is not None:
+            named_vectors[IMAGE_VECTOR_NAME] = image_vector
+            with_image += 1
+        return named_vectors
+
+    return _rebuild_collection(collection_name, named, vectors_config=vectors_config), with_image
+
+
+def is_transient(error):
+    """Whether a failed request is worth retrying (timeouts, overload, restarts)"""
+    from qdrant_client.http.exceptions import ResponseHandlingException, UnexpectedResponse
+    if isinstance(error, UnexpectedResponse):
+        return error.status_code in (429, 500, 502, 503, 504)
+    if isinstance(error, (ResponseHandlingException, ConnectionError, TimeoutError)):
+        return True
+    try:
+        import grpc
+        if isinstance(error, grpc.RpcError):
+            return error.code() in (grpc.StatusCode.UNAVAILABLE,
+                                    grpc.StatusCode.DEADLINE_EXCEEDED,
+                                    grpc.StatusCode.RESOURCE_EXHAUSTED)
+    except ImportError:
+        pass
+    return False
+
+
+def upsert_with_retry(collection_name, points, wait=True, retries=UPSERT_RETRIES):
+    """Upsert one batch, retrying transient failures with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return get_qdrant().upsert(collection_name=collection_name, points=points, wait=wait)
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = UPSERT_BACKOFF * (2 ** attempt) * (1 + random.random() / 2)
+            print(f"⚠️ Upsert of {len(points)} points to {collection_name} failed ({e}), "
+                  f"retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _get_upsert_pool():
+    global _upsert_pool
+    if _upsert_pool is None:
+        with _client_lock:
+            if _upsert_pool is None:
+                _upsert_pool = ThreadPoolExecutor(max_workers=max(1, UPSERT_PARALLEL * 2),
+                                                  thread_name_prefix="qdrant-upsert")
+    return _upsert_pool
+
+
+class UpsertWriter:
+    """Buffers points and writes them in batches of `batch_size`, with at most
+    `parallel` batches in flight. `add(points, callback)` calls callback(error)
+    once all of those points are written (error is None on success).
+    close() flushes, waits for everything and raises the first error."""
+
+    def __init__(self, collection_name, batch_size=UPSERT_BATCH_SIZE,
+                 parallel=UPSERT_PARALLEL, wait=UPSERT_WAIT):
+        self.collection_name = collection_name
+        self.batch_size = max(1, batch_size)
+        self.parallel = max(1, parallel)
+        self.wait = wait
+        self.buffer = []          # (point, tracker)
+        self.inflight = []
+        self.errors = []
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def add(self, points, callback=None):
+        points = list(points)
+        tracker = {"remaining": len(points), "callback": callback, "error": None}
+        if not points:
+            if callback:
+                callback(None)
+            return
+        self.buffer.extend((point, tracker) for point in points)
+        while len(self.buffer) >= self.batch_size:
+            self._send(self.buffer[:self.batch_size])
+            self.buffer = self.buffer[self.batch_size:]
+
+    def flush(self):
+        if self.buffer:
+            self._send(self.buffer)
+            self.buffer = []
+
+    def _send(self, batch):
+        # Bound the number of batches in flight
+        self.inflight = [f for f in self.inflight if not f.done()]
+        while len(self.inflight) >= self.parallel:
+            self.inflight.pop(0).result()
+        self.inflight.append(_get_upsert_pool().submit(self._write, batch))
+
+    def _write(self, batch):
+        error = None
+        try:
+            upsert_with_retry(self.collection_name, [point for point, _ in batch], wait=self.wait)
+        except Exception as e:
+            error = e
+            print(f"❌ Upsert of {len(batch)} points to {self.collection_name} failed: {e}")
+
+        done = []
+        with self.lock:
+            if error:
+                self.errors.append(error)
+            else:
+                self.written += len(batch)
+            for _, tracker in batch:
+                tracker["error"] = tracker["error"] or error
+                tracker["remaining"] -= 1
+                if tracker["remaining"] == 0:
+                    done.append(tracker)
+        for tracker in done:
+            if tracker["callback"]:
+                tracker["callback"](tracker["error"])
+
+    def close(self):
+        self.flush()
+        for future in self.inflight:
+            future.result()
+        self.inflight = []
+        if self.errors:
+            raise self.errors[0]
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't mask the original error; just let in-flight batches finish
+            for future in self.inflight:
+                future.exception()
@@ -0,0 +1,349 @@
+"""
+Whiteboard Processor for Local AI Assistant
+Turns photos of whiteboards, diagrams and slides into text summaries that can
+be stored in image_summary_memory. Images go through a batched pipeline:
+  - decode:  images are opened and downscaled in a thread pool
+  - clip:    CLIP encodes stacked batches of images and labels each one
+             against a fixed set of prompts (whiteboard, flowchart, ...)
+  - ocr:     EasyOCR reads the text, spread over a pool of worker processes
+             (each loads its own reader); with a GPU it runs in-process
+  - embed:   every summary is embedded in one encode() batch
+Images are processed in windows whose decoded size stays under
+WHITEBOARD_MAX_MEMORY_MB; CLIP on one window overlaps with OCR on it.
+With the image cache on, decoding goes through image_cache: images seen
+before (same content) skip decoding and the models entirely, near-duplicates
+(a burst of shots or a re-saved copy, confirmed stroke by stroke) reuse the
+earlier shot's OCR text and CLIP vector, and only what is missing from the
+cache is computed.
+A per-stage throughput report is printed at the end of each run.
+
+Usage:
+    python whiteboard_processor.py F:/AI_documents/incoming --ocr-workers 4
+"""
+
+import os
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image
+from embedding_provider import encode, encode_clip_text, get_clip_model, get_ocr_reader, OCR_LANGUAGES
+from image_cache import get_image_cache, decode, working_size, IMAGE_CACHE_ENABLED
+from ingest_manifest import file_hash
+
+# Load environment variables
+load_dotenv()
+
+# === Configuration ===
+# Longest side of the working copy used for OCR (full-resolution photos waste OCR time)
+WHITEBOARD_MAX_SIDE = int(os.getenv("WHITEBOARD_MAX_SIDE", 1600))
+WHITEBOARD_CLIP_BATCH = int(os.getenv("WHITEBOARD_CLIP_BATCH", 16))
+WHITEBOARD_DECODE_WORKERS = int(os.getenv("WHITEBOARD_DECODE_WORKERS", 4))
+# OCR processes on CPU; each loads its own EasyOCR reader (~300 MB)
+WHITEBOARD_OCR_WORKERS = int(os.getenv("WHITEBOARD_OCR_WORKERS", 2))
+# Decoded images held at once (working copies plus the copies sent to OCR workers)
+WHITEBOARD_MAX_MEMORY_MB = int(os.getenv("WHITEBOARD_MAX_MEMORY_MB", 1024))
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".gif"}
+
+# Zero-shot labels; the best match opens the summary
+CLIP_LABELS = {
+    "a whiteboard with a hand-drawn diagram": "Whiteboard diagram",
+    "a whiteboard with handwritten notes": "Whiteboard notes",
+    "a flowchart or architecture diagram": "Flowchart",
+    "a presentation slide": "Presentation slide",
+    "a table or spreadsheet": "Table",
+    "a photo of people or a room": "Photo"
+}
+
+# Working copy bytes per pixel, twice: the pipeline's copy and the OCR worker's
+_BYTES_PER_PIXEL = 3 * 2
+# CLIP input tensor (3 x 224 x 224 float32)
+_CLIP_TENSOR_BYTES = 3 * 224 * 224 * 4
+
+
+def _estimated_bytes(file_path):
+    """Memory a decoded image will hold, from its header (no pixels are read)"""
+    try:
+        with Image.open(file_path) as image:
+            width, height = working_size(*image.size, WHITEBOARD_MAX_SIDE)
+    except Exception:
+        return 0
+    return width * height * _BYTES_PER_PIXEL + _CLIP_TENSOR_BYTES
+
+
+def _windows(paths, max_bytes):
+    """Split paths into consecutive windows that fit the memory budget"""
+    window, size = [], 0
+    for path in paths:
+        estimate = _estimated_bytes(path)
+        if window and size + estimate > max_bytes:
+            yield window, size
+            window, size = [], 0
+        window.append(path)
+        size += estimate
+    if window:
+        yield window, size
+
+
+def _prepare(file_path, cache):
+    """Thread pool: returns (content hash, cache entry, RGB working copy).
+    A complete cache hit comes back without a working copy (nothing is decoded),
+    an unreadable image as (None, None, None). Without a cache the hash and
+    entry are None and the file itself is decoded."""
+    try:
+        if cache is None:
+            return None, None, decode(file_path, WHITEBOARD_MAX_SIDE)
+        content_hash = file_hash(file_path)
+        entry = cache.lookup(content_hash)
+        if cache.is_complete(entry):
+            return content_hash, entry, None
+        image, entry = cache.working_copy(file_path, content_hash, entry)
+        if max(image.size) > WHITEBOARD_MAX_SIDE:
+            image = image.resize(working_size(*image.size, WHITEBOARD_MAX_SIDE), Image.LANCZOS)
+        return content_hash, entry, image
+    except Exception as e:
+        print(f"⚠️ Could not read image {file_path}: {e}")
+        return None, None, None
+
+
+# === OCR workers
+def _init_ocr_worker(languages):
+    get_ocr_reader(languages)
+
+
+def _read_text(pixels, languages=None):
+    """Text found in an image, in reading order"""
+    reader = get_ocr_reader(languages)
+    return " ".join(reader.readtext(pixels, detail=0, paragraph=True)).strip()
+
+
+def _ocr_pool(workers):
+    """OCR processes on CPU; on a GPU one in-process reader is faster than several"""
+    import torch
+    if workers > 0 and not torch.cuda.is_available():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_init_ocr_worker,
+                                   initargs=(list(OCR_LANGUAGES),))
+    return ThreadPoolExecutor(max_workers=1)
+
+
+# === CLIP
+def _clip_batch(tensors, clip_model, device):
+    """Encode a stacked batch into normalised image vectors"""
+    import torch
+    with torch.no_grad():
+        features = clip_model.encode_image(torch.stack(tensors).to(device))
+        features = features / features.norm(dim=-1, keepdim=True)
+    return features.float().cpu().numpy()
+
+
+def _labels(vectors, label_vectors):
+    """Best matching CLIP_LABELS label for each image vector"""
+    import numpy as np
+    labels = list(CLIP_LABELS.values())
+    return [labels[i] for i in (np.asarray(vectors) @ label_vectors.T).argmax(axis=1)]
+
+
+def summarize(label, text):
+    if text:
+        return f"{label}. Text on the image: {text}"
+    return f"{label} with no readable text."
+
+
+class StageTimer:
+    """Wall time and item counts per pipeline stage"""
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, seconds, items):
+        entry = self.stages.setdefault(stage, {"seconds": 0.0, "items": 0})
+        entry["seconds"] += seconds
+        entry["items"] += items
+
+    def report(self, total_seconds, peak_bytes, windows, cache=None):
+        report = {"total_seconds": round(total_seconds, 2), "windows": windows,
+                  "peak_window_mb": round(peak_bytes / (1024 ** 2), 1), "cache": cache, "stages": {}}
+        for stage, entry in self.stages.items():
+            seconds = entry["seconds"]
+            report["stages"][stage] = {
+                "seconds": round(seconds, 2),
+                "items": entry["items"],
+                "per_second": round(entry["items"] / seconds, 2) if seconds else None
+            }
+        return report
+
+
+def print_report(report):
+    print(f"📊 Whiteboard pipeline: {report['total_seconds']}s in {report['windows']} window(s), "
+          f"peak {report['peak_window_mb']} MB")
+    for stage, entry in report["stages"].items():
+        rate = f"{entry['per_second']}/s" if entry["per_second"] is not None else "-"
+        print(f"   {stage:>7}: {entry['items']} in {entry['seconds']}s ({rate})")
+    if report["cache"]:
+        cache = report["cache"]
+        print(f"   📦 Image cache: {cache['exact']} seen before, {cache['near_duplicate']} near-duplicate(s), "
+              f"{cache['analyzed']} analyzed")
+
+
+def analyze_whiteboards(file_paths, clip_batch=None, decode_workers=None, ocr_workers=None,
+                        max_memory_mb=None):
+    """Analyze a list of images. Returns (results, report); results[i] is None for
+    an unreadable image, otherwise a dict with summary, label, ocr_text,
+    text_vector (summary embedding) and image_vector (CLIP embedding)."""
+    import numpy as np
+
+    clip_batch = clip_batch or WHITEBOARD_CLIP_BATCH
+    decode_workers = decode_workers or WHITEBOARD_DECODE_WORKERS
+    ocr_workers = WHITEBOARD_OCR_WORKERS if ocr_workers is None else ocr_workers
+    max_bytes = (max_memory_mb or WHITEBOARD_MAX_MEMORY_MB) * 1024 ** 2
+
+    started = time.perf_counter()
+    timer = StageTimer()
+    cache = get_image_cache() if IMAGE_CACHE_ENABLED else None
+    counts = {"exact": 0, "near_duplicate": 0, "analyzed": 0}
+    clip_model, preprocess, device = get_clip_model()
+    label_vectors = encode_clip_text(list(CLIP_LABELS))
+    results = {}
+    owners = {}   # content hash -> path analyzed in this run that stands for it
+    peak, windows = 0, 0
+
+    with ThreadPoolExecutor(max_workers=decode_workers) as decode_pool, _ocr_pool(ocr_workers) as ocr_pool:
+        for window, size in _windows(file_paths, max_bytes):
+            windows += 1
+            peak = max(peak, size)
+
+            start = time.perf_counter()
+            prepared = list(decode_pool.map(lambda path: _prepare(path, cache), window))
+            timer.add("decode", time.perf_counter() - start, len(window))
+
+            # Cache hits and near-duplicates are settled before any model runs
+            pending, aliases = [], []
+            for path, (content_hash, entry, image) in zip(window, prepared):
+                if cache is None:
+                    if image is not None:
+                        pending.append((path, None, image, None, None))
+                    continue
+                if entry is None:
+                    continue
+                if image is None:
+                    text, vector = cache.results(entry)
+                    results[path] = {"ocr_text": text, "image_vector": vector.tolist()}
+                    counts["exact"] += 1
+                    cache.count("exact_hits")
+                    continue
+                if content_hash in owners:
+                    # The same file twice in one run
+                    aliases.append((path, owners[content_hash], content_hash, None))
+                    counts["exact"] += 1
+                    cache.count("exact_hits")
+                    continue
+                original = cache.nearest(entry, image, include=owners)
+                if original is not None and cache.is_complete(original):
+                    text, vector = cache.results(original)
+                    results[path] = {"ocr_text": text, "image_vector": vector.tolist()}
+                    cache.store_duplicate(content_hash, original)
+                    counts["near_duplicate"] += 1
+                    cache.count("near_duplicates")
+                    continue
+                if original is not None and original["content_hash"] in owners:
+                    # Another shot of an image analyzed earlier in this run
+                    owners[content_hash] = owners[original["content_hash"]]
+                    aliases.append((path, owners[content_hash], content_hash, original["content_hash"]))
+                    counts["near_duplicate"] += 1
+                    cache.count("near_duplicates")
+                    continue
+                owners[content_hash] = path
+                cache.count("misses")
+                pending.append((path, content_hash, image, *cache.results(entry)))
+            del prepared
+            counts["analyzed"] += len(pending)
+
+            # OCR runs in the pool while CLIP works through the same window here
+            ocr_start = time.perf_counter()
+            to_read = [(path, np.asarray(image)) for path, _, image, text, _ in pending if text is None]
+            ocr_futures = [ocr_pool.submit(_read_text, pixels) for _, pixels in to_read]
+            for path, _, _, text, vector in pending:
+                results[path] = {"ocr_text": text, "image_vector": None if vector is None else vector.tolist()}
+
+            start = time.perf_counter()
+            to_encode = [(path, image) for path, _, image, _, vector in pending if vector is None]
+            for offset in range(0, len(to_encode), clip_batch):
+                batch = to_encode[offset:offset + clip_batch]
+                tensors = list(decode_pool.map(preprocess, [image for _, image in batch]))
+                vectors = _clip_batch(tensors, clip_model, device)
+                for (path, _), vector in zip(batch, vectors):
+                    results[path]["image_vector"] = vector.tolist()
+            timer.add("clip", time.perf_counter() - start, len(to_encode))
+
+            ocr_failed = set()
+            for (path, _), future in zip(to_read, ocr_futures):
+                try:
+                    results[path]["ocr_text"] = future.result()
+                except Exception as e:
+                    print(f"⚠️ OCR failed for {os.path.basename(path)}: {e}")
+                    results[path]["ocr_text"] = ""
+                    ocr_failed.add(path)
+            timer.add("ocr", time.perf_counter() - ocr_start, len(to_read))
+            del to_read, to_encode
+
+            if cache is not None:
+                # A failed OCR is retried next time rather than cached as "no text"
+                for path, content_hash, _, _, _ in pending:
+                    text = None if path in ocr_failed else results[path]["ocr_text"]
+                    cache.store(content_hash, text, results[path]["image_vector"])
+            for path, owner, content_hash, original_hash in aliases:
+                results[path] = dict(results[owner])
+                if original_hash is not None:
+                    cache.store(content_hash, results[owner]["ocr_text"], results[owner]["image_vector"],
+                                duplicate_of=original_hash)
+            del pending
+
+    analyzed = [path for path in file_paths if path in results]
+    if analyzed:
+        start = time.perf_counter()
+        labels = _labels([results[path]["image_vector"] for path in analyzed], label_vectors)
+        summaries = [summarize(label, results[path]["ocr_text"]) for path, label in zip(analyzed, labels)]
+        vectors = encode(summaries, prefix="passage: ").tolist()
+        for path, label, summary, vector in zip(analyzed, labels, summaries, vectors):
+            results[path].update(label=label, summary=summary, text_vector=vector)
+        timer.add("embed", time.perf_counter() - start, len(analyzed))
+
+    report = timer.report(time.perf_counter() - started, peak, windows, counts if cache else None)
+    print_report(report)
+    return [results.get(path) for path in file_paths], report
+
+
+def analyze_whiteboard(file_path, tag=None):
+    """Analyze a single image (see analyze_whiteboards)"""
+    results, _ = analyze_whiteboards([file_path], ocr_workers=0)
+    if results[0] is None:
+        raise ValueError(f"Could not read image: {file_path}")
+    return {**results[0], "tag": tag}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a folder of whiteboard images")
+    parser.add_argument("folder")
+    parser.add_argument("--clip-batch", type=int)
+    parser.add_argument("--decode-workers", type=int)
+    parser.add_argument("--ocr-workers", type=int)
+    parser.add_argument("--max-memory-mb", type=int)
+    args = parser.parse_args(argv)
+
+    paths = sorted(os.path.join(args.folder, name) for name in os.listdir(args.folder)
+                   if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS)
+    if not paths:
+        print(f"⚠️ No images in {args.folder}")
+        return 1
+    results, _ = analyze_whiteboards(paths, args.clip_batch, args.decode_workers, args.ocr_workers,
+                                     args.max_memory_mb)
+    for path, result in zip(paths, results):
+        print(f"\n🖼️ {os.path.basename(path)}")
+        print(result["summary"] if result else "⚠️ unreadable")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())